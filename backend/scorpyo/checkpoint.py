@@ -0,0 +1,178 @@
+"""
+Periodic checkpoints of each match's state, so that recovering from a crash only
+has to replay the commands journaled since the latest checkpoint rather than the
+whole match.
+"""
+import enum
+import glob
+import os
+import pickle
+from typing import Optional
+
+from scorpyo.definitions.match import MatchType, get_match_type
+from scorpyo.entity import Entity, EntityType, Player, Team
+from scorpyo.event import EventType
+from scorpyo.history import INDEX_SUFFIX, SPILL_SUFFIX, History, create_history
+from scorpyo.session import MatchSession
+from scorpyo.snapshot import SnapshotTracker
+
+
+class CheckpointPolicy(enum.Enum):
+    NONE = "none"
+    OVER = "over"
+    EVERY_N = "every_n"
+
+
+# a checkpoint is always taken when a match starts or completes, so that every match
+# in the journal has one to recover from
+ALWAYS_CHECKPOINT = {EventType.MATCH_STARTED, EventType.MATCH_COMPLETED}
+CHECKPOINT_SUFFIX = ".ckpt"
+
+_ENTITY_TYPES = {Player: EntityType.PLAYER, Team: EntityType.TEAM}
+
+
+class _CheckpointPickler(pickle.Pickler):
+    """pickles a match but only refers to the engine, registrar, entities and match
+    type it shares with everything else, so they are not copied into every
+    checkpoint and are the live objects again once it is loaded. The items a
+    history has spilled are persisted to spill files beside the checkpoint, which
+    it refers to, so each checkpoint only has to write the ones spilled since the
+    last"""
+
+    def __init__(self, file, engine: "MatchEngine", spill_prefix: str):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.engine = engine
+        self.spill_prefix = spill_prefix
+
+    def persistent_id(self, obj):
+        if isinstance(obj, History):
+            obj.persist_spilled(self.spill_prefix)
+            return None
+        if obj is self.engine:
+            return ("engine",)
+        if obj is self.engine.entity_registrar:
+            return ("entity_registrar",)
+        if isinstance(obj, Entity):
+            return ("entity", _ENTITY_TYPES[type(obj)].value, obj.unique_id)
+        if isinstance(obj, MatchType):
+            return ("match_type", obj.shortcode)
+        return None
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, engine: "MatchEngine"):
+        super().__init__(file)
+        self.engine = engine
+
+    def persistent_load(self, pid):
+        kind, *args = pid
+        if kind == "engine":
+            return self.engine
+        if kind == "entity_registrar":
+            return self.engine.entity_registrar
+        if kind == "entity":
+            entity_type, unique_id = args
+            return self.engine.entity_registrar.get_entity_data(
+                EntityType(entity_type), unique_id
+            )
+        if kind == "match_type":
+            return get_match_type(args[0])
+        raise pickle.UnpicklingError(f"unknown persistent id {pid}")
+
+
+class CheckpointStore:
+    """Keeps the latest checkpoint of every match in a directory, one file per match.
+    A checkpoint records how far into the journal the match had got, so recovery
+    knows where its tail begins"""
+
+    def __init__(
+        self,
+        directory: str,
+        policy: CheckpointPolicy = CheckpointPolicy.OVER,
+        every_n: int = 100,
+    ):
+        if every_n < 1:
+            raise ValueError(f"checkpoint every_n must be at least 1, got {every_n}")
+        self.directory = directory
+        self.policy = policy
+        self.every_n = every_n
+        self._commands_since_checkpoint: dict[int, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def on_command(self, match_id: int, event_type: Optional[EventType]) -> bool:
+        """register an accepted command for a match and return True if the match is
+        due a checkpoint"""
+        count = self._commands_since_checkpoint.get(match_id, 0) + 1
+        self._commands_since_checkpoint[match_id] = count
+        if event_type in ALWAYS_CHECKPOINT:
+            return True
+        if self.policy == CheckpointPolicy.OVER:
+            return event_type == EventType.OVER_COMPLETED
+        if self.policy == CheckpointPolicy.EVERY_N:
+            return count >= self.every_n
+        return False
+
+    def path_for(self, match_id: int) -> str:
+        return os.path.join(self.directory, f"match-{match_id}{CHECKPOINT_SUFFIX}")
+
+    def spill_prefix_for(self, match_id: int) -> str:
+        return os.path.join(self.directory, f"match-{match_id}-")
+
+    def save(self, engine: "MatchEngine", session: MatchSession, journal_offset: int):
+        """write the checkpoint to a temporary file and move it into place, so a
+        crash part way through leaves the previous checkpoint intact"""
+        # the command and message history, the last snapshot and the routing table
+        # can all be rebuilt, so are left out to keep checkpoints small
+        state = dict(
+            vars(session),
+            events=create_history(session.retention),
+            messages=create_history(session.retention),
+            snapshot_tracker=SnapshotTracker(),
+            routes=None,
+        )
+        path = self.path_for(session.match_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as fh:
+            pickler = _CheckpointPickler(
+                fh, engine, self.spill_prefix_for(session.match_id)
+            )
+            pickler.dump({"journal_offset": journal_offset, "session": state})
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, path)
+        self._commands_since_checkpoint[session.match_id] = 0
+
+    def load_all(self, engine: "MatchEngine") -> list[tuple[MatchSession, int]]:
+        """every checkpointed match, with the journal offset its checkpoint covers"""
+        checkpoints = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(CHECKPOINT_SUFFIX):
+                continue
+            with open(os.path.join(self.directory, filename), "rb") as fh:
+                checkpoint = _CheckpointUnpickler(fh, engine).load()
+            session = MatchSession.__new__(MatchSession)
+            session.__dict__.update(checkpoint["session"])
+            checkpoints.append((session, checkpoint["journal_offset"]))
+        return checkpoints
+
+    def remove(self, match_id: int):
+        self._commands_since_checkpoint.pop(match_id, None)
+        path = self.path_for(match_id)
+        if os.path.exists(path):
+            os.remove(path)
+        prefix = glob.escape(self.spill_prefix_for(match_id))
+        for suffix in (SPILL_SUFFIX, SPILL_SUFFIX + INDEX_SUFFIX):
+            for spill_path in glob.glob(f"{prefix}*{suffix}"):
+                os.remove(spill_path)
+
+
+def create_checkpoint_store(config, suffix: str = "") -> Optional[CheckpointStore]:
+    directory = config.get("ENGINE", "checkpoint_dir", fallback=None)
+    if not directory:
+        return None
+    directory += suffix
+    policy = CheckpointPolicy(
+        config.get("ENGINE", "checkpoint_policy", fallback=CheckpointPolicy.OVER.value)
+    )
+    every_n = config.getint("ENGINE", "checkpoint_every", fallback=100)
+    return CheckpointStore(directory, policy, every_n)
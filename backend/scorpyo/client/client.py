@@ -1,4 +1,3 @@
-import json
 import logging
 import socket
 from collections import deque
@@ -14,8 +13,10 @@ from scorpyo.client.handler import (
     WSHandler,
     ClientHandler,
 )
+from scorpyo.codec import JSON, get_codec
 from scorpyo.error import RejectReason, ClientError
 from scorpyo.event import EventType
+from scorpyo.protocol import FramedSocket
 from scorpyo.registrar import EntityRegistrar
 from scorpyo.util import load_config, LOGGER
 
@@ -32,6 +33,7 @@ class EngineClient:
         self.registrar = registrar
         self._pending_commands: deque = deque()
         self.engine_sequence = 0
+        self.match_id = None
         self.config = load_config(config_path)
         self._handler: ClientHandler = self.create_handler()
         self._timeout = self.config.getfloat(
@@ -39,6 +41,11 @@ class EngineClient:
         )
         self.engine_host = self.config["ENGINE"]["host"]
         self.engine_port = self.config.getint("ENGINE", "port")
+        self._engine_socket: Optional[FramedSocket] = None
+        self.engine_codec = get_codec(
+            self.config.get("CLIENT", "engine_codec", fallback=JSON.name)
+        )
+        self._websocket = None
         open_websocket = self.config.getboolean("CLIENT", "create_ws", fallback=False)
         if open_websocket:
             port = self.config.getint("CLIENT", "ws_port")
@@ -77,6 +84,37 @@ class EngineClient:
         The client should know the internal protocol accepted by the engine and
         format commands accordingly. For now I will maintain this protocol distinctly
         between engine and client but if it grows, may need to move to a protobuf"""
+        event_type = self._check_command(command)
+        self._sequence_command(command, event_type)
+        resp = self._send_command(command)
+        if event_type == EventType.MATCH_STARTED and "reject_reason" not in resp:
+            self.match_id = resp["match_id"]
+        return resp
+
+    def on_event_commands(self, commands: list[dict]):
+        """send a batch of commands to the engine in a single round trip. The engine
+        stops at the first reject, so any commands after it are not applied and are
+        dropped from the pending queue; the caller can resend them once the cause
+        of the reject has been dealt with"""
+        event_types = [self._check_command(command) for command in commands]
+        sequence, match_id = self.engine_sequence, self.match_id
+        for command, event_type in zip(commands, event_types):
+            self._sequence_command(command, event_type)
+        resp = self._send_command({"batch": commands})
+        messages = resp["batch"]
+        unapplied = len(commands) - len(messages)
+        for _ in range(unapplied):
+            self._pending_commands.pop()
+        # replay the applied commands to work out where the sequence now stands
+        self.engine_sequence, self.match_id = sequence, match_id
+        for message, event_type in zip(messages, event_types):
+            if event_type == EventType.MATCH_STARTED:
+                self.engine_sequence = 0
+                self.match_id = message.get("match_id")
+            self.engine_sequence += 1
+        return resp
+
+    def _check_command(self, command: dict) -> EventType:
         if "body" not in command:
             msg = f"missing body on incoming command" f" {command}"
             LOGGER.warning(msg)
@@ -87,30 +125,55 @@ class EngineClient:
             LOGGER.warning(msg)
             raise ClientError(msg, RejectReason.BAD_COMMAND)
         try:
-            event_type = EventType(e_type)
-        except KeyError:
+            return EventType(e_type)
+        except ValueError:
             msg = f"event command payload has an invalid type {e_type}"
             LOGGER.warning(msg)
             raise ClientError(msg, RejectReason.BAD_COMMAND)
+
+    def _sequence_command(self, command: dict, event_type: EventType):
+        if event_type == EventType.MATCH_STARTED:
+            # every match has its own command sequence on the engine
+            self.match_id = None
+            self.engine_sequence = 0
         command["command_id"] = self.engine_sequence
+        if self.match_id is not None:
+            command["match_id"] = self.match_id
         self._pending_commands.append(command)
-        resp = self._send_command(command)
         self.engine_sequence += 1
-        return resp
 
     def _send_command(self, command: dict):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            command_str = json.dumps(command)
-            s.connect((self.engine_host, self.engine_port))
-            encoded = command_str.encode()
-            s.sendall(encoded)
-            resp = s.recv(1024)
-            resp_str = resp.decode()
-            resp_json = json.loads(resp_str)
-        return resp_json
+        """send a command over the (persistent) engine connection and wait for the
+        engine's response"""
+        if not self._engine_socket:
+            sock = socket.create_connection((self.engine_host, self.engine_port))
+            self._engine_socket = FramedSocket(sock)
+            if self.engine_codec is not JSON:
+                self._engine_socket.negotiate(self.engine_codec)
+        try:
+            self._engine_socket.send(command)
+            resp = self._engine_socket.receive()
+        except OSError:
+            self.disconnect_engine()
+            raise
+        if resp is None:
+            self.disconnect_engine()
+            msg = "engine closed the connection before responding to command"
+            LOGGER.error(msg)
+            raise ClientError(msg, RejectReason.INCONSISTENT_STATE)
+        return resp
+
+    def disconnect_engine(self):
+        if self._engine_socket:
+            self._engine_socket.close()
+            self._engine_socket = None
 
     def _validate_message(self, message: dict):
-        if not message["is_snapshot"]:
+        if "batch" in message:
+            for batch_message in message["batch"]:
+                self._validate_message(batch_message)
+            return
+        if not message.get("is_snapshot"):
             message_id = message.get("message_id")
             if message_id is None:
                 msg = f"received message from engine with no id {message}"
@@ -134,10 +197,15 @@ class EngineClient:
                 raise ClientError(msg, RejectReason.INCONSISTENT_STATE)
 
     def on_message(self, message: dict):
+        self.on_encoded_message(message, JSON.encode(message))
+
+    def on_encoded_message(self, message: dict, payload: bytes):
+        """the client listens to the engine with the json codec, so the encoding is
+        shared by the handler and the websocket"""
         self._validate_message(message)
-        self._handler.on_message(message)
+        self._handler.on_encoded_message(message, payload)
         if self._websocket:
-            self._websocket.send_message_to_all(json.dumps(message))
+            self._websocket.send_message_to_all(payload.decode())
 
     @contextmanager
     def connect(self):
@@ -148,6 +216,7 @@ class EngineClient:
         finally:
             logging.info("closing handler")
             self._handler.close()
+            self.disconnect_engine()
 
 
 def create_websocket(host: str, port: int):
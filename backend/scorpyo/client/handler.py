@@ -15,6 +15,7 @@ from scorpyo.client.cli_nodes import (
     create_nodes,
 )
 from scorpyo.client.reader import json_reader, plain_reader
+from scorpyo.codec import JSON
 from scorpyo.entity import EntityType
 from scorpyo.event import EventType
 from scorpyo.registrar import EntityRegistrar
@@ -65,6 +66,11 @@ class ClientHandler(abc.ABC):
     def on_message(self, message: dict):
         pass
 
+    def on_encoded_message(self, message: dict, payload: bytes):
+        """a message the client has already encoded as json. Handlers that send the
+        message on should override this to reuse the encoding"""
+        self.on_message(message)
+
     @property
     def has_data(self):
         return self.command_buffer
@@ -251,8 +257,11 @@ class WSHandler(ClientHandler):
         pass
 
     def on_message(self, message: dict):
+        self.on_encoded_message(message, JSON.encode(message))
+
+    def on_encoded_message(self, message: dict, payload: bytes):
         LOGGER.info("Sending reply from engine to clients")
-        self._server.send_message_to_all(json.dumps(message))
+        self._server.send_message_to_all(payload.decode())
 
     def _setup_server(self) -> WebsocketServer:
         server = WebsocketServer(host=self.host, port=self.port, loglevel=logging.INFO)
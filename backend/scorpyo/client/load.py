@@ -0,0 +1,242 @@
+"""
+A load driver that plays many scorers against a running engine at once, each on its
+own connection, replaying command files with the pacing a real scorer would have.
+
+Scorers talk to the engine server over TCP, which acks each command, or to a client
+stack over its WebSocket, which broadcasts the ack and then the snapshot of each
+command. The latency from sending a command to receiving its ack is measured on
+both, and to receiving its snapshot on the WebSocket. A client stack scores one
+match at a time, so each WebSocket url should be a stack of its own; scorers are
+shared out between the urls given.
+"""
+import enum
+import json
+import socket
+import threading
+import time
+from typing import Optional, Sequence
+
+from scorpyo.codec import JSON, Codec
+from scorpyo.metrics import percentile
+from scorpyo.protocol import FramedSocket
+from scorpyo.util import LOGGER
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# what stops a scorer, rather than the whole run
+SCORER_ERRORS = (OSError, ValueError)
+if websocket:
+    SCORER_ERRORS += (websocket.WebSocketException,)
+
+
+DEFAULT_TIMEOUT = 10.0
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Transport(enum.Enum):
+    TCP = "tcp"
+    WS = "ws"
+
+
+class TcpConnection:
+    """a scorer's connection straight to the engine server. Commands are sequenced
+    here, as the client would"""
+
+    expects_snapshots = False
+
+    def __init__(self, host: str, port: int, codec: Codec = JSON, timeout=None):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        self._socket = FramedSocket(sock)
+        if codec is not JSON:
+            self._socket.negotiate(codec)
+        self.command_id = 0
+        self.match_id = None
+
+    def send(self, command: dict):
+        if command.get("event") == "ms":
+            self.command_id = 0
+            self.match_id = None
+        command = dict(command, command_id=self.command_id)
+        if self.match_id is not None:
+            command["match_id"] = self.match_id
+        self.command_id += 1
+        self._socket.send(command)
+
+    def receive(self) -> dict:
+        message = self._socket.receive()
+        if message is None:
+            raise ConnectionError("engine closed the connection")
+        if self.match_id is None and "match_id" in message:
+            self.match_id = message["match_id"]
+        return message
+
+    def close(self):
+        self._socket.close()
+
+
+class WsConnection:
+    """a scorer's connection to the WebSocket of a client stack, which sequences
+    the commands and broadcasts the engine's messages back"""
+
+    expects_snapshots = True
+
+    def __init__(self, url: str, timeout=None):
+        if websocket is None:
+            raise RuntimeError("driving a WebSocket needs websocket-client installed")
+        self._ws = websocket.create_connection(url, timeout=timeout)
+
+    def send(self, command: dict):
+        self._ws.send(json.dumps(command))
+
+    def receive(self) -> dict:
+        return json.loads(self._ws.recv())
+
+    def close(self):
+        self._ws.close()
+
+
+class ScorerStats:
+    def __init__(self):
+        self.commands = 0
+        self.rejects = 0
+        self.errors = 0
+        self.ack_latencies: list[float] = []
+        self.snapshot_latencies: list[float] = []
+
+
+class Scorer(threading.Thread):
+    """replays its command files one after another, a command at a time, waiting
+    for each to be acknowledged before pacing out the next"""
+
+    def __init__(
+        self,
+        name: str,
+        connect,
+        matches: Sequence[list[dict]],
+        interval: float = 0.0,
+        start_delay: float = 0.0,
+    ):
+        super().__init__(name=name, daemon=True)
+        self.connect = connect
+        self.matches = matches
+        self.interval = interval
+        self.start_delay = start_delay
+        self.stats = ScorerStats()
+        self.match_id = None
+
+    def run(self):
+        time.sleep(self.start_delay)
+        try:
+            connection = self.connect()
+        except SCORER_ERRORS as e:
+            LOGGER.error(f"{self.name} could not connect: {e}")
+            self.stats.errors += 1
+            return
+        try:
+            for commands in self.matches:
+                for command in commands:
+                    self.play(connection, command)
+                    if self.interval:
+                        time.sleep(self.interval)
+        except SCORER_ERRORS as e:
+            LOGGER.error(f"{self.name} stopped: {e}")
+            self.stats.errors += 1
+        finally:
+            connection.close()
+
+    def play(self, connection, command: dict):
+        if command.get("event") == "ms":
+            self.match_id = None
+        sent = time.perf_counter()
+        connection.send(command)
+        self.stats.commands += 1
+        ack = self.receive(connection, is_snapshot=False)
+        self.stats.ack_latencies.append(time.perf_counter() - sent)
+        if "reject_reason" in ack:
+            self.stats.rejects += 1
+            return
+        if self.match_id is None:
+            self.match_id = ack.get("match_id")
+        if connection.expects_snapshots:
+            self.receive(connection, is_snapshot=True)
+            self.stats.snapshot_latencies.append(time.perf_counter() - sent)
+
+    def receive(self, connection, is_snapshot: bool) -> dict:
+        """the next ack or snapshot for this scorer's match, skipping those broadcast
+        for other matches"""
+        while True:
+            message = connection.receive()
+            if bool(message.get("is_snapshot")) != is_snapshot:
+                continue
+            match_id = message.get("match_id", self.match_id)
+            if self.match_id is None or match_id == self.match_id:
+                return message
+
+
+def run_load(
+    connect,
+    matches: Sequence[list[dict]],
+    num_scorers: int,
+    interval: float = 0.0,
+    ramp_up: float = 0.0,
+) -> dict:
+    """play num_scorers scorers at once, sharing the matches out between them, and
+    report on how the engine kept up. connect is called with the number of the scorer
+    to open its connection"""
+    scorers = []
+    for n in range(num_scorers):
+        assigned = [
+            matches[i % len(matches)]
+            for i in range(n, max(len(matches), num_scorers), num_scorers)
+        ]
+        scorers.append(
+            Scorer(
+                f"scorer-{n}",
+                lambda n=n: connect(n),
+                assigned,
+                interval,
+                ramp_up * n / num_scorers,
+            )
+        )
+    started = time.perf_counter()
+    for scorer in scorers:
+        scorer.start()
+    for scorer in scorers:
+        scorer.join()
+    return load_report([s.stats for s in scorers], time.perf_counter() - started)
+
+
+def load_report(stats: Sequence[ScorerStats], elapsed: float) -> dict:
+    commands = sum(s.commands for s in stats)
+    rejects = sum(s.rejects for s in stats)
+    acks = [latency for s in stats for latency in s.ack_latencies]
+    snapshots = [latency for s in stats for latency in s.snapshot_latencies]
+    return {
+        "scorers": len(stats),
+        "elapsed": elapsed,
+        "commands": commands,
+        "throughput": len(acks) / elapsed if elapsed else None,
+        "reject_rate": rejects / commands if commands else None,
+        "errors": sum(s.errors for s in stats),
+        "ack_latency": _latency_summary(acks),
+        "snapshot_latency": _latency_summary(snapshots),
+    }
+
+
+def _latency_summary(latencies: list[float]) -> Optional[dict]:
+    if not latencies:
+        return None
+    summary = {f"p{round(q * 100)}": percentile(latencies, q) for q in PERCENTILES}
+    summary["max"] = max(latencies)
+    return summary
+
+
+def tcp_connector(host: str, port: int, codec: Codec = JSON, timeout=DEFAULT_TIMEOUT):
+    return lambda n: TcpConnection(host, port, codec, timeout)
+
+
+def ws_connector(urls: Sequence[str], timeout=DEFAULT_TIMEOUT):
+    return lambda n: WsConnection(urls[n % len(urls)], timeout)
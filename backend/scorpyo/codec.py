@@ -0,0 +1,249 @@
+"""
+Codecs for the messages the engine sends out. JSON is used for anything a browser or
+person reads, and uses orjson when it is installed. msgpack is a compact binary
+format for internal consumers, and uses the msgpack package when it is installed,
+otherwise the pure python implementation below.
+"""
+import abc
+import json
+import struct
+import time
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec(abc.ABC):
+    name = ""
+
+    @abc.abstractmethod
+    def encode(self, message: dict) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def decode(self, payload: bytes) -> dict:
+        pass
+
+
+class JsonCodec(Codec):
+    name = "json"
+
+    def encode(self, message: dict) -> bytes:
+        if orjson:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(message, separators=(",", ":")).encode()
+
+    def decode(self, payload: bytes) -> dict:
+        if orjson:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+
+    def encode(self, message: dict) -> bytes:
+        if msgpack:
+            return msgpack.packb(message, use_bin_type=True)
+        return pack(message)
+
+    def decode(self, payload: bytes) -> dict:
+        if msgpack:
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        return unpack(payload)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"unknown codec {name}, expected one of {list(CODECS)}")
+
+
+def deliver(listeners: list[tuple[Any, Optional[Codec]]], message: dict) -> float:
+    """hand a message to every listener. Listeners registered without a codec get
+    the message itself; the others get it through on_encoded_message, encoded only
+    once for each codec in use. Returns the time spent encoding"""
+    encoded = {}
+    encode_time = 0.0
+    for listener, codec in listeners:
+        if codec is None:
+            listener.on_message(message)
+            continue
+        payload = encoded.get(codec.name)
+        if payload is None:
+            start = time.perf_counter()
+            payload = encoded[codec.name] = codec.encode(message)
+            encode_time += time.perf_counter() - start
+        listener.on_encoded_message(message, payload)
+    return encode_time
+
+
+def pack(obj: Any) -> bytes:
+    """encode an object made of dicts, lists, strings, numbers, bools and None in
+    the msgpack format"""
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def _pack(obj: Any, out: bytearray):
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        out.append(0xCB)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        _pack_length(len(data), out, 0xA0, 31, 0xD9, 0xDA, 0xDB)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _pack_length(len(obj), out, None, 0, 0xC4, 0xC5, 0xC6)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_length(len(obj), out, 0x90, 15, None, 0xDC, 0xDD)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_length(len(obj), out, 0x80, 15, None, 0xDE, 0xDF)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"cannot encode object of type {type(obj)} as msgpack")
+
+
+def _pack_int(value: int, out: bytearray):
+    if 0 <= value <= 0x7F:
+        out.append(value)
+    elif -32 <= value < 0:
+        out.append(value & 0xFF)
+    elif value > 0:
+        for code, fmt in ((0xCC, ">B"), (0xCD, ">H"), (0xCE, ">I"), (0xCF, ">Q")):
+            if value < 1 << (struct.calcsize(fmt) * 8):
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+        raise OverflowError(f"integer {value} is too large for msgpack")
+    else:
+        for code, fmt in ((0xD0, ">b"), (0xD1, ">h"), (0xD2, ">i"), (0xD3, ">q")):
+            if value >= -(1 << (struct.calcsize(fmt) * 8 - 1)):
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+        raise OverflowError(f"integer {value} is too small for msgpack")
+
+
+def _pack_length(length, out, fix_code, fix_max, code8, code16, code32):
+    if fix_code is not None and length <= fix_max:
+        out.append(fix_code | length)
+    elif code8 is not None and length <= 0xFF:
+        out.append(code8)
+        out.append(length)
+    elif length <= 0xFFFF:
+        out.append(code16)
+        out += struct.pack(">H", length)
+    else:
+        out.append(code32)
+        out += struct.pack(">I", length)
+
+
+def unpack(payload: bytes) -> Any:
+    obj, position = _unpack(memoryview(payload), 0)
+    if position != len(payload):
+        raise ValueError("trailing bytes after msgpack object")
+    return obj
+
+
+_FIXED = {
+    0xCC: ">B",
+    0xCD: ">H",
+    0xCE: ">I",
+    0xCF: ">Q",
+    0xD0: ">b",
+    0xD1: ">h",
+    0xD2: ">i",
+    0xD3: ">q",
+    0xCA: ">f",
+    0xCB: ">d",
+}
+# (kind, size of the length prefix) for the variable length types
+_SIZED = {
+    0xD9: ("str", ">B"),
+    0xDA: ("str", ">H"),
+    0xDB: ("str", ">I"),
+    0xC4: ("bin", ">B"),
+    0xC5: ("bin", ">H"),
+    0xC6: ("bin", ">I"),
+    0xDC: ("array", ">H"),
+    0xDD: ("array", ">I"),
+    0xDE: ("map", ">H"),
+    0xDF: ("map", ">I"),
+}
+
+
+def _unpack(data: memoryview, position: int):
+    code = data[position]
+    position += 1
+    if code <= 0x7F:
+        return code, position
+    if code >= 0xE0:
+        return code - 0x100, position
+    if 0xA0 <= code <= 0xBF:
+        return _unpack_sized("str", code & 0x1F, data, position)
+    if 0x90 <= code <= 0x9F:
+        return _unpack_sized("array", code & 0x0F, data, position)
+    if 0x80 <= code <= 0x8F:
+        return _unpack_sized("map", code & 0x0F, data, position)
+    if code == 0xC0:
+        return None, position
+    if code == 0xC2:
+        return False, position
+    if code == 0xC3:
+        return True, position
+    if code in _FIXED:
+        fmt = _FIXED[code]
+        (value,) = struct.unpack_from(fmt, data, position)
+        return value, position + struct.calcsize(fmt)
+    if code in _SIZED:
+        kind, fmt = _SIZED[code]
+        (length,) = struct.unpack_from(fmt, data, position)
+        return _unpack_sized(kind, length, data, position + struct.calcsize(fmt))
+    raise ValueError(f"unsupported msgpack type code {code:#x}")
+
+
+def _unpack_sized(kind: str, length: int, data: memoryview, position: int):
+    if kind == "str":
+        return str(data[position : position + length], "utf-8"), position + length
+    if kind == "bin":
+        return bytes(data[position : position + length]), position + length
+    if kind == "array":
+        items = []
+        for _ in range(length):
+            item, position = _unpack(data, position)
+            items.append(item)
+        return items, position
+    result = {}
+    for _ in range(length):
+        key, position = _unpack(data, position)
+        result[key], position = _unpack(data, position)
+    return result, position
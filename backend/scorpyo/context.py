@@ -2,6 +2,12 @@ import abc
 
 
 class Context(abc.ABC):
+    # every change to a context bumps its version, and that of the contexts whose
+    # overview includes it, so a rendered overview can be reused until then
+    version = 0
+    _overview = None
+    _overview_version = -1
+
     def __init__(self):
         self._event_handlers = {}
         self._child_context = None
@@ -10,12 +16,42 @@ class Context(abc.ABC):
     def snapshot(self) -> dict:
         pass
 
+    def overview(self) -> dict:
+        """the rendered overview, only rebuilt if the context has changed since it
+        was last rendered. It is shared with every caller so must not be modified"""
+        if self._overview_version != self.version:
+            self._overview = self.render_overview()
+            self._overview_version = self.version
+        return self._overview
+
+    def render_overview(self) -> dict:
+        raise NotImplementedError(f"{type(self).__name__} has no overview")
+
+    def parent_contexts(self) -> tuple:
+        """the contexts whose overview includes this one"""
+        return ()
+
+    def touch(self):
+        self.version += 1
+        for parent in self.parent_contexts():
+            parent.touch()
+
     def add_handler(self, event_type: "EventType", func: callable):
         self._event_handlers[event_type] = func
 
+    def routing_table(self) -> dict:
+        """map each event type handled by this context or its active descendants to
+        the context and handler that handle_event would end up calling"""
+        routes = self._child_context.routing_table() if self._child_context else {}
+        for event_type, handler in self._event_handlers.items():
+            routes[event_type] = (self, handler)
+        return routes
+
     def handle_event(self, event_type: "EventType", payload: dict) -> dict:
         handler = self._event_handlers.get(event_type)
         if handler:
+            # the handler may change the context, even if it goes on to reject
+            self.touch()
             return handler(payload)
         if not self._child_context:
             raise ValueError(f"no context defined to handle event {event_type}")
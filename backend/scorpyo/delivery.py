@@ -0,0 +1,186 @@
+"""
+Delivery of the engine's messages to listeners off the thread that processes
+commands, so a slow listener cannot add its latency to every ball.
+"""
+import enum
+import threading
+from collections import Counter, deque
+from typing import Callable, Optional
+
+from scorpyo.util import LOGGER
+
+
+DEFAULT_MAX_DEPTH = 1024
+
+
+class OverflowPolicy(enum.Enum):
+    # make room by dropping the oldest queued snapshot, which a later one supersedes.
+    # Deltas can't be dropped, as every later delta builds on them, so given a resync
+    # the queued snapshots of a match are replaced by one full snapshot instead. If
+    # nothing can be dropped the engine waits, as acks must not be lost
+    DROP_OLDEST_SNAPSHOT = "drop_oldest_snapshot"
+    # make the engine wait for the listener to catch up
+    BLOCK = "block"
+    # give up on the listener
+    DISCONNECT = "disconnect"
+
+
+class QueuedListener:
+    """Wraps a listener in a bounded queue drained by its own thread. The engine hands
+    it messages exactly as it would the listener, already encoded if the listener
+    uses a codec, and carries on while the thread delivers them"""
+
+    def __init__(
+        self,
+        listener,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST_SNAPSHOT,
+        on_disconnect: Optional[Callable[["QueuedListener"], None]] = None,
+        resync: Optional[Callable[[int], Optional[tuple]]] = None,
+    ):
+        if max_depth < 1:
+            raise ValueError(
+                f"listener queue depth must be at least 1, got {max_depth}"
+            )
+        self.listener = listener
+        self.max_depth = max_depth
+        self.overflow = overflow
+        self.on_disconnect = on_disconnect
+        # given the snapshots are deltas, returns the queue item carrying the full
+        # snapshot of a match, or None if the match is gone
+        self.resync = resync
+        self.dropped = 0
+        self.is_connected = True
+        self._queue: deque = deque()
+        self._condition = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(
+            target=self._drain, name=f"listener-{listener!r}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def on_message(self, message: dict):
+        self._put((message, None))
+
+    def on_encoded_message(self, message: dict, payload: bytes):
+        self._put((message, payload))
+
+    def _put(self, item: tuple):
+        with self._condition:
+            if not self.is_connected:
+                return
+            if len(self._queue) >= self.max_depth and not self._make_room(item):
+                return
+            self._queue.append(item)
+            self._condition.notify_all()
+
+    def _make_room(self, item: tuple) -> bool:
+        """called with the lock held when the queue is full. Returns False if the
+        item should not be queued"""
+        if self.overflow == OverflowPolicy.DISCONNECT:
+            LOGGER.warning(f"listener {self.listener!r} fell too far behind")
+            self.is_connected = False
+            self._queue.clear()
+            self._condition.notify_all()
+            if self.on_disconnect:
+                self.on_disconnect(self)
+            return False
+        if self.overflow == OverflowPolicy.DROP_OLDEST_SNAPSHOT:
+            if self.resync is None:
+                if self._drop_oldest_snapshot():
+                    return True
+            else:
+                while len(self._queue) >= self.max_depth:
+                    took_item = self._coalesce_snapshots(item)
+                    if took_item is None:
+                        break
+                    if took_item:
+                        return False
+                if len(self._queue) < self.max_depth:
+                    return True
+        while len(self._queue) >= self.max_depth and self.is_connected:
+            self._condition.wait()
+        return self.is_connected
+
+    def _drop_oldest_snapshot(self) -> bool:
+        # the message at the front may be being delivered right now
+        for idx in range(1, len(self._queue)):
+            if self._queue[idx][0].get("is_snapshot"):
+                del self._queue[idx]
+                self.dropped += 1
+                return True
+        return False
+
+    def _coalesce_snapshots(self, item: tuple) -> Optional[bool]:
+        """replace the queued snapshots of the match with the oldest that has more than
+        one, counting the item, with a full snapshot as of the latest. Returns None if
+        no match has more than one, otherwise whether the item was replaced too"""
+        queued = list(self._queue)
+        counts: Counter = Counter(
+            message.get("match_id")
+            for message, _ in queued[1:] + [item]
+            if message.get("is_snapshot")
+        )
+        for message, _ in queued[1:]:
+            if message.get("is_snapshot") and counts[message.get("match_id")] > 1:
+                match_id = message.get("match_id")
+                break
+        else:
+            return None
+        def is_replaced(message: dict) -> bool:
+            return message.get("is_snapshot") and message.get("match_id") == match_id
+
+        replaced = [idx for idx in range(1, len(queued)) if is_replaced(queued[idx][0])]
+        took_item = bool(is_replaced(item[0]))
+        full = self.resync(match_id)
+        self.dropped += len(replaced) + took_item - (full is not None)
+        skipped = set(replaced)
+        kept = [queued[idx] for idx in range(len(queued)) if idx not in skipped]
+        if full is not None:
+            # where the latest of the snapshots it replaces was
+            position = len(kept) if took_item else replaced[-1] - len(replaced) + 1
+            kept.insert(position, full)
+        self._queue = deque(kept)
+        return took_item
+
+    def _drain(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closing:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                message, payload = self._queue[0]
+            try:
+                if payload is None:
+                    self.listener.on_message(message)
+                else:
+                    self.listener.on_encoded_message(message, payload)
+            except Exception:
+                LOGGER.exception(f"listener {self.listener!r} failed on a message")
+            with self._condition:
+                # the message stays queued while it is delivered so that depth
+                # includes it. Nothing else removes the front of the queue, unless
+                # the listener was disconnected in the meantime
+                if self._queue and self._queue[0][0] is message:
+                    self._queue.popleft()
+                self._condition.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """wait until every queued message has been delivered"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """deliver what is already queued and stop the thread"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def __repr__(self) -> str:
+        return f"QueuedListener({self.listener!r}, depth={self.depth})"
@@ -41,16 +41,20 @@ def parse_dismissal(
     payload_batter = player_getter(payload.get("batter"))
     fielder = player_getter(payload.get("fielder"))
     if payload_batter and payload_batter not in [off_strike, on_strike]:
-        raise EngineError(
+        msg = (
             f"batter specified in dismissal {dt}: {payload_batter} is not "
             f"currently at the crease."
         )
+        LOGGER.warning(msg)
+        raise EngineError(msg, RejectReason.BAD_COMMAND)
     batter = payload_batter if payload_batter else on_strike
     if dt.batter_implied and not batter == on_strike:
-        raise ValueError(
+        msg = (
             f"batter specified in dismissal {dt} is not consistent "
             f"with current striker: {on_strike}"
         )
+        LOGGER.warning(msg)
+        raise EngineError(msg, RejectReason.BAD_COMMAND)
     if dt.needs_fielder:
         if not fielder:
             msg = f"dismissal type {dt} needs an associated fielder but none was specified"
@@ -91,6 +95,9 @@ class Dismissal:
         elif self.dismissal_type == BOWLED:
             return f"b {self.bowler.scorecard_name}"
         elif self.dismissal_type == STUMPED:
+            # the keeper isn't needed to record a stumping
+            if not self.fielder:
+                return f"St b {self.bowler.scorecard_name}"
             return f"St {self.fielder.scorecard_name} b {self.bowler.scorecard_name}"
         elif self.dismissal_type == HIT_WICKET:
             return f"hit wicket b {self.bowler.scorecard_name}"
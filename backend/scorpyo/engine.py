@@ -1,11 +1,27 @@
 import enum
-import json
+import functools
+import os
 import socket
+import time
+from collections import Counter
+from contextlib import closing
+from typing import Callable, Optional
 
+from scorpyo.checkpoint import CheckpointStore, create_checkpoint_store
+from scorpyo.codec import Codec, deliver, get_codec
 from scorpyo.context import Context
-from scorpyo.entity import EntityType
+from scorpyo.delivery import OverflowPolicy, QueuedListener
+from scorpyo.entity import Entity, EntityType
 from scorpyo.error import EngineError, RejectReason
-from scorpyo.match import Match, MatchState
+from scorpyo.history import (
+    RetentionPolicy,
+    create_history,
+    create_retention_policy,
+)
+from scorpyo.journal import CommandJournal, create_journal, read_journal
+from scorpyo.match import Match
+from scorpyo.metrics import EngineMetrics, Phase
+from scorpyo.profiling import CommandProfiler, ProfileMode
 from scorpyo.event import (
     EventType,
     MatchStartedEvent,
@@ -15,53 +31,455 @@ import scorpyo.util as util
 from scorpyo.util import LOGGER
 from scorpyo.registrar import CommandRegistrar, EntityRegistrar
 from scorpyo.definitions.match import get_match_type
+from scorpyo.protocol import FramedSocket
+from scorpyo.session import MatchSession
+from scorpyo.snapshot import (
+    SnapshotMode,
+    SnapshotPolicy,
+    SnapshotScheduler,
+)
+from scorpyo.subscription import Subscription
+from scorpyo.validation import validated
+
+
+# what the metrics of batches and of snapshots not triggered by a command are
+# labelled with in place of an event type
+BATCH_LABEL = "batch"
+FLUSH_LABEL = "flush"
+EVENT_CODES = {event_type.value for event_type in EventType}
 
-"""
-TODO pflanagan: implement rollback
 
-TODO pflanagan: should each context object have some sort of validator dependency
-that can wrap all of the validation for a given command? Otherwise I have validation
-scattered around - need to consolidate.
-"""
+def event_label(command: dict) -> str:
+    """the event type code of a command, or 'invalid', so that metrics only ever have
+    a fixed set of labels"""
+    event = command.get("event") if isinstance(command, dict) else None
+    # anything may come from a client, including values that can't be looked up
+    return event if isinstance(event, str) and event in EVENT_CODES else "invalid"
+
+
+def check_command_shape(command):
+    """a command must be an object, a batch only comes as a list of them and a
+    match_id, if given, is an integer"""
+    match_id = command.get("match_id") if isinstance(command, dict) else None
+    if not isinstance(command, dict):
+        msg = f"a command must be an object, got {command!r}"
+    elif "batch" in command:
+        msg = f"a batch must be a list of commands, got {command['batch']!r}"
+    elif match_id is not None and (
+        not isinstance(match_id, int) or isinstance(match_id, bool)
+    ):
+        msg = f"a match_id must be an integer, got {match_id!r}"
+    else:
+        return
+    LOGGER.warning(msg)
+    raise EngineError(msg, RejectReason.BAD_COMMAND)
 
 
 class MatchEngine(Context):
     """
     Receives a stream of match events (commands) and processes the event
     based on its internal state, then sends out a corresponding message
-    that other applications (client, score reporter) can listen for
+    that other applications (client, score reporter) can listen for.
+
+    The engine can host any number of live matches at once. Commands carry the
+    match_id of the match they belong to (one is allocated by each MatchStarted) and
+    each match keeps its own command sequence, history and snapshot stream.
+    Commands without a match_id are routed to the most recently started match.
     """
 
-    def __init__(self, entity_registrar: "EntityRegistar"):
+    def __init__(
+        self,
+        entity_registrar: "EntityRegistar",
+        snapshot_mode: SnapshotMode = SnapshotMode.FULL,
+        snapshot_scheduler: Callable[[], SnapshotScheduler] = SnapshotScheduler,
+        first_match_id: int = 0,
+        match_id_step: int = 1,
+        journal: Optional[CommandJournal] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        retention: Optional[RetentionPolicy] = None,
+        profile_dir: Optional[str] = None,
+    ):
         super().__init__()
-        self.match_id = 0
+        # engines sharing out matches between them allocate ids from interleaved
+        # sequences so that every match_id stays unique
+        self.next_match_id = first_match_id
+        self.match_id_step = match_id_step
         self.message_id = 0
-        self.current_match = None
         self.state: EngineState = EngineState.LOCKED
-        self._events = []
-        self._messages = []
+        self.snapshot_mode = snapshot_mode
+        self.snapshot_scheduler = snapshot_scheduler
+        self.journal = journal
+        self.checkpoints = checkpoints
+        # how much of each history of the engine and its matches is kept in memory
+        self.retention = retention
+        self.sessions: dict[int, MatchSession] = {}
+        self._latest_session: Optional[MatchSession] = None
+        self._events = create_history(retention)
+        self._messages = create_history(retention)
         self._score_listeners = []
+        # the snapshot version each listener was last sent of each match, by id
+        self._sent_versions: dict[int, dict[int, int]] = {}
         self.entity_registrar = entity_registrar
-        self.command_registrar = CommandRegistrar()
+        self.dispatch_counts: Counter[EventType] = Counter()
+        self.metrics = EngineMetrics()
+        self.profiler: Optional[CommandProfiler] = None
+        # where profiles named by an admin request are written
+        self.profile_dir = profile_dir
 
         self.add_handler(EventType.MATCH_STARTED, self.handle_match_started)
         self.add_handler(EventType.MATCH_COMPLETED, self.handle_match_completed)
 
+    @property
+    def current_match(self) -> Optional[Match]:
+        if not self._latest_session:
+            return None
+        return self._latest_session.match
+
+    @property
+    def live_matches(self) -> list[Match]:
+        return [s.match for s in self.sessions.values() if s.is_live]
+
+    def get_session(self, match_id: Optional[int] = None) -> MatchSession:
+        if match_id is None:
+            if not self._latest_session:
+                msg = "no match has been started"
+                LOGGER.warning(msg)
+                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+            return self._latest_session
+        try:
+            return self.sessions[match_id]
+        except KeyError:
+            msg = f"no match found with match_id {match_id}"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.BAD_COMMAND)
+
+    def route_command(self, command: dict) -> Optional[MatchSession]:
+        """find the session of the match a command is for, or None if the command
+        starts a new match or there is no match to send it to"""
+        if command.get("event") == EventType.MATCH_STARTED.value:
+            # a new match is given the next match_id, whatever the command carries
+            return None
+        match_id = command.get("match_id")
+        if match_id is None:
+            return self._latest_session
+        return self.get_session(match_id)
+
     def on_command(self, command: dict):
+        message, session = self.apply_command(command)
+        if self.journal:
+            self.journal.commit()
+        if session and self._is_checkpoint_due(session, message):
+            self.save_checkpoint(session)
+        self.send_message(message, is_snapshot=False, innings=innings_of(session))
+        if session and session.snapshot_scheduler.on_command(event_of(message)):
+            self.send_snapshot(
+                session, message.get("event", EventType.REJECT.value)
+            )
+        return message
+
+    def on_commands(self, commands: list[dict], stop_on_reject: bool = True) -> dict:
+        """apply an ordered batch of commands and reply with all of their acks and
+        rejects in one envelope. Listeners get the envelope and then at most one
+        snapshot per match touched by the batch. By default the batch stops at the
+        first reject, since the commands after it were most likely relying on it"""
+        messages = []
+        innings = []
+        snapshots_due = {}
+        checkpoints_due = set()
+        for command in commands:
+            message, session = self.apply_command(command)
+            messages.append(message)
+            innings.append(innings_of(session))
+            if session:
+                due = session.snapshot_scheduler.on_command(event_of(message))
+                snapshots_due[session] = snapshots_due.get(session, False) or due
+                if self._is_checkpoint_due(session, message):
+                    checkpoints_due.add(session)
+            if stop_on_reject and "reject_reason" in message:
+                break
+        if self.journal:
+            self.journal.commit()
+        for session in checkpoints_due:
+            self.save_checkpoint(session)
+        envelope = {"batch": messages, "num_commands": len(commands)}
+        self.send_batch(envelope, innings)
+        for session, due in snapshots_due.items():
+            if due:
+                self.send_snapshot(session, BATCH_LABEL)
+        return envelope
+
+    def on_request(self, request: dict) -> dict:
+        """entry point for the servers: a request is either a single command, a
+        batch of them or an admin request. Anything else is rejected as a malformed
+        command"""
+        if isinstance(request, dict):
+            if "admin" in request:
+                return self.on_admin(request)
+            if isinstance(request.get("batch"), list):
+                return self.on_commands(
+                    request["batch"], request.get("stop_on_reject", True)
+                )
+        return self.on_command(request)
+
+    def on_admin(self, request: dict) -> dict:
+        """admin requests operate the engine rather than a match, so go to no
+        listener and take no message_id. They are either
+        {"admin": "profile", "commands": 100, "seconds": 10, "mode": "sampling"}
+        or {"admin": "profile_stop"}, both replying with where the profile is. A
+        profile can be given a file "name" in the profile_dir, and is otherwise
+        written to a temporary file"""
+        admin = request["admin"]
+        reply = {"admin": admin}
+        try:
+            if admin == "profile":
+                reply["path"] = self.start_profiling(
+                    ProfileMode(request.get("mode", ProfileMode.CPROFILE.value)),
+                    self._profile_path(request),
+                    request.get("commands"),
+                    request.get("seconds"),
+                )
+            elif admin == "profile_stop":
+                reply["path"] = self.stop_profiling()
+            else:
+                msg = f"unknown admin request {admin}"
+                LOGGER.warning(msg)
+                raise EngineError(msg, RejectReason.BAD_COMMAND)
+        except (ValueError, TypeError) as e:
+            reply.update(EngineError(str(e), RejectReason.BAD_COMMAND).compile())
+        except EngineError as e:
+            reply.update(e.compile())
+        return reply
+
+    def _profile_path(self, request: dict) -> Optional[str]:
+        """where a profile requested over the network is written, which is never
+        up to the client beyond a file name in the profile_dir"""
+        if "path" in request:
+            msg = "a profile can only be given a name, not a path"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.BAD_COMMAND)
+        name = request.get("name")
+        if name is None:
+            return None
+        if self.profile_dir is None:
+            msg = "no profile_dir is configured to write named profiles to"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.BAD_COMMAND)
+        if (
+            not isinstance(name, str)
+            or name in ("", os.curdir, os.pardir)
+            or os.path.basename(name) != name
+            or (os.altsep and os.altsep in name)
+        ):
+            msg = f"profile name must be a bare file name, got {name!r}"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.BAD_COMMAND)
+        return os.path.join(self.profile_dir, name)
+
+    def start_profiling(
+        self,
+        mode: ProfileMode = ProfileMode.CPROFILE,
+        path: Optional[str] = None,
+        commands: Optional[int] = None,
+        seconds: Optional[float] = None,
+    ) -> str:
+        """profile the command path for the next number of commands or seconds, by
+        routing it through the profiler until then. The profile is written once
+        the command or batch that ends it has been sent"""
+        if self.profiler:
+            msg = f"already profiling to {self.profiler.path}"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        profiler = CommandProfiler(mode, path, commands, seconds)
+        for name in PROFILED_METHODS:
+            setattr(self, name, profiler.wrap(getattr(self, name)))
+        self.process_command = profiler.wrap(self.process_command, True)
+        for name in REQUEST_METHODS:
+            setattr(self, name, self._stop_when_profiled(getattr(self, name)))
+        self.profiler = profiler
+        return profiler.path
+
+    def _stop_when_profiled(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def request(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.poll_profile()
+
+        return request
+
+    def poll_profile(self):
+        """end the profile being taken if it is done. Called after each request, and
+        to be called periodically so that a profile for a number of seconds is
+        written once they are up even if no further request arrives"""
+        # a request may have been applied, so the profile must not fail it
+        try:
+            if self.profiler and self.profiler.is_done:
+                self.stop_profiling()
+        except Exception:
+            LOGGER.exception("could not end the profile, abandoning it")
+            self._unwrap_profiled()
+
+    def stop_profiling(self) -> str:
+        """write the profile being taken, returning where it was written"""
+        if not self.profiler:
+            msg = "not profiling"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        profiler = self.profiler
+        self._unwrap_profiled()
+        return profiler.finish()
+
+    def _unwrap_profiled(self):
+        # going back to the methods of the class leaves nothing in the way
+        for name in (*PROFILED_METHODS, "process_command", *REQUEST_METHODS):
+            self.__dict__.pop(name, None)
+        self.profiler = None
+
+    def apply_command(self, command: dict) -> tuple[dict, Optional[MatchSession]]:
+        """process a command and record the resulting ack or reject against its
+        match, without sending anything to the listeners"""
+        start_time = time.process_time()
+        start = time.perf_counter()
+        session = None
         try:
-            message = self.process_command(command)
+            check_command_shape(command)
+            session = self.route_command(command)
+            message = self.process_command(command, session)
         except EngineError as e:
             message = e.compile()
-        message["message_id"] = self.message_id
-        self.message_id += 1
-        self._messages.append(message)
-        self.send_message(message, is_snapshot=False)
-        if self.current_match:
-            snapshot_msg = self.current_match.snapshot()
-            self.send_message(snapshot_msg, is_snapshot=True)
-        return message
+            self.metrics.on_reject(e.reason)
+        self.metrics.observe(
+            Phase.PROCESS, event_label(command), time.perf_counter() - start
+        )
+        if session is None:
+            session = self.sessions.get(message.get("match_id"))
+        if session is None:
+            message["message_id"] = self.message_id
+            self.message_id += 1
+            self._messages.append(message)
+            return message, None
+        if self.journal and "reject_reason" not in message:
+            self.journal.append(session.match_id, command)
+        message["match_id"] = session.match_id
+        message["message_id"] = session.message_id
+        session.message_id += 1
+        session.messages.append(message)
+        session.stats.commands += 1
+        session.stats.rejects += "reject_reason" in message
+        session.stats.cpu_time += time.process_time() - start_time
+        return message, session
+
+    def send_snapshot(self, session: MatchSession, event: str = FLUSH_LABEL):
+        """build and send a snapshot of the match, which is timed against the event
+        that triggered it"""
+        start_time = time.process_time()
+        innings = innings_of(session)
+        session.snapshot_scheduler.on_snapshot_sent()
+        if not any(
+            subscription is None
+            or subscription.wants_snapshot(session.match_id, innings)
+            for _, _, subscription in self._score_listeners
+        ):
+            # nobody would receive it, so it is not worth building
+            return
+        start = time.perf_counter()
+        snapshot_msg = self.create_snapshot_message(session)
+        self.metrics.observe(Phase.SNAPSHOT, event, time.perf_counter() - start)
+        self.send_message(snapshot_msg, is_snapshot=True, innings=innings, event=event)
+        session.stats.cpu_time += time.process_time() - start_time
+
+    def _is_checkpoint_due(self, session: MatchSession, message: dict) -> bool:
+        if self.checkpoints is None or "reject_reason" in message:
+            return False
+        return self.checkpoints.on_command(session.match_id, event_of(message))
 
-    def process_command(self, command: dict):
+    def save_checkpoint(self, session: MatchSession):
+        journal_offset = self.journal.offset if self.journal else 0
+        self.checkpoints.save(self, session, journal_offset)
+
+    def recover(self):
+        """rebuild the matches recorded in the journal after a restart. Each match is
+        loaded from its latest checkpoint and only the commands journaled after that
+        are replayed, so recovery takes as long as the checkpoint interval rather
+        than the match"""
+        if not self.journal or not os.path.exists(self.journal.path):
+            return
+        checkpointed = self.checkpoints.load_all(self) if self.checkpoints else []
+        replay_from = {}
+        for session, journal_offset in checkpointed:
+            self.sessions[session.match_id] = session
+            replay_from[session.match_id] = journal_offset
+        start_offset = min(replay_from.values(), default=0)
+        last_match_id = max(self.sessions, default=None)
+        # the replayed commands are already in the journal
+        journal, self.journal = self.journal, None
+        try:
+            for end_offset, record in read_journal(journal.path, start_offset):
+                match_id = record["match_id"]
+                if end_offset <= replay_from.get(match_id, start_offset):
+                    continue
+                if record.get("removed"):
+                    if match_id in self.sessions:
+                        self.remove_match(match_id)
+                    continue
+                self._replay_command(match_id, record["command"])
+                last_match_id = max(match_id, last_match_id or 0)
+        finally:
+            self.journal = journal
+        if last_match_id is not None:
+            self.next_match_id = max(
+                self.next_match_id, last_match_id + self.match_id_step
+            )
+        if self.sessions:
+            self._latest_session = self.sessions[max(self.sessions)]
+        LOGGER.info(f"recovered {len(self.sessions)} matches from {journal.path}")
+
+    def _replay_command(self, match_id: int, command: dict):
+        # a journaled command was accepted when first applied, but any rejects in
+        # between were not journaled so the sequence is taken from the command
+        command = dict(command)
+        if command["event"] == EventType.MATCH_STARTED.value:
+            self.next_match_id = match_id
+        else:
+            command["match_id"] = match_id
+            session = self.sessions.get(match_id)
+            if session:
+                session.message_id = command["command_id"]
+        message, _ = self.apply_command(command)
+        if "reject_reason" in message:
+            LOGGER.error(f"failed to replay journaled command {command}: {message}")
+
+    def close(self):
+        if self.profiler:
+            # write what has been profiled so far rather than lose it
+            try:
+                self.stop_profiling()
+            except Exception:
+                LOGGER.exception("could not write the profile")
+        for listener, _, _ in self._score_listeners:
+            if isinstance(listener, QueuedListener):
+                listener.close()
+        if self.journal:
+            self.journal.close()
+
+    def flush_snapshot(self):
+        """send the latest snapshot of every match whose scheduling policy has held
+        one back"""
+        for session in self.sessions.values():
+            if session.snapshot_scheduler.pending:
+                self.send_snapshot(session)
+
+    def poll_snapshot(self):
+        """to be called periodically when throttling snapshots, so that the latest
+        state still goes out once the interval has elapsed even if no further command
+        arrives"""
+        for session in self.sessions.values():
+            scheduler = session.snapshot_scheduler
+            if scheduler.pending and scheduler.is_due():
+                self.send_snapshot(session)
+
+    def process_command(self, command: dict, session: Optional[MatchSession]):
         try:
             event_type_code = command["event"]
             command_id = command["command_id"]
@@ -69,7 +487,8 @@ class MatchEngine(Context):
             msg = f"no event_type or command_id specified on incoming command {command}"
             LOGGER.warning(msg)
             raise EngineError(msg, RejectReason.BAD_COMMAND)
-        next_sequence = self.message_id
+        # a new match starts its own sequence from 0
+        next_sequence = session.message_id if session else 0
         if command_id != next_sequence:
             msg = (
                 f"command_id from client out of sequence with engine client="
@@ -77,17 +496,58 @@ class MatchEngine(Context):
             )
             LOGGER.warning(msg)
             raise EngineError(msg, RejectReason.BAD_COMMAND)
-        self._events.append(command)
+        events = session.events if session else self._events
+        events.append(command)
         try:
             event_type = EventType(event_type_code)
         except ValueError:
             msg = f"invalid event type {event_type_code}"
             LOGGER.error(msg)
             raise EngineError(msg, RejectReason.BAD_COMMAND)
-        resp = self.handle_event(event_type, command["body"])
+        self.dispatch_counts[event_type] += 1
+        if event_type in self._event_handlers:
+            payload = command.get("body")
+            if session and isinstance(payload, dict) and "match_id" not in payload:
+                # act on the match the command was routed to, rather than on the
+                # latest one started, which may be another scorer's
+                payload = dict(payload, match_id=session.match_id)
+            resp = self.handle_event(event_type, payload)
+        elif session:
+            resp = self.dispatch(session, event_type, command.get("body"))
+        else:
+            msg = f"no match has been started to handle event {event_type}"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         message = self.create_message(event_type, resp)
+        if event_type == EventType.MATCH_STARTED:
+            message["match_id"] = self._latest_session.match_id
         return message
 
+    def dispatch(self, session: MatchSession, event_type: EventType, payload: dict):
+        """hand an event to whichever context of the match handles it, with one
+        lookup in the match's routing table rather than a walk down the contexts"""
+        if session.routes is None:
+            session.routes = session.match.routing_table()
+        try:
+            context, handler = session.routes[event_type]
+        except KeyError:
+            msg = f"match {session.match_id} cannot handle event {event_type} yet"
+            LOGGER.warning(msg)
+            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        try:
+            context.touch()
+            return handler(payload)
+        finally:
+            if event_type in ROUTE_CHANGING_EVENTS:
+                session.routes = None
+
+    def dispatch_stats(self) -> dict:
+        """how many commands of each event type have been dispatched"""
+        return {
+            event_type.value: count
+            for event_type, count in self.dispatch_counts.items()
+        }
+
     def description(self) -> dict:
         return {"engine_user": "pflanagan"}
 
@@ -99,32 +559,133 @@ class MatchEngine(Context):
     def overview(self) -> dict:
         return {"description": self.description(), "overview": self.snapshot()}
 
-    def send_message(self, message: dict, is_snapshot=False):
+    def create_snapshot_message(self, session: MatchSession) -> dict:
+        """snapshot the match or, in delta mode, just the parts of it whose contexts
+        changed since the previously sent snapshot of the same match"""
+        tracker = session.snapshot_tracker
+        session.snapshot_version += 1
+        if self.snapshot_mode == SnapshotMode.DELTA and tracker.snapshot is not None:
+            return {
+                "match_id": session.match_id,
+                "version": session.snapshot_version,
+                "base_version": session.snapshot_version - 1,
+                "is_delta": True,
+                "delta": tracker.update(session.match),
+            }
+        tracker.reset(session.match)
+        return self.request_snapshot(session.match_id)
+
+    def request_snapshot(self, match_id: Optional[int] = None) -> dict:
+        """the full snapshot as of the most recently sent version, so that a listener
+        can resync and then apply any subsequent deltas on top of it"""
+        session = self.get_session(match_id)
+        tracker = session.snapshot_tracker
+        if tracker.snapshot is None:
+            tracker.reset(session.match)
+        message = tracker.copy()
+        message["version"] = session.snapshot_version
+        message["is_delta"] = False
+        return message
+
+    def match_stats(self, match_id: Optional[int] = None) -> dict:
+        """the commands processed, CPU time spent and approximate memory held by a
+        match. The memory figure walks the whole match so is not for the hot path"""
+        session = self.get_session(match_id)
+        stats = session.stats.to_dict()
+        stats["match_id"] = session.match_id
+        stats["memory_bytes"] = util.deep_sizeof(session, exclude=SHARED_TYPES)
+        return stats
+
+    def remove_match(self, match_id: int):
+        """forget a match, e.g. once it has completed and been persisted"""
+        session = self.sessions.pop(match_id)
+        if session is self._latest_session:
+            self._latest_session = None
+        for versions in self._sent_versions.values():
+            versions.pop(match_id, None)
+        if self.journal:
+            self.journal.append_removal(match_id)
+            self.journal.commit()
+        if self.checkpoints:
+            self.checkpoints.remove(match_id)
+
+    def send_message(
+        self,
+        message: dict,
+        is_snapshot=False,
+        innings: Optional[int] = None,
+        event: Optional[str] = None,
+    ):
         message["is_snapshot"] = is_snapshot
-        for listener in self._score_listeners:
-            listener.on_message(message)
+        start = time.perf_counter()
+        listeners = [
+            (listener, codec)
+            for listener, codec, subscription in self._score_listeners
+            if subscription is None or subscription.matches(message, innings)
+        ]
+        encode_time = 0.0
+        if is_snapshot:
+            listeners, behind = self._split_by_version(message, listeners)
+            if behind:
+                full = self.request_snapshot(message["match_id"])
+                full["is_snapshot"] = True
+                encode_time += deliver(behind, full)
+        encode_time += deliver(listeners, message)
+        self._observe_delivery(
+            event or message.get("event", EventType.REJECT.value),
+            time.perf_counter() - start,
+            encode_time,
+        )
+
+    def _split_by_version(self, message: dict, listeners: list) -> tuple[list, list]:
+        """split the listeners to send a snapshot into those sent the version it
+        builds on and those behind, e.g. as they joined partway through or their
+        subscription only now lets the match's snapshots through. A delta is no use to
+        a listener behind, which is sent the full snapshot instead"""
+        in_step, behind = [], []
+        for listener, codec in listeners:
+            versions = self._sent_versions.setdefault(id(listener), {})
+            if (
+                message.get("is_delta")
+                and versions.get(message["match_id"]) != message["base_version"]
+            ):
+                behind.append((listener, codec))
+            else:
+                in_step.append((listener, codec))
+            versions[message["match_id"]] = message["version"]
+        return in_step, behind
+
+    def _observe_delivery(self, event: str, elapsed: float, encode_time: float):
+        if encode_time:
+            self.metrics.observe(Phase.ENCODE, event, encode_time)
+        self.metrics.observe(Phase.FANOUT, event, elapsed - encode_time)
+
+    def send_batch(self, envelope: dict, innings: list[Optional[int]]):
+        """send a batch envelope, cut down for each subscribed listener to the
+        messages it has subscribed to. A listener with nothing left in the batch is
+        sent nothing"""
+        envelope["is_snapshot"] = False
+        start = time.perf_counter()
+        encode_time = 0.0
+        unfiltered = []
+        for listener, codec, subscription in self._score_listeners:
+            if subscription is None:
+                unfiltered.append((listener, codec))
+                continue
+            batch = [
+                message
+                for message, message_innings in zip(envelope["batch"], innings)
+                if subscription.matches(message, message_innings)
+            ]
+            if batch:
+                encode_time += deliver([(listener, codec)], dict(envelope, batch=batch))
+        encode_time += deliver(unfiltered, envelope)
+        self._observe_delivery(BATCH_LABEL, time.perf_counter() - start, encode_time)
 
+    @validated(EventType.MATCH_STARTED)
     def handle_match_started(self, payload: dict):
-        try:
-            match_type_shortname = payload["match_type"]
-        except KeyError:
-            msg = "must specify match_type on new match command"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
-        if self.current_match and self.current_match.state == MatchState.IN_PROGRESS:
-            msg = (
-                f"match_id {self.current_match.match_id} is still in "
-                f"progress, cannot start a new match until this is completed"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         start_time = util.get_current_time()
-        try:
-            match_type = get_match_type(match_type_shortname)
-        except ValueError:
-            msg = f"invalid match type: {match_type_shortname}"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        match_type = get_match_type(payload["match_type"])
         home_team = self.entity_registrar.get_entity_data(
             EntityType.TEAM, payload["home_team"]
         )
@@ -132,39 +693,104 @@ class MatchEngine(Context):
             EntityType.TEAM, payload["away_team"]
         )
         mse = MatchStartedEvent(
-            self.match_id, match_type, start_time, home_team, away_team
+            self.next_match_id, match_type, start_time, home_team, away_team
         )
         message = self.on_match_started(mse)
         return message
 
+    @validated(EventType.MATCH_COMPLETED)
     def handle_match_completed(self, payload: dict):
         end_time = util.get_current_time()
-        match_id = payload.get("match_id")
+        match_id = self.get_session(payload.get("match_id")).match_id
         reason = payload.get("reason")
-        if match_id != self.current_match.match_id:
-            msg = (
-                "match_id from event payload {match_id} does not equal "
-                "current match_id {self.current_match.match_id}"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         mce = MatchCompletedEvent(match_id, end_time, reason)
-        self.on_match_completed(mce)
-        return mce
+        return self.on_match_completed(mce)
 
     def on_match_started(self, mse: MatchStartedEvent):
-        self.current_match = Match(
-            mse, self, self.entity_registrar, self.command_registrar
+        session = MatchSession(
+            mse.match_id,
+            CommandRegistrar(self.retention),
+            self.snapshot_scheduler(),
+            self.retention,
         )
-        self._child_context = self.current_match
-        return self.current_match.overview()
+        session.match = Match(
+            mse, self, self.entity_registrar, session.command_registrar
+        )
+        self.sessions[mse.match_id] = session
+        self._latest_session = session
+        self.next_match_id += self.match_id_step
+        return session.match.overview()
 
     def on_match_completed(self, mce: MatchCompletedEvent):
-        self.current_match.state = mce.reason
-        return self.current_match.overview()
+        match = self.sessions[mce.match_id].match
+        match.state = mce.reason
+        match.touch()
+        return match.overview()
+
+    def register_client(
+        self,
+        client: "EngineClient",
+        codec: Optional[str] = None,
+        max_depth: Optional[int] = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST_SNAPSHOT,
+        subscription: Optional[Subscription] = None,
+    ):
+        """listen to the engine's messages, optionally already encoded with the named
+        codec. Given a max_depth, messages are queued and delivered from a thread of
+        the listener's own, with the overflow policy deciding what happens when the
+        listener falls that far behind. Given a subscription, the listener is only
+        sent the messages it matches"""
+        codec = get_codec(codec) if codec else None
+        if max_depth is not None:
+            resync = None
+            if self.snapshot_mode == SnapshotMode.DELTA:
+                resync = functools.partial(self._queued_full_snapshot, codec)
+            client = QueuedListener(
+                client, max_depth, overflow, self.unregister_client, resync
+            )
+        self._score_listeners.append((client, codec, subscription))
 
-    def register_client(self, client: "EngineClient"):
-        self._score_listeners.append(client)
+    def _queued_full_snapshot(
+        self, codec: Optional[Codec], match_id: int
+    ) -> Optional[tuple]:
+        """the full snapshot a queued listener is sent in place of the deltas it has
+        no room for, as the (message, payload) it queues"""
+        if match_id not in self.sessions:
+            return None
+        message = self.request_snapshot(match_id)
+        message["is_snapshot"] = True
+        return message, codec.encode(message) if codec else None
+
+    def unregister_client(self, client):
+        # the list is replaced rather than changed, as this may happen while a
+        # message is being delivered
+        removed = [
+            listener
+            for listener, _, _ in self._score_listeners
+            if listener is client or getattr(listener, "listener", None) is client
+        ]
+        self._score_listeners = [
+            (listener, codec, subscription)
+            for listener, codec, subscription in self._score_listeners
+            if listener not in removed
+        ]
+        for listener in removed:
+            self._sent_versions.pop(id(listener), None)
+        if isinstance(client, QueuedListener):
+            # don't wait for the thread, it may be stuck on a slow listener
+            client.close(timeout=0)
+
+    def listener_stats(self) -> list[dict]:
+        """queue depth of each listener that is delivered to asynchronously"""
+        return [
+            {
+                "listener": repr(listener.listener),
+                "depth": listener.depth,
+                "dropped": listener.dropped,
+            }
+            for listener, _, _ in self._score_listeners
+            if isinstance(listener, QueuedListener)
+        ]
 
     def create_message(self, event_type: EventType, message: dict):
         message = {
@@ -174,27 +800,93 @@ class MatchEngine(Context):
         return message
 
 
+# the engine methods a profile covers, besides process_command which counts commands
+PROFILED_METHODS = ("send_message", "send_batch")
+# the entry points after which a profile may have run its course
+REQUEST_METHODS = ("on_command", "on_commands")
+
+# events that change which contexts of a match handle the others
+ROUTE_CHANGING_EVENTS = {
+    EventType.MATCH_STARTED,
+    EventType.INNINGS_STARTED,
+    EventType.INNINGS_COMPLETED,
+    EventType.MATCH_COMPLETED,
+}
+
+
+def innings_of(session: Optional[MatchSession]) -> Optional[int]:
+    """the innings a match is in, or has just completed"""
+    if session is None or not session.match.match_inningses:
+        return None
+    return session.match.match_inningses[-1].match_innings_num
+
+
+def event_of(message: dict) -> Optional[EventType]:
+    """the event type acked by a message, or None if the message is a reject"""
+    if "reject_reason" in message:
+        return None
+    return EventType(message["event"])
+
+
+# entities and infrastructure shared by every match, which should not count towards
+# the memory used by any one of them
+SHARED_TYPES = (MatchEngine, EntityRegistrar, Entity, enum.Enum)
+
+
+def create_engine(config, shard: int = 0, num_shards: int = 1) -> MatchEngine:
+    """the engine the config describes. Each of num_shards engines sharing out matches
+    between them keeps its journal, checkpoints and profiles apart from the others'"""
+    suffix = f"-shard{shard}" if num_shards > 1 else ""
+    profile_dir = config.get("ENGINE", "profile_dir", fallback=None) or None
+    if profile_dir and suffix:
+        profile_dir += suffix
+        os.makedirs(profile_dir, exist_ok=True)
+    registrar = EntityRegistrar(config)
+    snapshot_mode = SnapshotMode(
+        config.get("ENGINE", "snapshot_mode", fallback=SnapshotMode.FULL.value)
+    )
+    snapshot_scheduler = functools.partial(
+        SnapshotScheduler,
+        SnapshotPolicy(
+            config.get(
+                "ENGINE", "snapshot_policy", fallback=SnapshotPolicy.EVERY_COMMAND.value
+            )
+        ),
+        config.getint("ENGINE", "snapshot_every", fallback=1),
+        config.getfloat("ENGINE", "snapshot_interval_ms", fallback=0),
+    )
+    engine = MatchEngine(
+        registrar,
+        snapshot_mode,
+        snapshot_scheduler,
+        first_match_id=shard,
+        match_id_step=num_shards,
+        journal=create_journal(config, suffix),
+        checkpoints=create_checkpoint_store(config, suffix),
+        retention=create_retention_policy(config),
+        profile_dir=profile_dir,
+    )
+    engine.recover()
+    return engine
+
+
 def run_server():
     config = util.load_config()
-    registrar = EntityRegistrar(config)
-    engine = MatchEngine(registrar)
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    engine = create_engine(config)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s, closing(engine):
         s.bind((config["ENGINE"]["host"], config.getint("ENGINE", "port")))
         s.listen()
         while True:
             conn, address = s.accept()
+            print(f"Connected by {address}")
+            framed = FramedSocket(conn)
             with conn:
-                print(f"Connected by {address}")
-                full_message = ""
                 while True:
-                    data = conn.recv(1024)
-                    if not data:
+                    command = framed.receive()
+                    if command is None:
                         break
-                    full_message += data.decode()
-                    json_command = json.loads(full_message)
-                    resp = engine.on_command(json_command)
-                    resp_str = json.dumps(resp)
-                    conn.sendall(resp_str.encode())
+                    resp = engine.on_request(command)
+                    framed.send(resp)
 
 
 class EngineState(enum.Enum):
@@ -0,0 +1,230 @@
+"""
+Synthetic matches in the engine's own command protocol, for benchmarking and soak
+testing. Each match is scored through a scratch engine as it is generated, so every
+command in it is one the engine accepts, and it is drawn from a random generator
+seeded per match so the same seed always gives the same match.
+
+Matches cover lineups, overs, extras, wickets of every dismissal type and innings
+ending in every way an innings can end: all out, overs complete, declared (first
+class only) or target reached.
+"""
+import random
+from typing import Optional, Sequence
+
+from scorpyo.definitions.dismissal import get_all_types as get_dismissal_types
+from scorpyo.definitions.innings import InningsState
+from scorpyo.definitions.match import get_all_shortcodes
+from scorpyo.engine import MatchEngine
+from scorpyo.entity import EntityType
+from scorpyo.innings import Innings
+from scorpyo.registrar import EntityRegistrar
+
+LINEUP_SIZE = 11
+NUM_BOWLERS = 6
+
+# weights of the outcome of a ball without a wicket
+BALL_OUTCOMES = {
+    ".": 380,
+    "1": 300,
+    "2": 80,
+    "3": 15,
+    "4": 100,
+    "6": 35,
+    "w": 20,
+    "2w": 3,
+    "5w": 1,
+    "1nb": 10,
+    "5nb": 2,
+    "1b": 5,
+    "4b": 2,
+    "1lb": 15,
+    "2lb": 3,
+}
+# likelihood that a ball takes a wicket, as it varies with the format
+WICKET_CHANCE = {"T20": 1 / 20, "OD": 1 / 30, "FC": 1 / 50}
+# weights of each kind of dismissal, keyed by shortcode
+DISMISSAL_WEIGHTS = {
+    "b": 200,
+    "ct": 450,
+    "lbw": 150,
+    "st": 40,
+    "ro": 100,
+    "hw": 10,
+    "ht": 3,
+    "to": 3,
+    "hb": 3,
+    "of": 3,
+}
+DISMISSAL_TYPES = list(get_dismissal_types())
+# runs a first class side bats on to before declaring, drawn per innings
+DECLARE_RUNS = (250, 600)
+
+
+class MatchGenerator:
+    """Generates the commands of a match, as a list in the form the clients send
+    them in, without command_id or match_id"""
+
+    def __init__(
+        self,
+        registrar: EntityRegistrar,
+        seed,
+        match_type: Optional[str] = None,
+    ):
+        self.registrar = registrar
+        self.rng = random.Random(seed)
+        self.match_type = match_type or self.rng.choice(sorted(get_all_shortcodes()))
+        self.commands: list[dict] = []
+        self._engine: Optional[MatchEngine] = None
+        self._match_id: Optional[int] = None
+
+    def generate(self) -> list[dict]:
+        self.commands = []
+        self._engine = MatchEngine(self.registrar)
+        self._match_id = None
+        teams = self.rng.sample(self.registrar.get_all_of_type(EntityType.TEAM), 2)
+        players = self.registrar.get_all_of_type(EntityType.PLAYER)
+        if len(players) < 2 * LINEUP_SIZE:
+            raise ValueError(
+                f"need {2 * LINEUP_SIZE} players to pick lineups from, the registrar "
+                f"has {len(players)}"
+            )
+        picked = self.rng.sample(players, 2 * LINEUP_SIZE)
+        response = self.send(
+            "ms",
+            {
+                "match_type": self.match_type,
+                "home_team": teams[0].name,
+                "away_team": teams[1].name,
+            },
+        )
+        self._match_id = response["match_id"]
+        self.send("rlu", {"team": "home", "lineup": [p.name for p in picked[:11]]})
+        self.send("rlu", {"team": "away", "lineup": [p.name for p in picked[11:]]})
+        match = self._engine.get_session(self._match_id).match
+        for innings_num in range(2 * match.max_inningses):
+            if innings_num == 3 and match.next_innings_target == 0:
+                # won by an innings, there's nothing left to chase
+                break
+            batting_team = teams[innings_num % 2]
+            self.send("is", {"batting_team": batting_team.name})
+            self.play_innings(match.current_innings, innings_num)
+        self.send("mc", {})
+        return self.commands
+
+    def send(self, event: str, body: dict) -> dict:
+        command = {"event": event, "body": body}
+        routed = dict(command, command_id=len(self.commands))
+        if self._match_id is not None:
+            routed["match_id"] = self._match_id
+        response = self._engine.on_command(routed)
+        if "reject_reason" in response:
+            raise RuntimeError(f"generated command {command} rejected: {response}")
+        self.commands.append(command)
+        return response
+
+    def play_innings(self, innings: Innings, innings_num: int):
+        for _ in range(2):
+            self.send("bis", {"batter": innings.yet_to_bat[0].name})
+        max_overs = innings.match.max_overs()
+        declare_at = None
+        if max_overs is None and innings_num < 3:
+            declare_at = self.rng.randint(*DECLARE_RUNS)
+        while True:
+            self.send("os", {"bowler": self.choose_bowler(innings).name})
+            while innings.current_over.balls_bowled < 6:
+                ending = self.play_ball(innings)
+                if ending:
+                    self.send("ic", {"reason": ending.value})
+                    return
+            if len(innings.overs) == max_overs:
+                self.send("ic", {"reason": InningsState.OVERS_COMPLETE.value})
+                return
+            if declare_at is not None and innings.total_runs >= declare_at:
+                self.send("ic", {"reason": InningsState.DECLARED.value})
+                return
+            self.send("oc", {})
+
+    def choose_bowler(self, innings: Innings):
+        limit = innings.match.max_bowler_overs
+        bowled = {
+            bowler_innings.player: bowler_innings.overs_completed
+            for bowler_innings in innings.current_bowler_inningses
+        }
+        candidates = [
+            player
+            for player in innings.bowling_lineup[-NUM_BOWLERS:]
+            if player != innings.current_bowler
+            and (limit is None or bowled.get(player, 0) < limit)
+        ]
+        return self.rng.choice(candidates)
+
+    def play_ball(self, innings: Innings) -> Optional[InningsState]:
+        """bowl a ball and deal with any wicket, returning how the innings ended if
+        it did"""
+        if self.rng.random() < WICKET_CHANCE[self.match_type]:
+            dismissed = self.bowl_wicket(innings)
+            self.send("bic", {"batter": dismissed.name})
+        else:
+            dismissed = None
+            score_text = self.rng.choices(
+                list(BALL_OUTCOMES), weights=list(BALL_OUTCOMES.values())
+            )[0]
+            self.send("bc", {"score_text": score_text})
+        if innings.target_reached:
+            return InningsState.TARGET_REACHED
+        if dismissed:
+            if not innings.yet_to_bat:
+                return InningsState.ALL_OUT
+            self.send("bis", {"batter": innings.yet_to_bat[0].name})
+        return None
+
+    def bowl_wicket(self, innings: Innings):
+        """bowl a ball taking a wicket, returning the batter dismissed"""
+        dismissal_type = self.rng.choices(
+            DISMISSAL_TYPES,
+            weights=[DISMISSAL_WEIGHTS[dt.shortcode] for dt in DISMISSAL_TYPES],
+        )[0]
+        dismissal = {"type": dismissal_type.shortcode}
+        score_text = "W"
+        if dismissal_type.batter_implied:
+            dismissed = innings.striker
+        else:
+            dismissed = self.rng.choice([innings.striker, innings.non_striker])
+            dismissal["batter"] = dismissed.name
+            if dismissal_type.shortcode == "ro":
+                score_text = self.rng.choice(["W", "1W", "2W"])
+        if dismissal_type.shortcode == "st":
+            # the keeper, who isn't needed but always makes a stumping
+            dismissal["fielder"] = innings.bowling_lineup[0].name
+        elif dismissal_type.needs_fielder:
+            dismissal["fielder"] = self.rng.choice(list(innings.bowling_lineup)).name
+        self.send("bc", {"score_text": score_text, "dismissal": dismissal})
+        return dismissed
+
+
+def generate_match(
+    registrar: EntityRegistrar, seed, match_type: Optional[str] = None
+) -> list[dict]:
+    return MatchGenerator(registrar, seed, match_type).generate()
+
+
+def match_seed(seed: int, match_num: int) -> str:
+    """the seed of each match in a corpus, so that any one of them can be generated
+    again alone, in whatever order and process"""
+    return f"{seed}:{match_num}"
+
+
+def generate_corpus(
+    registrar: EntityRegistrar,
+    seed: int,
+    count: int,
+    match_types: Optional[Sequence[str]] = None,
+) -> list[list[dict]]:
+    """count matches, cycling through the match types given, or all of them"""
+    match_types = list(match_types or sorted(get_all_shortcodes()))
+    return [
+        generate_match(
+            registrar, match_seed(seed, n), match_types[n % len(match_types)]
+        )
+        for n in range(count)
+    ]
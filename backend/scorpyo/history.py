@@ -0,0 +1,198 @@
+"""
+Retention of the engine's ever growing histories (commands, messages and ball
+events). Each history keeps its most recent items in memory and spills older ones
+to a segment file, from which they can still be read back by index or range.
+"""
+import os
+import pickle
+import tempfile
+import uuid
+from array import array
+from collections import deque
+from typing import Any, Iterator, Optional
+
+SPILL_SUFFIX = ".spill"
+# the offsets of the items in a spill file are kept alongside it
+INDEX_SUFFIX = ".idx"
+COPY_CHUNK_SIZE = 1 << 20
+
+
+class RetentionPolicy:
+    """how many items of each history to keep in memory (None for all of them) and
+    the directory the older items are spilled to"""
+
+    def __init__(self, capacity: Optional[int] = None, directory: Optional[str] = None):
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"history capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.directory = directory
+
+
+def create_history(retention: Optional[RetentionPolicy] = None) -> "History":
+    """a history retained as the policy says, or wholly in memory without one"""
+    if retention is None:
+        return History()
+    return History(retention.capacity, retention.directory)
+
+
+class History:
+    """An append only sequence with a bounded memory footprint.
+
+    Once more than capacity items have been appended the oldest is pickled onto the
+    end of a segment file, and only its offset is kept in memory. The segment is an
+    anonymous temporary file, so it is cleaned up by the operating system when the
+    history is closed or collected. A history can only be pickled once its spilled
+    items have been persisted to a spill file, which the pickle then refers to.
+    Only items still in memory can be popped."""
+
+    def __init__(self, capacity: Optional[int] = None, directory: Optional[str] = None):
+        self.capacity = capacity
+        self.directory = directory
+        self._recent: deque = deque()
+        # offsets[i] and offsets[i + 1] bound the i-th spilled item in the segment
+        self._offsets = array("Q", [0])
+        self._segment = None
+        self._spill_path: Optional[str] = None
+        self._num_persisted = 0
+
+    @property
+    def num_spilled(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.num_spilled + len(self._recent)
+
+    def append(self, item: Any):
+        self._recent.append(item)
+        if self.capacity is not None and len(self._recent) > self.capacity:
+            self._spill(self._recent.popleft())
+
+    def pop(self) -> Any:
+        if not self._recent:
+            raise IndexError("only items still held in memory can be removed")
+        return self._recent.pop()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        if index >= self.num_spilled:
+            return self._recent[index - self.num_spilled]
+        return self._read_spilled(index, index + 1)[0]
+
+    def range(self, start: int, stop: int) -> list:
+        """the items from start up to stop, reading any spilled ones in one pass"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        spilled_stop = min(stop, self.num_spilled)
+        items = self._read_spilled(start, spilled_stop) if start < spilled_stop else []
+        recent_start = max(start, self.num_spilled) - self.num_spilled
+        recent_stop = stop - self.num_spilled
+        items.extend(self._recent[i] for i in range(recent_start, recent_stop))
+        return items
+
+    def __iter__(self) -> Iterator:
+        if self.num_spilled:
+            yield from self._read_spilled(0, self.num_spilled)
+        yield from self._recent
+
+    def _open_segment(self):
+        self._segment = tempfile.TemporaryFile(
+            prefix="scorpyo-history-", dir=self.directory
+        )
+
+    def _spill(self, item: Any):
+        if self._segment is None:
+            self._open_segment()
+        self._segment.seek(0, 2)
+        self._segment.write(pickle.dumps(item, pickle.HIGHEST_PROTOCOL))
+        self._offsets.append(self._segment.tell())
+
+    def _read_spilled(self, start: int, stop: int) -> list:
+        self._segment.seek(self._offsets[start])
+        data = self._segment.read(self._offsets[stop] - self._offsets[start])
+        items = []
+        for i in range(start, stop):
+            begin = self._offsets[i] - self._offsets[start]
+            end = self._offsets[i + 1] - self._offsets[start]
+            items.append(pickle.loads(data[begin:end]))
+        return items
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def persist_spilled(self, prefix: str):
+        """copy the spilled items to a spill file whose path starts with prefix, so
+        that a pickle of the history can refer to them rather than carry them. The
+        file is only ever appended to, so each call copies just the items spilled
+        since the one before"""
+        if self.num_spilled == self._num_persisted:
+            return
+        if self._spill_path is None:
+            self._spill_path = f"{prefix}{uuid.uuid4().hex}{SPILL_SUFFIX}"
+        start = self._offsets[self._num_persisted]
+        self._segment.seek(start)
+        with _open_for_update(self._spill_path) as fh:
+            # anything past start was persisted by a run that did not get as far as
+            # pickling the history, so is overwritten
+            fh.seek(start)
+            _copy(self._segment, fh, self._offsets[-1] - start)
+            _sync(fh)
+        with _open_for_update(self._spill_path + INDEX_SUFFIX) as fh:
+            fh.seek(self._num_persisted * self._offsets.itemsize)
+            self._offsets[self._num_persisted + 1 :].tofile(fh)
+            _sync(fh)
+        self._num_persisted = self.num_spilled
+
+    def __getstate__(self) -> dict:
+        if self._num_persisted != self.num_spilled:
+            raise pickle.PicklingError(
+                "a history's spilled items must be persisted before it is pickled"
+            )
+        return dict(self.__dict__, _segment=None, _offsets=None)
+
+    def __setstate__(self, state: dict):
+        # the spilled items are copied out of the spill file into a segment of their
+        # own, which leaves the file as it was for the next checkpoint to append to
+        self.__dict__.update(state)
+        self._offsets = array("Q", [0])
+        if self._num_persisted:
+            with open(self._spill_path + INDEX_SUFFIX, "rb") as fh:
+                self._offsets.fromfile(fh, self._num_persisted)
+            self._open_segment()
+            with open(self._spill_path, "rb") as fh:
+                _copy(fh, self._segment, self._offsets[-1])
+
+    def __repr__(self) -> str:
+        return f"History(len={len(self)}, in_memory={len(self._recent)})"
+
+
+def _open_for_update(path: str):
+    return open(path, "r+b" if os.path.exists(path) else "wb")
+
+
+def _copy(source, target, size: int):
+    while size > 0:
+        chunk = source.read(min(size, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise EOFError("spilled history items are missing from their file")
+        target.write(chunk)
+        size -= len(chunk)
+
+
+def _sync(fh):
+    fh.truncate()
+    fh.flush()
+    os.fsync(fh.fileno())
+
+
+def create_retention_policy(config) -> RetentionPolicy:
+    capacity = config.getint("ENGINE", "history_capacity", fallback=0)
+    directory = config.get("ENGINE", "history_dir", fallback=None)
+    return RetentionPolicy(capacity or None, directory or None)
@@ -1,4 +1,6 @@
-from typing import Optional, List
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional, List
 
 import scorpyo.util as util
 from scorpyo.error import EngineError, RejectReason
@@ -17,10 +19,31 @@ from scorpyo.event import (
     record_command,
 )
 from scorpyo.entity import EntityType
+from scorpyo.ledger import BallLedger, LedgerScore
 from scorpyo.over import Over, OverState
 from scorpyo.entity import Player
 from scorpyo.score import Scoreable, Score
 from scorpyo.definitions.innings import InningsState, BatterInningsState
+from scorpyo.validation import validated
+
+
+# how many of the most recent transitions in an innings can be undone
+UNDO_DEPTH = 1000
+
+
+@dataclass
+class UndoRecord:
+    """what is needed to reverse one transition of an innings. The batters at the
+    crease and any pending dismissal are captured for every transition; the other
+    fields depend on the event"""
+
+    event_type: EventType
+    on_strike_innings: Optional["BatterInnings"]
+    off_strike_innings: Optional["BatterInnings"]
+    dismissal_pending: bool
+    event: Any = None
+    target: Any = None
+    previous_state: Any = None
 
 
 class Innings(Context, Scoreable):
@@ -32,7 +55,7 @@ class Innings(Context, Scoreable):
         command_registrar: "CommandRegistrar",
     ):
         Context.__init__(self)
-        Scoreable.__init__(self)
+        Scoreable.__init__(self, match.ball_store)
         self.match = match
         self.entity_registrar = entity_registrar
         self.command_registrar = command_registrar
@@ -56,6 +79,14 @@ class Innings(Context, Scoreable):
         self.batter_inningses = []
         self.ball_in_match_innings_num = 0
         self.ball_in_over_num = 0
+        self.ledger = BallLedger()
+        self._score = LedgerScore(self.ledger, self._ball_ids)
+        # the yet to bat part of the overview, keyed on who has batted
+        self._yet_to_bat_overview = (None, [])
+        # a ball can only be undone while it is still held in memory
+        capacity = self.ball_store.capacity
+        undo_depth = UNDO_DEPTH if capacity is None else min(UNDO_DEPTH, capacity)
+        self._undo_log: deque[UndoRecord] = deque(maxlen=undo_depth)
 
         # TODO pflanagan: should be able to link the handlers and the status
         #  dependencies so that the tree is walked automatically based on the handled
@@ -69,6 +100,7 @@ class Innings(Context, Scoreable):
         )
         self.add_handler(EventType.OVER_COMPLETED, self.handle_over_completed)
         self.add_handler(EventType.OVER_STARTED, self.handle_over_started)
+        self.add_handler(EventType.UNDO, self.handle_undo)
 
     @property
     def current_over(self) -> Over:
@@ -171,9 +203,9 @@ class Innings(Context, Scoreable):
         return output
 
     def describe_prev_ball(self) -> Optional[dict]:
-        if len(self._ball_events) == 0:
+        prev_ball: BallCompletedEvent = self.previous_ball
+        if prev_ball is None:
             return None
-        prev_ball: BallCompletedEvent = self._ball_events[-1]
         prev_score: Score = prev_ball.ball_score
         output = {
             "runs": prev_score.total_runs,
@@ -204,27 +236,17 @@ class Innings(Context, Scoreable):
             output["current_over"] = self.current_over.snapshot()
         return output
 
-    def overview(self):
+    def parent_contexts(self) -> tuple:
+        return (self.match,)
+
+    def render_overview(self):
         output = self.description()
         output.update(self.snapshot())
 
         batter_status = []
         for batting_innings in self.batter_inningses:
             batter_status.append(batting_innings.overview())
-        order_num = 12 - self.num_batters_remaining
-        for player in self.yet_to_bat:
-            overview = {
-                "name": player.name,
-                "order_number": order_num,
-                "balls": 0,
-                "runs": 0,
-                "fours": 0,
-                "sixes": 0,
-                "dots": 0,
-                "dismissal": "DNB",
-            }
-            order_num += 1
-            batter_status.append(overview)
+        batter_status.extend(self.yet_to_bat_overview())
         bowler_status = []
         for bowler_innings in self.current_bowler_inningses:
             bowler_status.append(bowler_innings.overview())
@@ -236,6 +258,32 @@ class Innings(Context, Scoreable):
         output["overs"] = over_status
         return output
 
+    def yet_to_bat_overview(self) -> list[dict]:
+        # keyed on who has batted, not how many, as an undone batter can be
+        # replaced by another
+        batted, overview = self._yet_to_bat_overview
+        already_batted = tuple(self.already_batted)
+        if batted == already_batted:
+            return overview
+        overview = []
+        order_num = 12 - self.num_batters_remaining
+        for player in self.yet_to_bat:
+            overview.append(
+                {
+                    "name": player.name,
+                    "order_number": order_num,
+                    "balls": 0,
+                    "runs": 0,
+                    "fours": 0,
+                    "sixes": 0,
+                    "dots": 0,
+                    "dismissal": "DNB",
+                }
+            )
+            order_num += 1
+        self._yet_to_bat_overview = (already_batted, overview)
+        return overview
+
     def ascii_status(self):
         resp = f"{self.total_runs}-{self.wickets_down} after {self.overs_bowled}\n\n"
         for i, b_innings in enumerate(
@@ -260,6 +308,7 @@ class Innings(Context, Scoreable):
         # number should be indexed from 0
         return self.overs[number]
 
+    @validated(EventType.BALL_COMPLETED)
     def handle_ball_completed(self, payload: dict) -> dict:
         ball_score = Score.parse(payload["score_text"])
         dismissal = None
@@ -291,25 +340,18 @@ class Innings(Context, Scoreable):
         )
         return self.on_ball_completed(bce)
 
+    @validated(EventType.BATTER_INNINGS_STARTED)
     def handle_batter_innings_started(self, payload: dict) -> dict:
-        try:
-            batter = payload["batter"]
-        except KeyError:
-            try:
-                player = self.next_batter
-            except IndexError:
-                msg = "cannot process new batter innings as there are no players left"
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        if "batter" in payload:
+            player = self.entity_registrar.get_entity_data(
+                EntityType.PLAYER, payload["batter"]
+            )
         else:
-            player = self.entity_registrar.get_entity_data(EntityType.PLAYER, batter)
-        if player in self.already_batted:
-            msg = "batter has already batted"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+            player = self.next_batter
         bis = BatterInningsStartedEvent(player)
         return self.on_batter_innings_started(bis)
 
+    @validated(EventType.BATTER_INNINGS_COMPLETED)
     def handle_batter_innings_completed(self, payload: dict) -> dict:
         batter = self.entity_registrar.get_entity_data(
             EntityType.PLAYER, payload.get("batter")
@@ -319,41 +361,17 @@ class Innings(Context, Scoreable):
         bic = BatterInningsCompletedEvent(batter, state)
         return self.on_batter_innings_completed(bic)
 
+    @validated(EventType.OVER_STARTED)
     def handle_over_started(self, payload: dict) -> dict:
-        if "bowler" not in payload:
-            msg = "must specify bowler of new over"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
         bowler = self.entity_registrar.get_entity_data(
             EntityType.PLAYER, payload["bowler"]
         )
-        if bowler not in self.bowling_lineup:
-            msg = f"bowler {bowler} does not play for team {self.bowling_lineup}"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
-        next_over_num = len(self.overs)
-        max_overs_allowed = self.match.max_overs()
-        if next_over_num >= max_overs_allowed:
-            msg = f"innings already has max number of overs {max_overs_allowed}"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        os = OverStartedEvent(bowler, next_over_num)
+        os = OverStartedEvent(bowler, len(self.overs))
         return self.on_over_started(os)
 
+    @validated(EventType.OVER_COMPLETED)
     def handle_over_completed(self, payload: dict) -> dict:
-        if "bowler" not in payload:
-            bowler = self.current_bowler
-        else:
-            bowler = self.entity_registrar.get_entity_data(
-                EntityType.PLAYER, payload["bowler"]
-            )
-            if bowler != self.current_bowler:
-                msg = (
-                    f"OverCompleted event raised for a bowler {bowler} who is "
-                    "not the bowler of the most recent over"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.BAD_COMMAND)
+        bowler = self.current_bowler
         reason_code = payload.get("reason")
         if not reason_code:
             reason = OverState.COMPLETED
@@ -363,16 +381,80 @@ class Innings(Context, Scoreable):
         oce = OverCompletedEvent(over_number, bowler, reason)
         return self.on_over_completed(oce)
 
+    @validated(EventType.UNDO)
+    def handle_undo(self, payload: dict) -> dict:
+        return self.on_undo(payload.get("count", 1))
+
+    def _undo_record(self, event_type: EventType, **kwargs) -> UndoRecord:
+        """capture the state a transition is about to change. The record is only
+        added to the undo log once the transition has succeeded"""
+        return UndoRecord(
+            event_type,
+            self.on_strike_innings,
+            self.off_strike_innings,
+            self._dismissal_pending,
+            **kwargs,
+        )
+
+    def on_undo(self, count: int) -> dict:
+        """revert the most recent count balls, batter innings and over transitions
+        of the innings, latest first"""
+        for _ in range(count):
+            record = self._undo_log.pop()
+            if record.event_type == EventType.BALL_COMPLETED:
+                self._undo_ball_completed(record)
+            elif record.event_type == EventType.BATTER_INNINGS_STARTED:
+                self.batter_inningses.pop()
+            elif record.event_type == EventType.BATTER_INNINGS_COMPLETED:
+                record.target.batting_state = record.previous_state
+                record.target.touch()
+            elif record.event_type == EventType.OVER_COMPLETED:
+                self.current_over.state = record.previous_state
+                self.current_over.touch()
+                self.current_bowler_innings.overs_completed -= 1
+            elif record.event_type == EventType.OVER_STARTED:
+                self._undo_over_started(record)
+            self.on_strike_innings = record.on_strike_innings
+            self.off_strike_innings = record.off_strike_innings
+            self._dismissal_pending = record.dismissal_pending
+        return self.snapshot()
+
+    def _undo_ball_completed(self, record: UndoRecord):
+        bce: BallCompletedEvent = record.event
+        ball_increment = 1 if bce.ball_score.is_valid_delivery() else 0
+        self.ball_in_match_innings_num -= ball_increment
+        self.ball_in_over_num -= ball_increment
+        self.revert_score(bce)
+        self.ledger.pop()
+        record.on_strike_innings.revert_score(bce)
+        self.current_bowler_innings.revert_score(bce)
+        self.current_over.revert_score(bce)
+        self.ball_store.pop()
+        if bce.dismissal:
+            dismissed_innings = record.target
+            dismissed_innings.dismissal, dismissed_innings.batting_state = (
+                record.previous_state
+            )
+            dismissed_innings.touch()
+            if bce.dismissal.bowler_accredited:
+                self.current_bowler_innings.wickets -= 1
+
+    def _undo_over_started(self, record: UndoRecord):
+        self.overs.pop()
+        self.ledger.pop_over()
+        self.current_bowler_innings._overs.pop()
+        self.current_bowler_innings.touch()
+        previous_bowler_innings, created_bowler_innings = record.previous_state
+        if created_bowler_innings:
+            self.current_bowler_inningses.pop()
+        self.current_bowler_innings = previous_bowler_innings
+
     @record_command
     def on_ball_completed(self, bce: BallCompletedEvent) -> dict:
+        undo = self._undo_record(EventType.BALL_COMPLETED, event=bce)
+        self.ball_store.append(bce)
         super().update_score(bce)
-        if self._dismissal_pending:
-            msg = (
-                "received BallCompleted before BatterInningsCompleted while "
-                "dismissal pending"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        self.ledger.append(bce)
         ball_increment = 1 if bce.ball_score.is_valid_delivery() else 0
         self.ball_in_match_innings_num += ball_increment
         self.ball_in_over_num += ball_increment
@@ -382,6 +464,11 @@ class Innings(Context, Scoreable):
                 bce.dismissal.batter,
                 self.batter_inningses,
             )
+            undo.target = dismissed_innings
+            undo.previous_state = (
+                dismissed_innings.dismissal,
+                dismissed_innings.batting_state,
+            )
             dismissed_innings.on_dismissal(bce.dismissal)
             self._dismissal_pending = True
         self.current_bowler_innings.on_ball_completed(bce)
@@ -390,160 +477,86 @@ class Innings(Context, Scoreable):
             self.on_strike_innings, self.off_strike_innings = util.switch_strike(
                 self.on_strike_innings, self.off_strike_innings
             )
+        self._undo_log.append(undo)
         return self.snapshot()
 
     @record_command
     def on_batter_innings_started(self, bis: BatterInningsStartedEvent) -> dict:
-        if self.on_strike_innings and self.off_strike_innings:
-            msg = "there are already two batters at the crease - complete one first"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        try:
-            existing = find_innings(bis.batter, self.batter_inningses)
-        except ValueError:
-            existing = None
-        if (
-            existing
-            and not existing.batting_state != BatterInningsState.RETIRED_NOT_OUT
-        ):
-            msg = (
-                f"batter {existing.batter} has already batted and cannot bat again "
-                f"(current state {existing.batting_state})"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         new_innings = BatterInnings(bis.batter, self, len(self.batter_inningses) + 1)
+        undo = self._undo_record(EventType.BATTER_INNINGS_STARTED)
         self.batter_inningses.append(new_innings)
         if not self.on_strike_innings:
             self.on_strike_innings = new_innings
         else:
             self.off_strike_innings = new_innings
+        self._undo_log.append(undo)
         return new_innings.description()
 
     @record_command
     def on_batter_innings_completed(self, bic: BatterInningsCompletedEvent) -> dict:
-        if bic.batter not in self.batting_lineup:
-            msg = (
-                f"batter {bic.batter} is not part of batting team {self.batting_lineup}"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
         dismissed_innings = find_innings(bic.batter, self.batter_inningses)
+        undo = self._undo_record(
+            EventType.BATTER_INNINGS_COMPLETED,
+            target=dismissed_innings,
+            previous_state=dismissed_innings.batting_state,
+        )
         dismissed_innings.batting_state = bic.batting_state
-        if bic.batting_state == BatterInningsState.DISMISSED:
-            prev_dismissal = self.previous_ball.dismissal
-            if not prev_dismissal:
-                msg = (
-                    "batter innings completed via dismissal ball event has no "
-                    "associated dismissal"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-            elif prev_dismissal.batter != bic.batter:
-                msg = (
-                    f"batter dismissed in previous ball: {prev_dismissal.batter} "
-                    f"does not equal batter whose innings has just completed: {bic.batter}"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.BAD_COMMAND)
-            if dismissed_innings.batting_state != BatterInningsState.DISMISSED:
-                msg = (
-                    f"batter innings completed via a dismissal but batter is "
-                    f"currently in state: {dismissed_innings.batting_state}"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.INCONSISTENT_STATE)
+        dismissed_innings.touch()
         if dismissed_innings == self.on_strike_innings:
             self.on_strike_innings = None
         else:
             self.off_strike_innings = None
         self._dismissal_pending = False
+        self._undo_log.append(undo)
         return dismissed_innings.overview()
 
     @record_command
     def on_over_completed(self, oc: OverCompletedEvent) -> dict:
+        undo = self._undo_record(
+            EventType.OVER_COMPLETED, previous_state=self.current_over.state
+        )
         self.on_strike_innings, self.off_strike_innings = util.switch_strike(
             self.on_strike_innings, self.off_strike_innings
         )
         self.current_over.on_over_completed(oc)
         self.current_bowler_innings.on_over_completed(oc)
+        self._undo_log.append(undo)
         return self.current_over.overview()
 
     @record_command
     def on_over_started(self, os: OverStartedEvent) -> dict:
-        if os.bowler == self.current_bowler:
-            msg = f"bowler {os.bowler} cannot bowl two overs in a row"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if self.current_over and self.current_over.state == OverState.IN_PROGRESS:
-            msg = (
-                "Existing over has not yet completed. Send an "
-                "OverCompleted event before sending an OverStarted event"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         new_over = Over(os.number, os.bowler, self)
         self.overs.append(new_over)
+        self.ledger.start_over()
+        undo = self._undo_record(EventType.OVER_STARTED)
         try:
             bowler_innings = find_innings(os.bowler, self.current_bowler_inningses)
+            created_bowler_innings = False
         except ValueError:
             bowler_innings = BowlerInnings(
                 os.bowler, self, len(self.current_bowler_inningses) + 1
             )
             self.current_bowler_inningses.append(bowler_innings)
-        if bowler_innings.overs_completed == self.match.max_bowler_overs:
-            msg = (
-                f"bowler {os.bowler} has already bowled their full "
-                f"allotment of overs"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+            created_bowler_innings = True
+        undo.previous_state = (self.current_bowler_innings, created_bowler_innings)
         bowler_innings.on_over_started(os)
         self.current_bowler_innings = bowler_innings
+        self._undo_log.append(undo)
         return new_over.description()
 
     def terminate(self, ice: InningsCompletedEvent):
-        if ice.reason == InningsState.ALL_OUT:
-            if len(self.yet_to_bat) != 0:
-                msg = (
-                    f"there are still batters remaining so cannot end the innings "
-                    f"for reason: {ice.reason}"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-            if len(self.active_batter_inningses) > 1:
-                msg = (
-                    f"there are still two batters at the crease, cannot end innings "
-                    f"without terminating one first."
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if ice.reason == InningsState.OVERS_COMPLETE:
-            if len(self.overs) != self.match.max_overs():
-                msg = (
-                    f"the allotted number of overs has not been bowled so cannot end "
-                    f"the innings for reason {ice.reason}"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if ice.reason == InningsState.TARGET_REACHED:
-            if not self.target or self.total_runs < self.target:
-                msg = (
-                    f"there is either no valid target that can be "
-                    f"reached in this innings or the target has not been reached, "
-                    f"so cannot end the innings for reason {ice.reason}. "
-                    f"target={self.target} current_score={self.total_runs}"
-                )
-                LOGGER.warning(msg)
-                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         self.state = ice.reason
         self.end_time = ice.end_time
+        self.touch()
         for innings in self.active_batter_inningses:
             bic_payload = {
                 "batter": str(innings.player),
                 "reason": BatterInningsState.INNINGS_COMPLETE.value,
             }
             self.handle_batter_innings_completed(bic_payload)
+        if self.current_over.state != OverState.IN_PROGRESS:
+            # the innings ended on an over that had already been completed
+            return
         if self.current_over.max_balls_bowled:
             reason_code = OverState.COMPLETED.value
         else:
@@ -555,7 +568,7 @@ class Innings(Context, Scoreable):
 class BatterInnings(Context, Scoreable):
     def __init__(self, player: Player, innings: Innings, order_num: int):
         Context.__init__(self)
-        Scoreable.__init__(self)
+        Scoreable.__init__(self, innings.ball_store)
         self.innings = innings
         self.player = player
         self.order_num = order_num
@@ -582,7 +595,10 @@ class BatterInnings(Context, Scoreable):
         }
         return output
 
-    def overview(self) -> dict:
+    def parent_contexts(self) -> tuple:
+        return (self.innings,)
+
+    def render_overview(self) -> dict:
         output = self.description()
         output.update(self.snapshot())
         return output
@@ -595,6 +611,7 @@ class BatterInnings(Context, Scoreable):
     def on_dismissal(self, dismissal: Dismissal):
         self.dismissal = dismissal
         self.batting_state = BatterInningsState.DISMISSED
+        self.touch()
 
     def on_ball_completed(self, bce: BallCompletedEvent):
         super().update_score(bce)
@@ -609,7 +626,7 @@ class BatterInnings(Context, Scoreable):
 class BowlerInnings(Context, Scoreable):
     def __init__(self, player: Player, innings: Innings, order_num: int):
         Context.__init__(self)
-        Scoreable.__init__(self)
+        Scoreable.__init__(self, innings.ball_store)
         self.innings = innings
         self.player = player
         self.order_num = order_num
@@ -649,7 +666,10 @@ class BowlerInnings(Context, Scoreable):
             "dots": self._score.dots,
         }
 
-    def overview(self) -> dict:
+    def parent_contexts(self) -> tuple:
+        return (self.innings,)
+
+    def render_overview(self) -> dict:
         output = self.description()
         output.update(self.snapshot())
         overs = []
@@ -666,29 +686,19 @@ class BowlerInnings(Context, Scoreable):
         return resp
 
     def on_ball_completed(self, bce: BallCompletedEvent):
-        curr_over = self.current_over
-        if curr_over.balls_bowled == 6 and bce.ball_score.is_valid_delivery():
-            msg = "over has more than 6 legal deliveries"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         super().update_score(bce)
         if bce.dismissal and bce.dismissal.bowler_accredited:
             self.wickets += 1
 
     def on_over_completed(self, oce: OverCompletedEvent):
-        curr_over = self.current_over
-        if curr_over.balls_bowled < 6 and oce.reason == OverState.COMPLETED:
-            msg = (
-                "over cannot have completed with less than 6 legal "
-                "deliveries bowled unless the innings ended"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
         self.overs_completed += 1
+        self.touch()
 
     def on_over_started(self, ose: OverStartedEvent):
         over = self.innings.get_over_by_number(ose.number)
+        over.bowler_innings = self
         self._overs.append(over)
+        self.touch()
 
 
 def find_innings(player: Player, inningses: list):
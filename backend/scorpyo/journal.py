@@ -0,0 +1,147 @@
+"""
+An append-only journal of the commands accepted by the engine, so that a match can
+be rebuilt after a crash. Each record is one line of JSON holding the match_id the
+command was applied to and the command itself, or marking the match as removed.
+"""
+import enum
+import json
+import os
+import threading
+from typing import Iterator
+
+
+DEFAULT_GROUP_COMMIT_MS = 5.0
+WRITE_BUFFER_SIZE = 256 * 1024
+
+
+class Durability(enum.Enum):
+    # fsync before every acknowledgement: nothing acked is ever lost
+    FSYNC = "fsync"
+    # fsync from a background thread every few ms: at most that window is lost if
+    # the machine (rather than just the process) goes down
+    GROUP = "group"
+    # leave it to the operating system to write the journal out
+    NONE = "none"
+
+
+class CommandJournal:
+    """Records are buffered as they are appended and only written out when the
+    engine commits, which it does once per command or once per batch of commands,
+    just before the acknowledgement is sent. The file is flushed on every commit so
+    a crash of the process itself never loses an acknowledged command; the
+    durability setting decides when it is synced to disk"""
+
+    def __init__(
+        self,
+        path: str,
+        durability: Durability = Durability.FSYNC,
+        group_commit_ms: float = DEFAULT_GROUP_COMMIT_MS,
+    ):
+        self.path = path
+        self.durability = durability
+        _discard_torn_record(path)
+        self._file = open(path, "ab", buffering=WRITE_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._unsynced = False
+        self._closed = threading.Event()
+        self._sync_thread = None
+        if durability == Durability.GROUP:
+            self._sync_thread = threading.Thread(
+                target=self._group_commit, args=(group_commit_ms / 1000,), daemon=True
+            )
+            self._sync_thread.start()
+
+    @property
+    def offset(self) -> int:
+        """position in the file just after the last record appended"""
+        with self._lock:
+            return self._file.tell()
+
+    def append(self, match_id: int, command: dict):
+        record = json.dumps(
+            {"match_id": match_id, "command": command}, separators=(",", ":")
+        )
+        with self._lock:
+            self._file.write(record.encode() + b"\n")
+
+    def append_removal(self, match_id: int):
+        """record that a match was removed from the engine, so it is not brought
+        back by a later recovery"""
+        with self._lock:
+            self._file.write(f'{{"match_id":{match_id},"removed":true}}\n'.encode())
+
+    def commit(self):
+        with self._lock:
+            self._file.flush()
+            if self.durability == Durability.FSYNC:
+                os.fsync(self._file.fileno())
+            else:
+                self._unsynced = True
+
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+
+    def _group_commit(self, interval: float):
+        while not self._closed.wait(interval):
+            if self._unsynced:
+                self.sync()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._sync_thread:
+            self._sync_thread.join()
+        if self.durability != Durability.NONE:
+            self.sync()
+        self._file.close()
+
+
+def _discard_torn_record(path: str):
+    """cut off a partial record left at the end of the file by a crash, so that
+    records appended after a restart start on a line of their own"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as fh:
+        position = fh.seek(0, os.SEEK_END)
+        while position > 0:
+            chunk_start = max(0, position - 4096)
+            fh.seek(chunk_start)
+            chunk = fh.read(position - chunk_start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                fh.truncate(chunk_start + newline + 1)
+                return
+            position = chunk_start
+        fh.truncate(0)
+
+
+def read_journal(path: str, offset: int = 0) -> Iterator[tuple[int, dict]]:
+    """read back the records in a journal, starting from a byte offset, along with
+    the offset just after each record. A partial record at the very end is what a
+    crash in the middle of a write leaves behind; it was never acknowledged, so it
+    is skipped"""
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        for line in fh:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            yield offset, json.loads(line)
+
+
+def create_journal(config, suffix: str = ""):
+    path = config.get("ENGINE", "journal_path", fallback=None)
+    if not path:
+        return None
+    path += suffix
+    durability = Durability(
+        config.get("ENGINE", "journal_durability", fallback=Durability.FSYNC.value)
+    )
+    group_commit_ms = config.getfloat(
+        "ENGINE", "journal_group_commit_ms", fallback=DEFAULT_GROUP_COMMIT_MS
+    )
+    return CommandJournal(path, durability, group_commit_ms)
@@ -0,0 +1,183 @@
+"""
+A columnar record of every ball of an innings. Each numeric part of a ball is kept
+as a running total in an array, so the sum over any range of balls or overs is the
+difference of two entries, whatever the length of the range. The striker and bowler
+of each ball are kept by unique_id for filtering.
+
+The score of the innings, or of any of its overs, can be read off the ledger as a
+LedgerScore, so it is never added up ball by ball a second time.
+
+Whole columns can be had as numpy arrays when numpy is installed, for vectorised
+reductions, and as plain arrays otherwise.
+"""
+from array import array
+from typing import Optional
+
+from scorpyo.score import Score
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# the parts of a ball that add up, and the sums of them read most, named as on Score
+SUMMED_COLUMNS = (
+    "runs_off_bat",
+    "wide_runs",
+    "no_ball_runs",
+    "byes",
+    "leg_byes",
+    "penalty_runs",
+    "wickets",
+    "valid_deliveries",
+    "wide_deliveries",
+    "fours",
+    "sixes",
+    "dots",
+    "total_runs",
+    "runs_against_bowler",
+)
+ID_COLUMNS = ("striker", "bowler")
+# columns made up of others, as the properties of the same name on Score
+DERIVED_COLUMNS = {
+    "extra_runs": ("wide_runs", "no_ball_runs", "byes", "leg_byes"),
+    "boundaries": ("fours", "sixes"),
+}
+TYPECODE = "q"
+
+
+class BallLedger:
+    """Balls are numbered from 0 in the order bowled and overs from 0 as on Over.
+    Ranges of balls are half open, as slices are, and ranges of overs inclusive"""
+
+    def __init__(self):
+        # the totals of each column before each ball, and after the last
+        self._totals = {name: array(TYPECODE, [0]) for name in SUMMED_COLUMNS}
+        self._ids = {name: array(TYPECODE) for name in ID_COLUMNS}
+        # the number of the first ball of each over
+        self._over_starts = array(TYPECODE)
+
+    def __len__(self) -> int:
+        return len(self._ids["striker"])
+
+    @property
+    def num_overs(self) -> int:
+        return len(self._over_starts)
+
+    def append(self, bce: "BallCompletedEvent"):
+        score = bce.ball_score
+        for name, totals in self._totals.items():
+            totals.append(totals[-1] + getattr(score, name))
+        self._ids["striker"].append(bce.on_strike_player.unique_id)
+        self._ids["bowler"].append(bce.bowler.unique_id)
+
+    def pop(self):
+        """remove the latest ball, when it is undone"""
+        for column in (*self._totals.values(), *self._ids.values()):
+            column.pop()
+
+    def start_over(self):
+        self._over_starts.append(len(self))
+
+    def pop_over(self):
+        """remove the latest over, when its start is undone"""
+        self._over_starts.pop()
+
+    def total(self, name: str, start: int = 0, end: Optional[int] = None) -> int:
+        """the sum of a column over balls start to end"""
+        end = len(self) if end is None else min(end, len(self))
+        if name in DERIVED_COLUMNS:
+            return sum(self.total(part, start, end) for part in DERIVED_COLUMNS[name])
+        try:
+            totals = self._totals[name]
+        except KeyError:
+            raise ValueError(f"no column to total called {name}")
+        return totals[end] - totals[start]
+
+    def over_balls(self, first: int, last: Optional[int] = None) -> tuple[int, int]:
+        """the range of balls bowled in overs first to last, inclusive"""
+        last = first if last is None else last
+        if not 0 <= first <= last < self.num_overs:
+            raise ValueError(
+                f"overs {first} to {last} are not in the {self.num_overs} bowled"
+            )
+        start = self._over_starts[first]
+        end = self._over_starts[last + 1] if last + 1 < self.num_overs else len(self)
+        return start, end
+
+    def over_total(self, name: str, first: int, last: Optional[int] = None) -> int:
+        """the sum of a column over overs first to last, inclusive"""
+        return self.total(name, *self.over_balls(first, last))
+
+    def last_overs_total(self, name: str, num_overs: int) -> int:
+        """the sum of a column over the latest num_overs overs"""
+        first = max(0, self.num_overs - num_overs)
+        return self.over_total(name, first, self.num_overs - 1) if num_overs else 0
+
+    def per_over(self, name: str) -> list[int]:
+        return [self.over_total(name, over) for over in range(self.num_overs)]
+
+    def column(self, name: str):
+        """the value of a column for each ball, as a numpy array if numpy is
+        installed"""
+        if name in ID_COLUMNS:
+            values = self._ids[name]
+            # copied, as an array can't grow while numpy holds its buffer
+            if numpy:
+                return numpy.frombuffer(values, numpy.int64).copy()
+            return array(TYPECODE, values)
+        if name in DERIVED_COLUMNS:
+            parts = [self.column(part) for part in DERIVED_COLUMNS[name]]
+            if numpy:
+                return sum(parts[1:], parts[0])
+            return array(TYPECODE, map(sum, zip(*parts)))
+        try:
+            totals = self._totals[name]
+        except KeyError:
+            raise ValueError(f"no column called {name}")
+        if numpy:
+            return numpy.diff(numpy.frombuffer(totals, numpy.int64))
+        return array(TYPECODE, (b - a for a, b in zip(totals, totals[1:])))
+
+
+def _ledger_total(name: str) -> property:
+    # read straight off the running totals, as these are read for every render
+    def total(self) -> int:
+        totals = self._totals[name]
+        return totals[self.start + len(self.ball_ids)] - totals[self.start]
+
+    return property(total)
+
+
+class LedgerScore(Score):
+    """The score of a run of balls of a ledger, from ball start for as many balls as
+    there are in ball_ids, which grows and shrinks with the level the score is of.
+    The ledger is updated with each ball already, so add and subtract do nothing"""
+
+    def __init__(self, ledger: BallLedger, ball_ids: array, start: int = 0):
+        self.ledger = ledger
+        self.ball_ids = ball_ids
+        self.start = start
+        self._totals = ledger._totals
+
+    runs_off_bat = _ledger_total("runs_off_bat")
+    wide_runs = _ledger_total("wide_runs")
+    leg_byes = _ledger_total("leg_byes")
+    byes = _ledger_total("byes")
+    no_ball_runs = _ledger_total("no_ball_runs")
+    penalty_runs = _ledger_total("penalty_runs")
+    wickets = _ledger_total("wickets")
+    valid_deliveries = _ledger_total("valid_deliveries")
+    wide_deliveries = _ledger_total("wide_deliveries")
+    fours = _ledger_total("fours")
+    sixes = _ledger_total("sixes")
+    dots = _ledger_total("dots")
+    total_runs = _ledger_total("total_runs")
+    runs_against_bowler = _ledger_total("runs_against_bowler")
+
+    def add(self, new_score: Score):
+        return self
+
+    def subtract(self, old_score: Score):
+        return self
@@ -1,8 +1,6 @@
 from typing import Optional, List
 
 import scorpyo.util as util
-from scorpyo.error import RejectReason, EngineError
-from scorpyo.util import LOGGER
 from scorpyo.context import Context
 from scorpyo.event import (
     BallCompletedEvent,
@@ -18,8 +16,9 @@ from scorpyo.event import (
 from scorpyo.entity import EntityType
 from scorpyo.definitions.innings import InningsState
 from scorpyo.innings import Innings
-from scorpyo.score import Scoreable
+from scorpyo.score import BallStore, Score, Scoreable
 from scorpyo.entity import Team, MatchTeam
+from scorpyo.validation import validated
 
 
 # TODO pflanagan: I don't like multiple inheritance here
@@ -41,7 +40,9 @@ class Match(Context, Scoreable):
         command_registrar: "CommandRegistrar",
     ):
         Context.__init__(self)
-        Scoreable.__init__(self)
+        # the balls and score of a match are those of its inningses, so are not kept
+        # a second time here, only the store the inningses share
+        self.ball_store = BallStore(match_engine.retention)
         self.match_engine = match_engine
         self.entity_registrar = entity_registrar
         self.command_registrar = command_registrar
@@ -76,6 +77,19 @@ class Match(Context, Scoreable):
     def lineups(self) -> List[MatchTeam]:
         return [self.home_lineup, self.away_lineup]
 
+    @property
+    def _score(self) -> Score:
+        score = Score(0, 0, 0, 0, 0, 0, 0)
+        for innings in self.match_inningses:
+            score.add(innings._score)
+        return score
+
+    @property
+    def previous_ball(self) -> Optional[BallCompletedEvent]:
+        if len(self.ball_store) == 0:
+            return None
+        return self.ball_store[self.ball_store.latest_id]
+
     @property
     def current_innings(self) -> Optional[Innings]:
         if len(self.match_inningses) == 0:
@@ -128,7 +142,7 @@ class Match(Context, Scoreable):
         output["inningses"] = inningses_status
         return output
 
-    def overview(self) -> dict:
+    def render_overview(self) -> dict:
         output = {
             "match_type": self.match_type.name,
             "start_time": self.start_time,
@@ -160,39 +174,14 @@ class Match(Context, Scoreable):
     def add_innings(self, innings: Innings):
         self.match_inningses.append(innings)
 
-    def validate(self):
-        if self.num_innings_completed // 2 == self.max_inningses:
-            msg = f"Match already has {self.max_inningses} innings per side"
-            LOGGER.error(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if self.num_innings_completed > 0 and not self.match_inningses[-1].is_complete:
-            msg = "Previous innings has not yet ended. Please terminate first."
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
-
+    @validated(EventType.INNINGS_STARTED)
     def handle_innings_started(self, payload: dict):
-        self.validate()
         start_time = util.get_current_time()
         assert self.num_innings_completed == len(self.match_inningses)
         # index innings from 0 not 1
         match_innings_num = self.num_innings_completed
-        if (
-            self.current_innings
-            and self.current_innings.state == InningsState.IN_PROGRESS
-        ):
-            msg = "cannot start an innings while another one is still in progress."
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if not self.home_lineup or not self.away_lineup:
-            msg = "cannot start an innings without first defining the lineups of each team"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        batting_team_name = payload.get("batting_team")
-        if batting_team_name is None:
-            LOGGER.warning("must provide batting team when starting new innings")
-            raise EngineError()
         batting_team = self.entity_registrar.get_entity_data(
-            EntityType.TEAM, batting_team_name
+            EntityType.TEAM, payload["batting_team"]
         )
         batting_lineup = self.get_lineup(batting_team)
         bowling_lineup = [
@@ -211,34 +200,19 @@ class Match(Context, Scoreable):
         message = self.on_innings_started(ise)
         return message
 
+    @validated(EventType.INNINGS_COMPLETED)
     def handle_innings_completed(self, payload: dict):
         end_time = util.get_current_time()
-        try:
-            reason = InningsState(payload["reason"])
-        except KeyError:
-            LOGGER.warning("must supply reason on InningsCompleted payload")
-            raise EngineError()
+        reason = InningsState(payload["reason"])
         innings_id = self.current_innings.match_innings_num
         ice = InningsCompletedEvent(innings_id, end_time, reason)
         message = self.on_innings_completed(ice)
         return message
 
+    @validated(EventType.REGISTER_LINE_UP)
     def handle_team_lineup(self, payload: dict):
-        home_or_away = payload.get("team")
-        if not home_or_away or home_or_away not in ["home", "away"]:
-            msg = (
-                f"must specify whether team is home or away when "
-                f"registering a lineup"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
+        home_or_away = payload["team"]
         team_obj = {"home": self.home_lineup, "away": self.away_lineup}[home_or_away]
-        try:
-            lineup = payload["lineup"]
-        except KeyError:
-            msg = "must provide lineup when registering a lineup"
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
         team_obj.add_lineup(
             self.entity_registrar.get_from_names(EntityType.PLAYER, payload["lineup"])
         )
@@ -261,31 +235,12 @@ class Match(Context, Scoreable):
     @record_command
     def on_innings_completed(self, ice: InningsCompletedEvent):
         innings = self.current_innings
-        if not innings:
-            LOGGER.warning(
-                f"cannot complete an innings when there are no existing " f"inningses"
-            )
-            raise EngineError()
-        if self.current_innings.state != InningsState.IN_PROGRESS:
-            msg = (
-                f"innings {innings.match_innings_num} is not in "
-                f"progress so cannot complete it"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
-        if innings.match_innings_num != ice.match_innings_num:
-            msg = (
-                f"the innings number of the InningsCompletedEvent does "
-                f"not match the current_innings number"
-            )
-            LOGGER.warning(msg)
-            raise EngineError(msg, RejectReason.BAD_COMMAND)
         innings.terminate(ice)
         self.num_innings_completed += 1
         return innings.overview()
 
     def on_ball_completed(self, bce: BallCompletedEvent):
-        super().update_score(bce)
+        # the innings puts the ball in the store
         return self.current_innings.on_ball_completed(bce)
 
     def on_batter_innings_completed(self, bic: BatterInningsCompletedEvent):
@@ -0,0 +1,153 @@
+"""
+Latency histograms and counters for the engine, cheap enough to leave on: recording
+a timing is a bisect into a short tuple of bucket bounds and an increment. They can
+be exported in the Prometheus text exposition format or as a dict for JSON.
+"""
+import enum
+import math
+from bisect import bisect_left
+from collections import Counter
+from typing import Optional, Sequence
+
+from scorpyo.error import RejectReason
+
+
+# upper bounds in seconds, from 10us to 1s
+DEFAULT_BOUNDS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+METRIC_PREFIX = "scorpyo"
+
+
+class Phase(enum.Enum):
+    # routing, validating and applying a command
+    PROCESS = "process"
+    # building a snapshot of a match
+    SNAPSHOT = "snapshot"
+    # encoding a message with the codecs listeners asked for
+    ENCODE = "encode"
+    # handing a message to every listener, excluding the encoding
+    FANOUT = "fanout"
+
+
+class Histogram:
+    """counts of observations falling into fixed buckets, the last of which is
+    unbounded, along with their sum"""
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """the upper bound of the bucket the q-th quantile falls in, which is as
+        precise as fixed buckets allow. None if nothing has been observed"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """the exact q-th quantile of a sample, by nearest rank. None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class EngineMetrics:
+    """How long each phase of the engine takes, per event type, and how many commands
+    are rejected for each reason. Phases are labelled with the event type code of the
+    command they were for"""
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.histograms: dict[tuple[Phase, str], Histogram] = {}
+        self.rejects: Counter[RejectReason] = Counter()
+
+    def observe(self, phase: Phase, event: str, seconds: float):
+        histogram = self.histograms.get((phase, event))
+        if histogram is None:
+            histogram = self.histograms[(phase, event)] = Histogram(self.bounds)
+        histogram.observe(seconds)
+
+    def on_reject(self, reason: RejectReason):
+        self.rejects[reason] += 1
+
+    def histogram(self, phase: Phase, event: str) -> Optional[Histogram]:
+        return self.histograms.get((phase, event))
+
+    def _sorted_histograms(self) -> list:
+        return sorted(
+            self.histograms.items(), key=lambda item: (item[0][0].value, item[0][1])
+        )
+
+    def to_dict(self) -> dict:
+        phases = {}
+        for (phase, event), histogram in self._sorted_histograms():
+            phases.setdefault(phase.value, {})[event] = histogram.to_dict()
+        return {
+            "phases": phases,
+            "rejects": {reason.name.lower(): n for reason, n in self.rejects.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        name = f"{METRIC_PREFIX}_phase_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each phase of the engine per event type.",
+            f"# TYPE {name} histogram",
+        ]
+        for (phase, event), histogram in self._sorted_histograms():
+            labels = f'phase="{phase.value}",event="{event}"'
+            cumulative = 0
+            for bound, count in zip([*histogram.bounds, "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        rejects = f"{METRIC_PREFIX}_rejects_total"
+        lines += [
+            f"# HELP {rejects} Commands rejected, by reason.",
+            f"# TYPE {rejects} counter",
+        ]
+        for reason in RejectReason:
+            lines.append(
+                f'{rejects}{{reason="{reason.name.lower()}"}} {self.rejects[reason]}'
+            )
+        return "\n".join(lines) + "\n"
@@ -5,6 +5,7 @@ from enum import Enum
 from scorpyo.context import Context
 from scorpyo.entity import Player
 from scorpyo.error import EngineError, RejectReason
+from scorpyo.ledger import LedgerScore
 from scorpyo.score import Scoreable
 from scorpyo.util import LOGGER
 
@@ -23,10 +24,13 @@ class Over(Context, Scoreable):
         innings: "Innings",
     ):
         Context.__init__(self)
-        Scoreable.__init__(self)
+        Scoreable.__init__(self, innings.ball_store)
         self.innings = innings
+        # the balls of an over are a run of the innings' ledger
+        self._score = LedgerScore(innings.ledger, self._ball_ids, len(innings.ledger))
         self.number = over_number
         self.bowler = bowler
+        self.bowler_innings = None
         self.state = OverState.IN_PROGRESS
 
     @property
@@ -58,7 +62,12 @@ class Over(Context, Scoreable):
         }
         return output
 
-    def overview(self) -> dict:
+    def parent_contexts(self) -> tuple:
+        if self.bowler_innings is None:
+            return (self.innings,)
+        return self.innings, self.bowler_innings
+
+    def render_overview(self) -> dict:
         output = self.description()
         output.update(self.snapshot())
         output["maiden"] = self.maiden
@@ -73,3 +82,4 @@ class Over(Context, Scoreable):
             LOGGER.warning(msg)
             raise EngineError(msg, RejectReason.BAD_COMMAND)
         self.state = oce.reason
+        self.touch()
@@ -0,0 +1,137 @@
+"""
+Profiling of the engine's command path on demand, for the next so many commands or
+seconds. The engine only routes calls through the profiler while a profile is being
+taken, so it costs nothing the rest of the time.
+
+Two kinds of profile can be taken: a cProfile one, written as pstats for snakeviz,
+flameprof or gprof2dot, or one from sampling the engine thread's stack, written as
+the collapsed stacks that flamegraph.pl and speedscope read.
+"""
+import cProfile
+import enum
+import functools
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from scorpyo.util import LOGGER
+
+
+DEFAULT_SAMPLE_INTERVAL = 0.001
+
+
+class ProfileMode(enum.Enum):
+    CPROFILE = "cprofile"
+    SAMPLING = "sampling"
+
+
+PROFILE_SUFFIXES = {ProfileMode.CPROFILE: ".prof", ProfileMode.SAMPLING: ".folded"}
+
+
+def is_positive(value, kinds) -> bool:
+    return isinstance(value, kinds) and not isinstance(value, bool) and value > 0
+
+
+class CommandProfiler:
+    """Profiles the calls it wraps until max_commands commands have been counted or
+    seconds have passed, whichever comes first"""
+
+    def __init__(
+        self,
+        mode: ProfileMode = ProfileMode.CPROFILE,
+        path: Optional[str] = None,
+        max_commands: Optional[int] = None,
+        seconds: Optional[float] = None,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        if max_commands is None and seconds is None:
+            raise ValueError("must profile for a number of commands or seconds")
+        if max_commands is not None and not is_positive(max_commands, int):
+            raise ValueError(
+                f"commands must be a positive integer, got {max_commands!r}"
+            )
+        if seconds is not None and not is_positive(seconds, (int, float)):
+            raise ValueError(f"seconds must be a positive number, got {seconds!r}")
+        if path is None:
+            fd, path = tempfile.mkstemp(
+                prefix="scorpyo-profile-", suffix=PROFILE_SUFFIXES[mode]
+            )
+            os.close(fd)
+        self.mode = mode
+        self.path = path
+        self.max_commands = max_commands
+        self.seconds = seconds
+        self.sample_interval = sample_interval
+        self.num_commands = 0
+        self.started = time.monotonic()
+        # depth of wrapped calls in progress, as they nest
+        self._depth = 0
+        self._profile = cProfile.Profile() if mode == ProfileMode.CPROFILE else None
+        self._samples: Counter[str] = Counter()
+        self._engine_thread = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = None
+        if mode == ProfileMode.SAMPLING:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    @property
+    def is_done(self) -> bool:
+        if self.max_commands is not None and self.num_commands >= self.max_commands:
+            return True
+        return (
+            self.seconds is not None
+            and time.monotonic() - self.started >= self.seconds
+        )
+
+    def wrap(self, func: Callable, counts_commands: bool = False) -> Callable:
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            self._depth += 1
+            if self._depth == 1 and self._profile:
+                self._profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if self._depth == 1 and self._profile:
+                    self._profile.disable()
+                self._depth -= 1
+                self.num_commands += counts_commands
+
+        return profiled
+
+    def _sample(self):
+        while not self._stopped.wait(self.sample_interval):
+            if not self._depth:
+                continue
+            frame = sys._current_frames().get(self._engine_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self._samples[";".join(reversed(stack))] += 1
+
+    def finish(self) -> str:
+        """stop profiling and write the profile, returning where it was written"""
+        self._stopped.set()
+        if self._sampler:
+            self._sampler.join()
+        if self._profile:
+            self._profile.dump_stats(self.path)
+        else:
+            with open(self.path, "w") as fh:
+                for stack, count in self._samples.items():
+                    fh.write(f"{stack} {count}\n")
+        LOGGER.info(
+            f"wrote {self.mode.value} profile of {self.num_commands} commands to "
+            f"{self.path}"
+        )
+        return self.path
@@ -0,0 +1,141 @@
+"""
+The engine's wire protocol. Every message in either direction is a single encoded
+document (JSON unless both ends agree on another codec) prefixed with its length as
+a 4-byte big-endian unsigned int, so that one connection can carry any number of
+commands and responses of any size.
+"""
+import asyncio
+import socket
+import struct
+from collections import deque
+from typing import Optional
+
+from scorpyo.codec import JSON, Codec
+
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+RECV_SIZE = 65536
+
+
+class FrameDecodeError(ValueError):
+    """a whole frame was read but could not be decoded, so the stream is still in
+    step and the next frame can be read"""
+
+
+def decode_payload(payload: bytes, codec: Codec) -> dict:
+    try:
+        return codec.decode(payload)
+    except (ValueError, IndexError, struct.error) as e:
+        raise FrameDecodeError(f"could not decode {codec.name} frame: {e}") from e
+
+
+def encode_frame(message: dict, codec: Codec = JSON) -> bytes:
+    return frame_payload(codec.encode(message))
+
+
+def frame_payload(payload: bytes) -> bytes:
+    """frame a message that has already been encoded"""
+    return HEADER.pack(len(payload)) + payload
+
+
+def _check_size(size: int, max_frame_size: int):
+    if size > max_frame_size:
+        raise ValueError(f"frame of {size} bytes exceeds limit of {max_frame_size}")
+
+
+class FrameDecoder:
+    """incrementally decodes frames from a byte stream, returning each message as
+    soon as all of its bytes have arrived. Bytes are only scanned once, however the
+    stream is split across reads"""
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, codec: Codec = JSON):
+        self.max_frame_size = max_frame_size
+        self.codec = codec
+        self._buffer = bytearray()
+        self._frame_size: Optional[int] = None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[dict]:
+        self._buffer += data
+        messages = []
+        position = 0
+        while True:
+            if self._frame_size is None:
+                if len(self._buffer) - position < HEADER.size:
+                    break
+                (self._frame_size,) = HEADER.unpack_from(self._buffer, position)
+                _check_size(self._frame_size, self.max_frame_size)
+                position += HEADER.size
+            end = position + self._frame_size
+            if len(self._buffer) < end:
+                break
+            messages.append(
+                decode_payload(bytes(self._buffer[position:end]), self.codec)
+            )
+            position = end
+            self._frame_size = None
+        del self._buffer[:position]
+        return messages
+
+
+async def read_frame(
+    reader: asyncio.StreamReader,
+    max_frame_size: int = MAX_FRAME_SIZE,
+    codec: Codec = JSON,
+) -> Optional[dict]:
+    """read the next message from an asyncio stream, or None once the peer has
+    closed the connection"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError("connection closed part way through a frame")
+        return None
+    (size,) = HEADER.unpack(header)
+    _check_size(size, max_frame_size)
+    try:
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("connection closed part way through a frame")
+    return decode_payload(payload, codec)
+
+
+class FramedSocket:
+    """a blocking socket that sends and receives whole frames"""
+
+    def __init__(self, sock: socket.socket, codec: Codec = JSON):
+        self.sock = sock
+        self.codec = codec
+        self._decoder = FrameDecoder(codec=codec)
+        self._received: deque = deque()
+
+    def send(self, message: dict):
+        self.sock.sendall(encode_frame(message, self.codec))
+
+    def negotiate(self, codec: Codec):
+        """ask the engine server to switch the connection to another codec"""
+        self.send({"codec": codec.name})
+        reply = self.receive()
+        if reply != {"codec": codec.name}:
+            raise ConnectionError(f"engine refused codec {codec.name}: {reply}")
+        self.codec = codec
+        self._decoder.codec = codec
+
+    def receive(self) -> Optional[dict]:
+        """block until the next message arrives, or return None if the peer closed
+        the connection"""
+        while not self._received:
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                if self._decoder.buffered:
+                    raise ConnectionError("connection closed part way through a frame")
+                return None
+            self._received.extend(self._decoder.feed(data))
+        return self._received.popleft()
+
+    def close(self):
+        self.sock.close()
@@ -7,6 +7,7 @@ from scorpyo import util
 from scorpyo.entity import EntityType, Entity
 from scorpyo.entity import Player
 from scorpyo.entity import Team
+from scorpyo.history import RetentionPolicy, create_history
 
 
 class FileLoaderVisitor:
@@ -84,8 +85,8 @@ class EntityRegistrar:
 
 
 class CommandRegistrar:
-    def __init__(self):
-        self._store = []
+    def __init__(self, retention: Optional[RetentionPolicy] = None):
+        self._store = create_history(retention)
 
     def add(self, event):
         self._store.append(event)
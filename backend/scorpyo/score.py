@@ -1,5 +1,13 @@
 import abc
+import functools
 import re
+from array import array
+from typing import Optional
+
+from scorpyo.history import RetentionPolicy, create_history
+
+# the number of score texts kept parsed, far more than the distinct texts of a match
+PARSE_CACHE_SIZE = 256
 
 
 class Score:
@@ -75,17 +83,20 @@ class Score:
         return False
 
     @classmethod
-    def parse(cls, score_text: str):
+    @functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+    def parse(cls, score_text: str) -> "BallScore":
         """
         (runs_off_bat, runs_scored, leg_byes, byes, no_balls,
         penalty_runs, wickets, fours, sixes, dots)
+
+        the same BallScore is returned for the same score text
         """
         if score_text == ".":
-            return Score.from_tuple(0, 0, 0, 0, 0, 0, 0, 0, 0, 1)
+            return BallScore(0, 0, 0, 0, 0, 0, 0, 0, 0, 1)
         if score_text == "W":
-            return Score.from_tuple(0, 0, 0, 0, 0, 0, 1, 0, 0, 1)
+            return BallScore(0, 0, 0, 0, 0, 0, 1, 0, 0, 1)
         if score_text == "w":
-            return Score.from_tuple(0, 1, 0, 0, 0, 0, 0, 0, 0, 0)
+            return BallScore(0, 1, 0, 0, 0, 0, 0, 0, 0, 0)
         groups = cls.SCORE_PATTERN.search(score_text)
         try:
             runs_scored = int(groups.group("num"))
@@ -102,20 +113,20 @@ class Score:
             dots = 1
         if modifier:
             if modifier == "W":
-                return Score.from_tuple(runs_off_bat, 0, 0, 0, 0, 0, 1, 0, 0, dots)
+                return BallScore(runs_off_bat, 0, 0, 0, 0, 0, 1, 0, 0, dots)
             elif modifier == "w":
-                return Score.from_tuple(0, runs_scored, 0, 0, 0, 0, 0, fours, sixes, 0)
+                return BallScore(0, runs_scored, 0, 0, 0, 0, 0, fours, sixes, 0)
             elif modifier == "nb":
                 runs_off_bat -= 1
-                return Score.from_tuple(runs_off_bat, 0, 0, 0, 1, 0, 0, fours, sixes, 0)
+                return BallScore(runs_off_bat, 0, 0, 0, 1, 0, 0, fours, sixes, 0)
             elif modifier == "b":
-                return Score.from_tuple(0, 0, 0, runs_scored, 0, 0, 0, fours, sixes, 1)
+                return BallScore(0, 0, 0, runs_scored, 0, 0, 0, fours, sixes, 1)
             elif modifier == "lb":
-                return Score.from_tuple(0, 0, runs_scored, 0, 0, 0, 0, fours, sixes, 1)
+                return BallScore(0, 0, runs_scored, 0, 0, 0, 0, fours, sixes, 1)
             else:
                 raise ValueError(f"Unknown modifier: {modifier}")
         else:
-            return Score.from_tuple(runs_off_bat, 0, 0, 0, 0, 0, 0, fours, sixes, dots)
+            return BallScore(runs_off_bat, 0, 0, 0, 0, 0, 0, fours, sixes, dots)
 
     def add(self, new_score):
         self.runs_off_bat += new_score.runs_off_bat
@@ -129,12 +140,89 @@ class Score:
         self.wickets += new_score.wickets
         self.fours += new_score.fours
         self.sixes += new_score.sixes
+        self.dots += new_score.dots
         return self
 
+    def subtract(self, old_score):
+        """reverse an earlier add"""
+        self.runs_off_bat -= old_score.runs_off_bat
+        self.wide_runs -= old_score.wide_runs
+        self.wide_deliveries -= old_score.wide_deliveries
+        self.valid_deliveries -= old_score.valid_deliveries
+        self.leg_byes -= old_score.leg_byes
+        self.byes -= old_score.byes
+        self.no_ball_runs -= old_score.no_ball_runs
+        self.penalty_runs -= old_score.penalty_runs
+        self.wickets -= old_score.wickets
+        self.fours -= old_score.fours
+        self.sixes -= old_score.sixes
+        self.dots -= old_score.dots
+        return self
+
+
+class BallScore(Score):
+    """The score of a single ball. Parsed scores are shared by every ball with the
+    same score text, so can't be changed once made, and running totals are kept in
+    a Score instead"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.set_calculated_data()
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"a ball score can't be changed, tried to set {name}")
+        super().__setattr__(name, value)
+
+    def add(self, new_score):
+        raise TypeError("a ball score can't be added to, add it to a Score instead")
+
+    def subtract(self, old_score):
+        raise TypeError("a ball score can't be subtracted from")
+
+
+class BallStore:
+    """Every ball of a match, held once. Balls are numbered from 0 in the order
+    bowled, and each level of the match keeps the numbers of its own balls rather
+    than the balls themselves."""
+
+    def __init__(self, retention: Optional[RetentionPolicy] = None):
+        self._balls = create_history(retention)
+
+    def __len__(self) -> int:
+        return len(self._balls)
+
+    @property
+    def capacity(self) -> Optional[int]:
+        """how many of the latest balls are held in memory, None for all of them"""
+        return self._balls.capacity
+
+    def __getitem__(self, ball_id: int) -> "BallCompletedEvent":
+        return self._balls[ball_id]
+
+    @property
+    def latest_id(self) -> int:
+        return len(self._balls) - 1
+
+    @property
+    def num_spilled(self) -> int:
+        return self._balls.num_spilled
+
+    def append(self, bce: "BallCompletedEvent") -> int:
+        self._balls.append(bce)
+        return self.latest_id
+
+    def pop(self) -> "BallCompletedEvent":
+        """remove the latest ball, when it is undone"""
+        return self._balls.pop()
+
 
 class Scoreable(abc.ABC):
-    def __init__(self):
-        self._ball_events = []
+    def __init__(self, ball_store: BallStore):
+        self.ball_store = ball_store
+        # the numbers in the store of the balls of this level
+        self._ball_ids = array("q")
         self._score = Score(0, 0, 0, 0, 0, 0, 0)
 
     @abc.abstractmethod
@@ -142,14 +230,28 @@ class Scoreable(abc.ABC):
         pass
 
     def update_score(self, bce: "BallCompletedEvent"):
-        self._ball_events.append(bce)
+        """add the latest ball in the store to this level"""
+        self._ball_ids.append(self.ball_store.latest_id)
         self._score.add(bce.ball_score)
+        self.touch()
+
+    def revert_score(self, bce: "BallCompletedEvent"):
+        """undo the update_score of the most recent ball"""
+        assert (
+            self.ball_store[self._ball_ids[-1]] is bce
+        ), "can only revert the most recent ball"
+        self._ball_ids.pop()
+        self._score.subtract(bce.ball_score)
+        self.touch()
+
+    def touch(self):
+        """called whenever the score changes, see Context.touch"""
 
     @property
     def previous_ball(self):
-        if len(self._ball_events) == 0:
+        if len(self._ball_ids) == 0:
             return None
-        return self._ball_events[-1]
+        return self.ball_store[self._ball_ids[-1]]
 
     @property
     def runs_scored(self) -> int:
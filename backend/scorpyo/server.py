@@ -0,0 +1,272 @@
+import asyncio
+import signal
+from collections import deque
+from typing import Optional
+
+import scorpyo.util as util
+from scorpyo.codec import JSON, Codec, get_codec
+from scorpyo.engine import MatchEngine, create_engine
+from scorpyo.error import EngineError, RejectReason
+from scorpyo.protocol import FrameDecodeError, encode_frame, read_frame
+from scorpyo.util import LOGGER
+
+
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_MAX_PENDING = 64
+POLL_INTERVAL = 0.05
+
+
+class EngineConnection:
+    """one client connection to the engine server. Commands read from the socket are
+    queued here until the server's scheduler gets round to applying them"""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        max_pending: int,
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.pending: asyncio.Queue = asyncio.Queue(max_pending)
+        self.codec: Codec = JSON
+        self.is_scheduled = False
+        self.closed = False
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        self.writer.write(encode_frame(message, self.codec))
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class EngineServer:
+    """Serves many concurrent client connections against a single MatchEngine.
+
+    Every connection has its own queue of commands, but all commands are applied by
+    one scheduler task so the engine still sees a single ordered sequence. The
+    scheduler takes one command from each ready connection in turn, so a client
+    uploading a large backlog cannot starve a scorer entering balls live."""
+
+    def __init__(
+        self,
+        engine: MatchEngine,
+        host: str,
+        port: int,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_pending = max_pending
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: dict[EngineConnection, asyncio.Task] = {}
+        self._ready: deque[EngineConnection] = deque()
+        self._has_work: Optional[asyncio.Event] = None
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self._stopped: Optional[asyncio.Event] = None
+
+    @property
+    def num_connections(self) -> int:
+        return len(self._connections)
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else []
+
+    async def start(self):
+        self._has_work = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._on_connected, self.host, self.port
+        )
+        self._tasks = [
+            asyncio.create_task(self._schedule()),
+            asyncio.create_task(self._poll_engine()),
+        ]
+        LOGGER.info(f"engine server listening on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if not self._server:
+            await self.start()
+        await self._stopped.wait()
+
+    async def shutdown(self):
+        """stop accepting connections and reading commands, apply every command
+        that has already been queued, then close the remaining connections"""
+        if self._stopping:
+            return
+        self._stopping = True
+        LOGGER.info("engine server shutting down")
+        self._server.close()
+        readers = list(self._connections.values())
+        for reader_task in readers:
+            reader_task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        while self._ready:
+            self._apply_next()
+        self.engine.flush_snapshot()
+        self.engine.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for connection in list(self._connections):
+            await connection.close()
+        self._connections.clear()
+        await self._server.wait_closed()
+        self._stopped.set()
+
+    async def _on_connected(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        connection = EngineConnection(reader, writer, self.max_pending)
+        LOGGER.info(f"connected by {connection.address}")
+        self._connections[connection] = asyncio.current_task()
+        try:
+            await self._read_commands(connection)
+        except asyncio.TimeoutError:
+            LOGGER.info(f"closing idle connection {connection.address}")
+        except (ConnectionError, OSError) as e:
+            LOGGER.warning(f"connection {connection.address} dropped: {e}")
+        except ValueError as e:
+            # an oversized frame leaves the stream out of step, so give up on it
+            msg = f"closing connection {connection.address}: {e}"
+            LOGGER.warning(msg)
+            connection.send(EngineError(msg, RejectReason.BAD_COMMAND).compile())
+        finally:
+            await self._disconnect(connection)
+
+    async def _disconnect(self, connection: EngineConnection):
+        # anything already queued is still applied so that a client which sends
+        # its commands and hangs up does not lose them. On shutdown the queues are
+        # drained and the connections closed by shutdown itself
+        if self._stopping:
+            return
+        await connection.pending.join()
+        await connection.close()
+        self._connections.pop(connection, None)
+
+    async def _read_commands(self, connection: EngineConnection):
+        is_first = True
+        while True:
+            try:
+                command = await asyncio.wait_for(
+                    read_frame(connection.reader, codec=connection.codec),
+                    self.idle_timeout,
+                )
+            except FrameDecodeError as e:
+                # rejected in turn with the commands queued before it
+                LOGGER.warning(str(e))
+                await self._enqueue(
+                    connection, EngineError(str(e), RejectReason.BAD_COMMAND)
+                )
+                is_first = False
+                continue
+            if command is None:
+                return
+            if is_first and isinstance(command, dict) and set(command) == {"codec"}:
+                self._negotiate(connection, command["codec"])
+            else:
+                await self._enqueue(connection, command)
+            is_first = False
+
+    def _negotiate(self, connection: EngineConnection, codec_name: str):
+        """a connection may open by asking for another codec than json. The reply is
+        still in json, everything after it in the agreed codec"""
+        try:
+            codec = get_codec(codec_name)
+        except ValueError as e:
+            LOGGER.warning(str(e))
+            connection.send(EngineError(str(e), RejectReason.BAD_COMMAND).compile())
+            return
+        connection.send({"codec": codec.name})
+        connection.codec = codec
+
+    async def _enqueue(self, connection: EngineConnection, command):
+        await connection.pending.put(command)
+        if not connection.is_scheduled:
+            connection.is_scheduled = True
+            self._ready.append(connection)
+            self._has_work.set()
+
+    def _apply_next(self):
+        connection = self._ready.popleft()
+        command = connection.pending.get_nowait()
+        connection.send(self._apply(command))
+        connection.pending.task_done()
+        if connection.pending.empty():
+            connection.is_scheduled = False
+        else:
+            self._ready.append(connection)
+
+    def _apply(self, command) -> dict:
+        """the reply to a command. Whatever goes wrong applying it is rejected to its
+        connection alone, so the scheduler carries on for everyone else"""
+        if isinstance(command, EngineError):
+            return command.compile()
+        try:
+            return self.engine.on_request(command)
+        except Exception as e:
+            msg = f"could not apply command {command!r}: {e!r}"
+            LOGGER.exception(msg)
+            return EngineError(msg, RejectReason.BAD_COMMAND).compile()
+
+    async def _schedule(self):
+        while True:
+            await self._has_work.wait()
+            while self._ready:
+                self._apply_next()
+                # let the readers and writers run between commands
+                await asyncio.sleep(0)
+            self._has_work.clear()
+
+    async def _poll_engine(self):
+        """send throttled snapshots and end timed profiles that are due, as neither
+        can wait for the next command"""
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            self.engine.poll_snapshot()
+            self.engine.poll_profile()
+
+
+async def serve(config):
+    engine = create_engine(config)
+    idle_timeout = config.getfloat(
+        "ENGINE", "idle_timeout", fallback=DEFAULT_IDLE_TIMEOUT
+    )
+    server = EngineServer(
+        engine,
+        config["ENGINE"]["host"],
+        config.getint("ENGINE", "port"),
+        idle_timeout=idle_timeout or None,
+        max_pending=config.getint(
+            "ENGINE", "max_pending", fallback=DEFAULT_MAX_PENDING
+        ),
+    )
+    await server.start()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(server.shutdown()))
+    await server.serve_forever()
+
+
+def run_async_server():
+    config = util.load_config()
+    asyncio.run(serve(config))
+
+
+if __name__ == "__main__":
+    run_async_server()
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from scorpyo.definitions.match import MatchState
+from scorpyo.history import RetentionPolicy, create_history
+from scorpyo.match import Match
+from scorpyo.registrar import CommandRegistrar
+from scorpyo.snapshot import SnapshotScheduler, SnapshotTracker
+
+
+@dataclass
+class MatchStats:
+    commands: int = 0
+    rejects: int = 0
+    cpu_time: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "commands": self.commands,
+            "rejects": self.rejects,
+            "cpu_time": self.cpu_time,
+        }
+
+
+class MatchSession:
+    """Everything the engine keeps for one live match: the match itself, the
+    sequence its commands must follow, its command and message history and the
+    state of its snapshot stream"""
+
+    def __init__(
+        self,
+        match_id: int,
+        command_registrar: CommandRegistrar,
+        snapshot_scheduler: SnapshotScheduler,
+        retention: Optional[RetentionPolicy] = None,
+    ):
+        self.match_id = match_id
+        self.match: Optional[Match] = None
+        self.command_registrar = command_registrar
+        self.snapshot_scheduler = snapshot_scheduler
+        self.message_id = 0
+        self.snapshot_version = 0
+        # the snapshot as last sent, which deltas are made against
+        self.snapshot_tracker = SnapshotTracker()
+        # the match's routing table, rebuilt when an innings or the match starts or
+        # ends, see MatchEngine.dispatch
+        self.routes: Optional[dict] = None
+        self.retention = retention
+        self.events = create_history(retention)
+        self.messages = create_history(retention)
+        self.stats = MatchStats()
+
+    @property
+    def is_live(self) -> bool:
+        return self.match is not None and self.match.state == MatchState.IN_PROGRESS
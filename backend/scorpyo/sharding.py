@@ -0,0 +1,251 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Optional
+
+from scorpyo import util
+from scorpyo.codec import deliver, get_codec
+from scorpyo.engine import check_command_shape, create_engine
+from scorpyo.error import EngineError, RejectReason
+from scorpyo.event import EventType
+from scorpyo.snapshot import SnapshotMode
+from scorpyo.util import LOGGER
+
+
+class _MessageCollector:
+    """listener inside a worker process that holds on to the messages generated by a
+    command so they can be shipped back to the front end together with its ack"""
+
+    def __init__(self):
+        self.messages = []
+
+    def on_message(self, message: dict):
+        self.messages.append(message)
+
+
+# the engine methods run on every worker when the front end's are called
+BROADCAST_METHODS = ("poll_snapshot", "poll_profile", "flush_snapshot")
+
+
+def _run_worker(
+    worker_index: int,
+    num_workers: int,
+    config_path: str,
+    snapshot_mode: Optional[SnapshotMode],
+    conn: Connection,
+):
+    config = util.load_config(config_path)
+    if snapshot_mode is not None:
+        if not config.has_section("ENGINE"):
+            config.add_section("ENGINE")
+        config.set("ENGINE", "snapshot_mode", snapshot_mode.value)
+    engine = create_engine(config, worker_index, num_workers)
+    collector = _MessageCollector()
+    engine.register_client(collector)
+    while True:
+        request, payload = conn.recv()
+        if request == "stop":
+            engine.close()
+            break
+        if request == "command":
+            try:
+                resp = engine.on_command(payload)
+            except Exception as e:
+                # an unexpected failure must not take down every match on the worker
+                LOGGER.exception(f"worker {worker_index} failed on command {payload}")
+                resp = EngineError(str(e), RejectReason.INCONSISTENT_STATE).compile()
+        elif request == "batch":
+            try:
+                resp = engine.on_commands(*payload)
+            except Exception as e:
+                LOGGER.exception(f"worker {worker_index} failed on batch")
+                resp = EngineError(str(e), RejectReason.INCONSISTENT_STATE).compile()
+        elif request == "admin" or request in BROADCAST_METHODS:
+            try:
+                if request == "admin":
+                    resp = engine.on_admin(payload)
+                else:
+                    getattr(engine, request)()
+                    resp = {}
+            except Exception as e:
+                LOGGER.exception(f"worker {worker_index} failed on {request}")
+                resp = EngineError(str(e), RejectReason.INCONSISTENT_STATE).compile()
+        elif request == "stats":
+            try:
+                resp = engine.match_stats(payload)
+            except EngineError as e:
+                resp = e.compile()
+        else:
+            resp = {"error": f"unknown request {request}"}
+        conn.send((resp, collector.messages))
+        collector.messages = []
+    conn.close()
+
+
+class MatchWorker:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.live_matches = 0
+        # a single thread per worker keeps that worker's commands in order while
+        # letting different workers run in parallel
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+class ShardedMatchEngine:
+    """
+    Front end that spreads matches over a pool of worker processes, each running its
+    own MatchEngine, so that snapshot building and encoding for different matches
+    can use every core. A match is placed on the least loaded worker when it starts
+    and stays there: the workers allocate interleaved match_ids, so the owner of a
+    match is simply match_id % num_workers. Messages produced by a command are
+    forwarded to the front end's listeners in the order the worker produced them.
+
+    Each worker's engine is created from the config as create_engine would, with a
+    journal, checkpoints and profiles of its own. The snapshot_mode, if given,
+    overrides the config's. It takes requests as MatchEngine.on_request does and
+    polls every worker, so can be served by an EngineServer.
+    """
+
+    def __init__(
+        self,
+        config_path: str,
+        num_workers: Optional[int] = None,
+        snapshot_mode: Optional[SnapshotMode] = None,
+    ):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self._score_listeners = []
+        self._listener_lock = threading.Lock()
+        self._latest_match_id = None
+        context = multiprocessing.get_context("spawn")
+        self.workers: list[MatchWorker] = []
+        for index in range(self.num_workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_run_worker,
+                args=(index, self.num_workers, config_path, snapshot_mode, child_conn),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append(MatchWorker(index, process, parent_conn))
+
+    def register_client(self, client: "EngineClient", codec: Optional[str] = None):
+        self._score_listeners.append((client, get_codec(codec) if codec else None))
+
+    def worker_for(self, command: dict) -> MatchWorker:
+        check_command_shape(command)
+        if command.get("event") == EventType.MATCH_STARTED.value:
+            # a new match is given a match_id by its worker, whatever it carries
+            return min(self.workers, key=lambda w: w.live_matches)
+        match_id = command.get("match_id")
+        if match_id is None:
+            match_id = self._latest_match_id
+            if match_id is None:
+                msg = "no match has been started"
+                LOGGER.warning(msg)
+                raise EngineError(msg, RejectReason.ILLEGAL_OPERATION)
+        return self.workers[match_id % self.num_workers]
+
+    def submit(self, command: dict) -> Future:
+        """queue a command on the worker that owns its match. Commands for the same
+        match are applied in the order they are submitted"""
+        try:
+            worker = self.worker_for(command)
+        except EngineError as e:
+            future = Future()
+            future.set_result(e.compile())
+            return future
+        return worker.executor.submit(self._send, worker, "command", command)
+
+    def on_command(self, command: dict) -> dict:
+        return self.submit(command).result()
+
+    def on_commands(self, commands: list[dict], stop_on_reject: bool = True) -> dict:
+        """apply a batch of commands on a single worker. The batch is routed by its
+        first command, so every command in it must belong to the same match"""
+        if not commands:
+            return {"batch": [], "num_commands": 0}
+        try:
+            worker = self.worker_for(commands[0])
+        except EngineError as e:
+            return {"batch": [e.compile()], "num_commands": len(commands)}
+        return worker.executor.submit(
+            self._send, worker, "batch", (commands, stop_on_reject)
+        ).result()
+
+    def on_request(self, request: dict) -> dict:
+        """a single command, a batch of them or an admin request, as for
+        MatchEngine.on_request. Anything else is rejected as a malformed command"""
+        if isinstance(request, dict):
+            if "admin" in request:
+                return self.on_admin(request)
+            if isinstance(request.get("batch"), list):
+                return self.on_commands(
+                    request["batch"], request.get("stop_on_reject", True)
+                )
+        return self.on_command(request)
+
+    def on_admin(self, request: dict) -> dict:
+        """admin requests operate every worker's engine, so the reply has the reply
+        of each, in worker order"""
+        return {"admin": request["admin"], "workers": self._broadcast("admin", request)}
+
+    def poll_snapshot(self):
+        self._broadcast("poll_snapshot")
+
+    def poll_profile(self):
+        self._broadcast("poll_profile")
+
+    def flush_snapshot(self):
+        self._broadcast("flush_snapshot")
+
+    def _broadcast(self, request: str, payload=None) -> list[dict]:
+        futures = [
+            worker.executor.submit(self._send, worker, request, payload)
+            for worker in self.workers
+        ]
+        return [future.result() for future in futures]
+
+    def match_stats(self, match_id: int) -> dict:
+        worker = self.workers[match_id % self.num_workers]
+        return worker.executor.submit(self._send, worker, "stats", match_id).result()
+
+    def _send(self, worker: MatchWorker, request: str, payload) -> dict:
+        worker.conn.send((request, payload))
+        resp, messages = worker.conn.recv()
+        if request == "command":
+            self._track_matches(worker, resp)
+        elif request == "batch":
+            for ack in resp.get("batch", [resp]):
+                self._track_matches(worker, ack)
+        with self._listener_lock:
+            for message in messages:
+                deliver(self._score_listeners, message)
+        return resp
+
+    def _track_matches(self, worker: MatchWorker, resp: dict):
+        if "reject_reason" in resp:
+            return
+        event = resp["event"]
+        if event == EventType.MATCH_STARTED.value:
+            worker.live_matches += 1
+            self._latest_match_id = resp["match_id"]
+        elif event == EventType.MATCH_COMPLETED.value:
+            worker.live_matches -= 1
+
+    def close(self):
+        for worker in self.workers:
+            worker.executor.submit(worker.conn.send, ("stop", None)).result()
+            worker.executor.shutdown()
+        for worker in self.workers:
+            worker.process.join()
+            worker.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
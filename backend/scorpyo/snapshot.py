@@ -0,0 +1,297 @@
+import enum
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from scorpyo.event import EventType
+
+if TYPE_CHECKING:
+    from scorpyo.innings import Innings
+    from scorpyo.match import Match
+
+
+class SnapshotMode(enum.Enum):
+    FULL = "full"
+    DELTA = "delta"
+
+
+class SnapshotPolicy(enum.Enum):
+    EVERY_COMMAND = "every_command"
+    EVERY_N = "every_n"
+    BOUNDARY = "boundary"
+    THROTTLE = "throttle"
+
+
+BOUNDARY_EVENTS = {
+    EventType.MATCH_STARTED,
+    EventType.INNINGS_STARTED,
+    EventType.OVER_COMPLETED,
+    EventType.INNINGS_COMPLETED,
+    EventType.MATCH_COMPLETED,
+}
+
+
+class SnapshotScheduler:
+    """decides after each command whether a snapshot should be sent now or
+    coalesced into a later one. Whenever one is skipped the scheduler remembers
+    that the listeners are behind so that a later flush sends the latest state"""
+
+    def __init__(
+        self,
+        policy: SnapshotPolicy = SnapshotPolicy.EVERY_COMMAND,
+        every_n: int = 1,
+        interval_ms: float = 0,
+    ):
+        if every_n < 1:
+            raise ValueError(f"snapshot every_n must be at least 1, got {every_n}")
+        self.policy = policy
+        self.every_n = every_n
+        self.interval = interval_ms / 1000
+        self.pending = False
+        self._commands_since_snapshot = 0
+        self._last_sent = None
+
+    def on_command(self, event_type: Optional[EventType]) -> bool:
+        """register a processed command (event_type is None for a reject) and
+        return True if a snapshot should be sent straight away"""
+        self._commands_since_snapshot += 1
+        if event_type == EventType.UNDO:
+            # a correction should reach the listeners straight away
+            send = True
+        elif self.policy == SnapshotPolicy.EVERY_COMMAND:
+            send = True
+        elif self.policy == SnapshotPolicy.EVERY_N:
+            send = self._commands_since_snapshot >= self.every_n
+        elif self.policy == SnapshotPolicy.BOUNDARY:
+            send = event_type in BOUNDARY_EVENTS
+        else:
+            send = self.is_due()
+        self.pending = not send
+        return send
+
+    def is_due(self) -> bool:
+        if self._last_sent is None:
+            return True
+        return time.monotonic() - self._last_sent >= self.interval
+
+    def on_snapshot_sent(self):
+        self.pending = False
+        self._commands_since_snapshot = 0
+        self._last_sent = time.monotonic()
+
+    def __getstate__(self) -> dict:
+        # a monotonic time means nothing to another process, so is not checkpointed
+        return dict(self.__dict__, _last_sent=None)
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._last_sent = None
+
+
+class SnapshotTracker:
+    """Keeps the snapshot of a match as it was last sent, with the version of each
+    context it was built from, so that a delta is made from the contexts whose
+    version has changed rather than by rebuilding and diffing the whole snapshot.
+    The dicts and lists of the snapshot down to each innings' batters, bowlers and
+    overs are the tracker's own; below them are the contexts' cached overviews, which
+    are shared so must not be modified"""
+
+    def __init__(self):
+        self.snapshot: Optional[dict] = None
+        self._match_version = -1
+        self._inningses: list[_InningsState] = []
+
+    def reset(self, match: "Match"):
+        """start again from the full snapshot of the match"""
+        self.snapshot = {"match_id": match.match_id}
+        self.snapshot.update(match.overview())
+        self._match_version = match.version
+        self._inningses = [_InningsState(innings) for innings in match.match_inningses]
+        self.snapshot["inningses"] = [state.own for state in self._inningses]
+
+    def copy(self) -> dict:
+        """the snapshot in containers of its own, so that it can be sent"""
+        snapshot = dict(self.snapshot)
+        snapshot["inningses"] = [_own_innings(own) for own in snapshot["inningses"]]
+        return snapshot
+
+    def update(self, match: "Match") -> list[dict]:
+        """bring the snapshot up to date with the match and return the operations that
+        did so, as diff_snapshot would"""
+        operations = []
+        if match.version == self._match_version:
+            return operations
+        self._match_version = match.version
+        _diff_fields(
+            self.snapshot, match.overview(), ("match_id", "inningses"), [], operations
+        )
+        inningses = match.match_inningses
+        sent = self._inningses
+        if len(inningses) < len(sent) or any(
+            state.innings is not innings for state, innings in zip(sent, inningses)
+        ):
+            self._inningses = [_InningsState(innings) for innings in inningses]
+            own_inningses = [state.own for state in self._inningses]
+            self.snapshot["inningses"] = own_inningses
+            value = [_own_innings(own) for own in own_inningses]
+            operations.append({"op": "set", "path": ["inningses"], "value": value})
+            return operations
+        for idx, state in enumerate(sent):
+            state.update(["inningses", idx], operations)
+        for idx in range(len(sent), len(inningses)):
+            state = _InningsState(inningses[idx])
+            sent.append(state)
+            self.snapshot["inningses"].append(state.own)
+            value = _own_innings(state.own)
+            operations.append({"op": "set", "path": ["inningses", idx], "value": value})
+        return operations
+
+
+class _InningsState:
+    """the part of the tracked snapshot for one innings"""
+
+    CHILDREN = ("batters", "bowlers", "overs")
+
+    def __init__(self, innings: "Innings"):
+        self.innings = innings
+        self.version = innings.version
+        self.own = _own_innings(innings.overview())
+        self.yet_to_bat = innings.yet_to_bat_overview()
+        self.children = {name: self._versions(name) for name in self.CHILDREN}
+
+    def _contexts(self, name: str) -> list:
+        if name == "batters":
+            return self.innings.batter_inningses
+        if name == "bowlers":
+            return self.innings.current_bowler_inningses
+        return self.innings.overs
+
+    def _versions(self, name: str) -> list[tuple]:
+        return [(context, context.version) for context in self._contexts(name)]
+
+    def update(self, path: list, operations: list):
+        innings = self.innings
+        if innings.version == self.version:
+            return
+        self.version = innings.version
+        fields = innings.description()
+        fields.update(innings.snapshot())
+        # as in the overview, where the list of overs replaces the overs bowled
+        for name in self.CHILDREN:
+            fields.pop(name, None)
+        _diff_fields(self.own, fields, self.CHILDREN, path, operations)
+        yet_to_bat = innings.yet_to_bat_overview()
+        for name in self.CHILDREN:
+            contexts = self._contexts(name)
+            sent = self.children[name]
+            replaced = len(contexts) < len(sent) or any(
+                context is not sent_context
+                for context, (sent_context, _) in zip(contexts, sent)
+            )
+            if name == "batters" and yet_to_bat is not self.yet_to_bat:
+                # the yet to bat follow the batters, so move whenever one comes in
+                self.yet_to_bat = yet_to_bat
+                replaced = True
+            if replaced:
+                value = [context.overview() for context in contexts]
+                if name == "batters":
+                    value.extend(yet_to_bat)
+                self.own[name] = value
+                self.children[name] = self._versions(name)
+                operations.append(
+                    {"op": "set", "path": path + [name], "value": list(value)}
+                )
+                continue
+            own = self.own[name]
+            for idx, context in enumerate(contexts):
+                if idx < len(sent) and sent[idx][1] == context.version:
+                    continue
+                value = context.overview()
+                if idx < len(sent):
+                    sent[idx] = (context, context.version)
+                    own[idx] = value
+                else:
+                    # the lists only grow, so a new one goes on the end
+                    sent.append((context, context.version))
+                    own.append(value)
+                operations.append(
+                    {"op": "set", "path": path + [name, idx], "value": value}
+                )
+
+
+def _own_innings(overview: dict) -> dict:
+    own = dict(overview)
+    for name in _InningsState.CHILDREN:
+        own[name] = list(own[name])
+    return own
+
+
+def _diff_fields(
+    own: dict, fields: dict, kept: tuple, path: list, operations: list
+):
+    """bring the fields of own, other than those kept, up to date"""
+    for key, value in fields.items():
+        if key not in own or _differs(own[key], value):
+            own[key] = value
+            operations.append({"op": "set", "path": path + [key], "value": value})
+    for key in [key for key in own if key not in fields and key not in kept]:
+        del own[key]
+        operations.append({"op": "remove", "path": path + [key]})
+
+
+def _differs(old: Any, new: Any) -> bool:
+    return old is not new and (type(old) is not type(new) or old != new)
+
+
+def diff_snapshot(previous: dict, current: dict) -> list[dict]:
+    """compare two snapshots and return the operations that turn the previous one
+    into the current one. Each operation is either a 'set' of a value at a path or a
+    'remove' of the key at a path, where a path is a list of dict keys and list
+    indexes from the root of the snapshot"""
+    operations = []
+    _diff(previous, current, [], operations)
+    return operations
+
+
+def _diff(old: Any, new: Any, path: list, operations: list):
+    if old is new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key not in old:
+                operations.append({"op": "set", "path": path + [key], "value": value})
+            else:
+                _diff(old[key], value, path + [key], operations)
+        for key in old:
+            if key not in new:
+                operations.append({"op": "remove", "path": path + [key]})
+        return
+    if isinstance(old, list) and isinstance(new, list) and len(old) <= len(new):
+        # lists in a snapshot only ever grow (overs, batters, inningses) so diff
+        # the common prefix and append the rest
+        for idx, (old_item, new_item) in enumerate(zip(old, new)):
+            _diff(old_item, new_item, path + [idx], operations)
+        for idx in range(len(old), len(new)):
+            operations.append({"op": "set", "path": path + [idx], "value": new[idx]})
+        return
+    if type(old) is not type(new) or old != new:
+        operations.append({"op": "set", "path": path, "value": new})
+
+
+def apply_delta(snapshot: dict, operations: list[dict]) -> dict:
+    """apply the operations produced by diff_snapshot to a snapshot in place"""
+    for operation in operations:
+        path = operation["path"]
+        if not path:
+            snapshot = operation["value"]
+            continue
+        parent = snapshot
+        for key in path[:-1]:
+            parent = parent[key]
+        leaf = path[-1]
+        if operation["op"] == "remove":
+            del parent[leaf]
+        elif isinstance(parent, list) and leaf == len(parent):
+            parent.append(operation["value"])
+        else:
+            parent[leaf] = operation["value"]
+    return snapshot
@@ -0,0 +1,96 @@
+"""
+Topics a listener can subscribe to, so that it is only sent the part of the engine's
+traffic it cares about. Messages are matched before they are encoded, and snapshots
+nobody has subscribed to are never built.
+"""
+import enum
+from typing import Iterable, Optional
+
+from scorpyo.event import EventType
+
+
+class MessageKind(enum.Enum):
+    ACK = "ack"
+    REJECT = "reject"
+    SNAPSHOT = "snapshot"
+
+
+class Subscription:
+    """Each topic left as None is not filtered on, so an empty subscription matches
+    everything. The innings is the match_innings_num, as acked when it started, of
+    the innings the match was in when the message was sent; messages from before the
+    first innings have none, so are not matched by a subscription to particular
+    innings. Event types only apply to acks"""
+
+    def __init__(
+        self,
+        event_types: Optional[Iterable[EventType]] = None,
+        match_ids: Optional[Iterable[int]] = None,
+        innings: Optional[Iterable[int]] = None,
+        kinds: Optional[Iterable[MessageKind]] = None,
+    ):
+        self.event_types = _as_set(event_types, EventType)
+        self.match_ids = _as_set(match_ids)
+        self.innings = _as_set(innings)
+        self.kinds = _as_set(kinds, MessageKind)
+        # the event codes are what an ack carries, so are matched without parsing
+        self._event_codes = (
+            None
+            if self.event_types is None
+            else {event_type.value for event_type in self.event_types}
+        )
+
+    def matches(self, message: dict, innings: Optional[int] = None) -> bool:
+        if message.get("is_snapshot"):
+            kind = MessageKind.SNAPSHOT
+        elif "reject_reason" in message:
+            kind = MessageKind.REJECT
+        else:
+            kind = MessageKind.ACK
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        if (
+            kind == MessageKind.ACK
+            and self._event_codes is not None
+            and message.get("event") not in self._event_codes
+        ):
+            return False
+        return self._matches_match(message.get("match_id"), innings)
+
+    def wants_snapshot(self, match_id: int, innings: Optional[int] = None) -> bool:
+        """whether a snapshot of the match would be matched, before it is built"""
+        if self.kinds is not None and MessageKind.SNAPSHOT not in self.kinds:
+            return False
+        return self._matches_match(match_id, innings)
+
+    def _matches_match(self, match_id: Optional[int], innings: Optional[int]) -> bool:
+        if self.match_ids is not None and match_id not in self.match_ids:
+            return False
+        if self.innings is not None and innings not in self.innings:
+            return False
+        return True
+
+    @classmethod
+    def from_dict(cls, topics: dict) -> "Subscription":
+        """a subscription from its JSON form, e.g.
+        {"event_types": ["bc", "oc"], "match_ids": [0], "kinds": ["ack"]}"""
+        unknown = set(topics) - {"event_types", "match_ids", "innings", "kinds"}
+        if unknown:
+            raise ValueError(f"unknown subscription topics {sorted(unknown)}")
+        return cls(**topics)
+
+    def __repr__(self) -> str:
+        topics = {
+            name: sorted(getattr(value, "value", value) for value in values)
+            for name, values in vars(self).items()
+            if not name.startswith("_") and values is not None
+        }
+        return f"Subscription({topics})"
+
+
+def _as_set(values: Optional[Iterable], enum_type=None) -> Optional[set]:
+    if values is None:
+        return None
+    if enum_type is None:
+        return set(values)
+    return {enum_type(value) for value in values}
@@ -1,5 +1,7 @@
 import logging
+import sys
 import time
+import types
 
 from configparser import ConfigParser
 from typing import Optional
@@ -50,3 +52,29 @@ def balls_to_overs(balls: int) -> str:
     balls_in_over = balls % 6
     overs_completed = balls // 6
     return f"{overs_completed}.{balls_in_over}"
+
+
+def deep_sizeof(obj, exclude: tuple = ()) -> int:
+    """approximate number of bytes held by an object and everything it references,
+    skipping instances of the excluded types and anything shared at module level"""
+    seen = set()
+    total = 0
+    stack = [obj]
+    skip = (type, types.ModuleType, types.FunctionType, types.MethodType) + exclude
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, skip):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        if hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+        for slot in getattr(type(item), "__slots__", ()):
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
@@ -0,0 +1,563 @@
+"""
+Validation of each command before its handler runs. Every event type declares the
+fields its payload may carry and the preconditions the context handling it must
+meet, and these are compiled into a single function per event type when the module
+is imported. A command is therefore either rejected before anything has changed, or
+handled by code that can assume it is valid.
+"""
+import enum
+import functools
+from typing import Any, Callable, Iterable, Optional
+
+from scorpyo.definitions.dismissal import get_dismissal_type
+from scorpyo.definitions.innings import BatterInningsState, InningsState
+from scorpyo.definitions.match import get_match_type
+from scorpyo.entity import EntityType
+from scorpyo.error import EngineError, RejectReason
+from scorpyo.event import EventType
+from scorpyo.over import OverState
+from scorpyo.score import Score
+from scorpyo.util import LOGGER
+
+
+# a check is given the context handling the command and its payload, and returns a
+# message saying what is wrong, or None
+Check = Callable[[Any, dict], Optional[str]]
+
+
+class Field:
+    """a payload field and what its value must be: of a given type, one of the values
+    of an enum, parseable by a function, or the name of an entity, which may further
+    have to be found in a collection taken from the context"""
+
+    def __init__(
+        self,
+        name: str,
+        kind: Any = str,
+        required: bool = True,
+        choices: Optional[type[enum.Enum]] = None,
+        parse: Optional[Callable[[Any], Any]] = None,
+        entity: Optional[EntityType] = None,
+        within: Optional[Callable[[Any], Iterable]] = None,
+        within_msg: str = "",
+    ):
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.choices = choices
+        self.parse = parse
+        self.entity = entity
+        self.within = within
+        self.within_msg = within_msg
+
+
+class Precondition:
+    def __init__(
+        self, check: Check, reason: RejectReason = RejectReason.ILLEGAL_OPERATION
+    ):
+        self.check = check
+        self.reason = reason
+
+
+def compile_validator(
+    fields: list[Field], preconditions: list[Precondition]
+) -> Callable[[Any, dict], None]:
+    """build the function that checks a payload against the fields and then the
+    context against the preconditions, raising an EngineError on the first failure"""
+    checks = [(_compile_field(field), RejectReason.BAD_COMMAND) for field in fields]
+    checks += [(p.check, p.reason) for p in preconditions]
+
+    def validate(context, payload: dict):
+        if not isinstance(payload, dict):
+            _reject(f"command body must be an object, got {payload!r}")
+        for check, reason in checks:
+            msg = check(context, payload)
+            if msg:
+                _reject(msg, reason)
+
+    return validate
+
+
+def _reject(msg: str, reason: RejectReason = RejectReason.BAD_COMMAND):
+    LOGGER.warning(msg)
+    raise EngineError(msg, reason)
+
+
+def _compile_field(field: Field) -> Check:
+    # only the checks the field needs are composed, so a plain optional string costs
+    # a dict lookup and an isinstance
+    name = field.name
+    steps: list[Callable[[Any, Any], Optional[str]]] = []
+    if field.choices is not None:
+        choices = field.choices
+
+        def check_choice(context, value):
+            try:
+                choices(value)
+            except ValueError:
+                allowed = [choice.value for choice in choices]
+                return f"invalid {name} {value!r}, expected one of {allowed}"
+
+        steps.append(check_choice)
+    else:
+        kind = field.kind
+        kinds = kind if isinstance(kind, tuple) else (kind,)
+        kind_names = " or ".join(k.__name__ for k in kinds)
+
+        def check_kind(context, value):
+            # bools are ints, but never a valid count or id
+            if not isinstance(value, kinds) or (
+                isinstance(value, bool) and bool not in kinds
+            ):
+                return f"{name} must be a {kind_names}, got {value!r}"
+
+        steps.append(check_kind)
+    if field.parse is not None:
+        parse = field.parse
+
+        def check_parse(context, value):
+            try:
+                parse(value)
+            except (ValueError, KeyError) as e:
+                return f"invalid {name} {value!r}: {e}"
+
+        steps.append(check_parse)
+    if field.entity is not None:
+        entity_type, within, within_msg = field.entity, field.within, field.within_msg
+
+        def check_entity(context, value):
+            try:
+                entity = context.entity_registrar.get_entity_data(entity_type, value)
+            except ValueError:
+                return f"no {entity_type.name.lower()} found called {value}"
+            if within is not None and entity not in within(context):
+                return within_msg.format(entity=entity)
+
+        steps.append(check_entity)
+
+    def check_field(context, payload: dict) -> Optional[str]:
+        value = payload.get(name)
+        if value is None:
+            return f"must specify {name}" if field.required else None
+        for step in steps:
+            msg = step(context, value)
+            if msg:
+                return msg
+        return None
+
+    return check_field
+
+
+def _player(context, payload: dict, name: str):
+    """the player named in an already validated field"""
+    return context.entity_registrar.get_entity_data(EntityType.PLAYER, payload[name])
+
+
+# entities can be referred to by name or unique_id
+ENTITY_REF = (str, int)
+
+
+class HomeOrAway(enum.Enum):
+    HOME = "home"
+    AWAY = "away"
+
+
+# ---- match level ----
+
+
+def _match_type_exists(engine, payload: dict) -> Optional[str]:
+    try:
+        get_match_type(payload["match_type"])
+    except ValueError:
+        return f"invalid match type: {payload['match_type']}"
+
+
+def _match_is_live(engine, payload: dict) -> Optional[str]:
+    session = engine.get_session(payload.get("match_id"))
+    if not session.is_live:
+        match_id = payload.get("match_id")
+        return f"match_id {match_id} is not in progress so cannot complete it"
+
+
+def _lineup_players_exist(match, payload: dict) -> Optional[str]:
+    for name in payload["lineup"]:
+        try:
+            match.entity_registrar.get_entity_data(EntityType.PLAYER, name)
+        except ValueError:
+            return f"no player found called {name}"
+
+
+def _lineups_defined(match, payload: dict) -> Optional[str]:
+    if not match.home_lineup or not match.away_lineup:
+        return (
+            "cannot start an innings without first defining the lineups of each team"
+        )
+
+
+def _innings_remaining(match, payload: dict) -> Optional[str]:
+    if match.num_innings_completed // 2 == match.max_inningses:
+        return f"Match already has {match.max_inningses} innings per side"
+
+
+def _no_innings_in_progress(match, payload: dict) -> Optional[str]:
+    if match.match_inningses and not match.match_inningses[-1].is_complete:
+        return "cannot start an innings while another one is still in progress."
+
+
+def _batting_team_in_match(match) -> list:
+    return [match.home_team, match.away_team]
+
+
+def _innings_in_progress(match, payload: dict) -> Optional[str]:
+    innings = match.current_innings
+    if not innings:
+        return "cannot complete an innings when there is none in progress"
+    if innings.state != InningsState.IN_PROGRESS:
+        return (
+            f"innings {innings.match_innings_num} is not in progress so cannot "
+            f"complete it"
+        )
+
+
+def _innings_can_end(match, payload: dict) -> Optional[str]:
+    innings = match.current_innings
+    reason = InningsState(payload["reason"])
+    if reason == InningsState.ALL_OUT:
+        if len(innings.yet_to_bat) != 0:
+            return (
+                f"there are still batters remaining so cannot end the innings "
+                f"for reason: {reason}"
+            )
+        if len(innings.active_batter_inningses) > 1:
+            return (
+                "there are still two batters at the crease, cannot end innings "
+                "without terminating one first."
+            )
+    if reason == InningsState.OVERS_COMPLETE:
+        if len(innings.overs) != match.max_overs():
+            return (
+                f"the allotted number of overs has not been bowled so cannot end "
+                f"the innings for reason {reason}"
+            )
+    if reason == InningsState.TARGET_REACHED:
+        if not innings.target or innings.total_runs < innings.target:
+            return (
+                f"there is either no valid target that can be "
+                f"reached in this innings or the target has not been reached, "
+                f"so cannot end the innings for reason {reason}. "
+                f"target={innings.target} current_score={innings.total_runs}"
+            )
+
+
+# ---- innings level ----
+
+
+def _innings_not_complete(innings, payload: dict) -> Optional[str]:
+    if innings.is_complete:
+        return f"innings {innings.match_innings_num} has already completed"
+
+
+def _no_dismissal_pending(innings, payload: dict) -> Optional[str]:
+    if innings._dismissal_pending:
+        return (
+            "received BallCompleted before BatterInningsCompleted while dismissal "
+            "pending"
+        )
+
+
+def _two_batters_in(innings, payload: dict) -> Optional[str]:
+    if not innings.on_strike_innings or not innings.off_strike_innings:
+        return "cannot bowl a ball without two batters at the crease"
+
+
+def _over_in_progress(innings, payload: dict) -> Optional[str]:
+    over = innings.current_over
+    if not over or over.state != OverState.IN_PROGRESS:
+        return "there is no over in progress, send an OverStarted event first"
+
+
+def _over_not_full(innings, payload: dict) -> Optional[str]:
+    if innings.current_over.max_balls_bowled:
+        ball_score = Score.parse(payload["score_text"])
+        if ball_score.is_valid_delivery():
+            return "over has more than 6 legal deliveries"
+
+
+def _valid_dismissal(innings, payload: dict) -> Optional[str]:
+    dismissal = payload.get("dismissal")
+    if dismissal is None:
+        return None
+    if not isinstance(dismissal, dict) or "type" not in dismissal:
+        return "dismissal must be an object with a type"
+    try:
+        dismissal_type = get_dismissal_type(dismissal["type"])
+    except ValueError as e:
+        return str(e)
+    players = {}
+    for role in ("batter", "fielder", "bowler"):
+        if dismissal.get(role) is None:
+            continue
+        try:
+            players[role] = _player(innings, dismissal, role)
+        except ValueError:
+            return f"no player found called {dismissal[role]}"
+    batter = players.get("batter")
+    if batter is None:
+        return None
+    if batter not in (innings.striker, innings.non_striker):
+        return f"batter {batter.name} is not currently at the crease"
+    if dismissal_type.batter_implied and batter != innings.striker:
+        return (
+            f"dismissal type {dismissal_type.name} can only be of the striker "
+            f"{innings.striker.name}"
+        )
+
+
+def _crease_not_full(innings, payload: dict) -> Optional[str]:
+    if innings.on_strike_innings and innings.off_strike_innings:
+        return "there are already two batters at the crease - complete one first"
+
+
+def _batter_available(innings, payload: dict) -> Optional[str]:
+    if "batter" in payload:
+        batter = _player(innings, payload, "batter")
+    elif innings.wickets_down + 1 >= len(innings.batting_lineup):
+        return "cannot process new batter innings as there are no players left"
+    else:
+        batter = innings.next_batter
+    if batter in innings.already_batted:
+        return "batter has already batted"
+
+
+def _batter_has_innings(innings, payload: dict) -> Optional[str]:
+    if _player(innings, payload, "batter") not in innings.already_batted:
+        return f"batter {payload['batter']} has no innings to complete"
+
+
+def _dismissal_consistent(innings, payload: dict) -> Optional[str]:
+    state = BatterInningsState(payload.get("reason", BatterInningsState.DISMISSED))
+    if state != BatterInningsState.DISMISSED:
+        return None
+    batter = _player(innings, payload, "batter")
+    previous_ball = innings.previous_ball
+    prev_dismissal = previous_ball.dismissal if previous_ball else None
+    if not prev_dismissal:
+        return (
+            "batter innings completed via dismissal ball event has no associated "
+            "dismissal"
+        )
+    if prev_dismissal.batter != batter:
+        return (
+            f"batter dismissed in previous ball: {prev_dismissal.batter} does not "
+            f"equal batter whose innings has just completed: {batter}"
+        )
+
+
+def _over_number_available(innings, payload: dict) -> Optional[str]:
+    max_overs_allowed = innings.match.max_overs()
+    # matches without a limit, e.g. first class, have no max_overs
+    if max_overs_allowed is not None and len(innings.overs) >= max_overs_allowed:
+        return f"innings already has max number of overs {max_overs_allowed}"
+
+
+def _previous_over_completed(innings, payload: dict) -> Optional[str]:
+    if innings.current_over and innings.current_over.state == OverState.IN_PROGRESS:
+        return (
+            "Existing over has not yet completed. Send an OverCompleted event before "
+            "sending an OverStarted event"
+        )
+
+
+def _bowler_can_bowl(innings, payload: dict) -> Optional[str]:
+    bowler = _player(innings, payload, "bowler")
+    if innings.current_over and bowler == innings.current_bowler:
+        return f"bowler {bowler} cannot bowl two overs in a row"
+    for bowler_innings in innings.current_bowler_inningses:
+        if (
+            bowler_innings.player == bowler
+            and bowler_innings.overs_completed == innings.match.max_bowler_overs
+        ):
+            return f"bowler {bowler} has already bowled their full allotment of overs"
+
+
+def _over_to_complete(innings, payload: dict) -> Optional[str]:
+    over = innings.current_over
+    if not over:
+        return "there is no over to complete"
+    if over.state != OverState.IN_PROGRESS:
+        return "the over has already completed, send an OverStarted event first"
+
+
+def _bowler_of_over(innings, payload: dict) -> Optional[str]:
+    if "bowler" in payload and _player(innings, payload, "bowler") != (
+        innings.current_bowler
+    ):
+        return (
+            f"OverCompleted event raised for a bowler {payload['bowler']} who is not "
+            f"the bowler of the most recent over"
+        )
+
+
+def _over_can_complete(innings, payload: dict) -> Optional[str]:
+    reason = OverState(payload.get("reason") or OverState.COMPLETED)
+    if reason == OverState.COMPLETED and innings.current_over.balls_bowled < 6:
+        return (
+            "over cannot have completed with less than 6 legal deliveries bowled "
+            "unless the innings ended"
+        )
+
+
+def _undo_count(innings, payload: dict) -> Optional[str]:
+    count = payload.get("count", 1)
+    if count < 1:
+        return f"undo count must be a positive integer, got {count}"
+
+
+def _undo_available(innings, payload: dict) -> Optional[str]:
+    if innings.is_complete:
+        return "cannot undo commands of an innings that has completed"
+    count = payload.get("count", 1)
+    if count > len(innings._undo_log):
+        return (
+            f"cannot undo {count} commands, only {len(innings._undo_log)} can be "
+            f"undone in the current innings"
+        )
+
+
+BAD = RejectReason.BAD_COMMAND
+
+VALIDATORS: dict[EventType, Callable[[Any, dict], None]] = {
+    EventType.MATCH_STARTED: compile_validator(
+        [
+            Field("match_type"),
+            Field("home_team", ENTITY_REF, entity=EntityType.TEAM),
+            Field("away_team", ENTITY_REF, entity=EntityType.TEAM),
+        ],
+        [Precondition(_match_type_exists)],
+    ),
+    EventType.MATCH_COMPLETED: compile_validator(
+        [Field("match_id", int, required=False), Field("reason", required=False)],
+        [Precondition(_match_is_live)],
+    ),
+    EventType.REGISTER_LINE_UP: compile_validator(
+        [
+            Field("team", choices=HomeOrAway),
+            Field("lineup", list),
+        ],
+        [Precondition(_lineup_players_exist, BAD)],
+    ),
+    EventType.INNINGS_STARTED: compile_validator(
+        [
+            Field(
+                "batting_team",
+                ENTITY_REF,
+                entity=EntityType.TEAM,
+                within=_batting_team_in_match,
+                within_msg="team {entity} is not playing in this match",
+            )
+        ],
+        [
+            Precondition(_innings_remaining),
+            Precondition(_no_innings_in_progress),
+            Precondition(_lineups_defined),
+        ],
+    ),
+    EventType.INNINGS_COMPLETED: compile_validator(
+        [Field("reason", choices=InningsState)],
+        [Precondition(_innings_in_progress), Precondition(_innings_can_end)],
+    ),
+    EventType.BALL_COMPLETED: compile_validator(
+        [
+            Field("score_text", str, parse=Score.parse),
+            Field("dismissal", dict, required=False),
+        ],
+        [
+            Precondition(_innings_not_complete),
+            Precondition(_no_dismissal_pending),
+            Precondition(_two_batters_in),
+            Precondition(_over_in_progress),
+            Precondition(_over_not_full),
+            Precondition(_valid_dismissal, BAD),
+        ],
+    ),
+    EventType.BATTER_INNINGS_STARTED: compile_validator(
+        [
+            Field(
+                "batter",
+                ENTITY_REF,
+                required=False,
+                entity=EntityType.PLAYER,
+                within=lambda innings: innings.batting_lineup,
+                within_msg="batter {entity} is not part of the batting team",
+            )
+        ],
+        [
+            Precondition(_innings_not_complete),
+            Precondition(_crease_not_full),
+            Precondition(_batter_available),
+        ],
+    ),
+    EventType.BATTER_INNINGS_COMPLETED: compile_validator(
+        [
+            Field(
+                "batter",
+                ENTITY_REF,
+                entity=EntityType.PLAYER,
+                within=lambda innings: innings.batting_lineup,
+                within_msg="batter {entity} is not part of the batting team",
+            ),
+            Field("reason", required=False, choices=BatterInningsState),
+        ],
+        [
+            Precondition(_batter_has_innings, BAD),
+            Precondition(_dismissal_consistent, BAD),
+        ],
+    ),
+    EventType.OVER_STARTED: compile_validator(
+        [
+            Field(
+                "bowler",
+                ENTITY_REF,
+                entity=EntityType.PLAYER,
+                within=lambda innings: innings.bowling_lineup,
+                within_msg="bowler {entity} does not play for the bowling team",
+            )
+        ],
+        [
+            Precondition(_innings_not_complete),
+            Precondition(_over_number_available),
+            Precondition(_previous_over_completed),
+            Precondition(_bowler_can_bowl),
+        ],
+    ),
+    EventType.OVER_COMPLETED: compile_validator(
+        [
+            Field("bowler", ENTITY_REF, required=False, entity=EntityType.PLAYER),
+            Field("reason", required=False, choices=OverState),
+        ],
+        [
+            Precondition(_over_to_complete),
+            Precondition(_bowler_of_over, BAD),
+            Precondition(_over_can_complete),
+        ],
+    ),
+    EventType.UNDO: compile_validator(
+        [Field("count", int, required=False)],
+        [Precondition(_undo_count, BAD), Precondition(_undo_available)],
+    ),
+}
+
+
+def validated(event_type: EventType):
+    """run the event type's validator on the payload before the handler"""
+    validate = VALIDATORS[event_type]
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(context, payload: dict):
+            validate(context, payload)
+            return handler(context, payload)
+
+        return wrapper
+
+    return decorator
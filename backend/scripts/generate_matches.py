@@ -0,0 +1,73 @@
+"""
+Write a corpus of synthetic matches, one command file per match in the same form as
+data/sample_commands.json, generated in parallel. The same seed always writes the
+same corpus:
+
+    python -m scripts.generate_matches --count 5000 --seed 1 --output corpus/
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from scorpyo.definitions.match import get_all_shortcodes
+from scorpyo.generator import generate_match, match_seed
+from scorpyo.registrar import EntityRegistrar
+from scorpyo.util import load_config
+
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config_tcp.ini")
+
+_registrar: Optional[EntityRegistrar] = None
+
+
+def load_registrar(config_path: str):
+    global _registrar
+    _registrar = EntityRegistrar(load_config(config_path))
+
+
+def write_match(seed: int, match_num: int, match_type: str, output: str) -> str:
+    commands = generate_match(_registrar, match_seed(seed, match_num), match_type)
+    path = os.path.join(output, f"match_{match_num:06d}_{match_type}.json")
+    with open(path, "w") as fh:
+        json.dump(commands, fh)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate synthetic matches")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--match-type",
+        action="append",
+        choices=sorted(get_all_shortcodes()),
+        help="match types to cycle through, all of them by default",
+    )
+    parser.add_argument("--output", default="corpus")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--config", default=CONFIG_PATH)
+    args = parser.parse_args()
+    match_types = args.match_type or sorted(get_all_shortcodes())
+    os.makedirs(args.output, exist_ok=True)
+    with ProcessPoolExecutor(
+        args.workers, initializer=load_registrar, initargs=(args.config,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                write_match,
+                args.seed,
+                n,
+                match_types[n % len(match_types)],
+                args.output,
+            )
+            for n in range(args.count)
+        ]
+        for future in futures:
+            future.result()
+    print(f"wrote {args.count} matches to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
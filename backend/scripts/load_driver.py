@@ -0,0 +1,75 @@
+"""
+Drive many concurrent scorers against a running engine server over TCP, or against
+client stacks over their WebSockets, replaying command files such as those written
+by generate_matches.py, then report throughput, rejects and latency:
+
+    python -m scripts.load_driver corpus/ --scorers 50 --interval 0.5 --port 13253
+    python -m scripts.load_driver corpus/ --transport ws --url ws://127.0.0.1:13254
+"""
+import argparse
+import glob
+import json
+import os
+
+from scorpyo.client.load import Transport, run_load, tcp_connector, ws_connector
+from scorpyo.codec import JSON, CODECS, get_codec
+
+
+def load_matches(paths: list[str]) -> list[list[dict]]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            files.append(path)
+    matches = []
+    for file in files:
+        with open(file) as fh:
+            matches.append(json.load(fh))
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="drive concurrent scorers")
+    parser.add_argument("commands", nargs="+", help="command files or directories")
+    parser.add_argument(
+        "--transport",
+        choices=[t.value for t in Transport],
+        default=Transport.TCP.value,
+    )
+    parser.add_argument("--scorers", type=int, default=10)
+    parser.add_argument(
+        "--interval", type=float, default=0.0, help="seconds between commands"
+    )
+    parser.add_argument(
+        "--ramp-up", type=float, default=0.0, help="seconds to start all scorers over"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="engine server port, for tcp")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=JSON.name)
+    parser.add_argument(
+        "--url", action="append", help="client WebSocket url, for ws, repeatable"
+    )
+    parser.add_argument("--output", help="file to write the report to")
+    args = parser.parse_args()
+    if Transport(args.transport) == Transport.TCP:
+        if args.port is None:
+            parser.error("--port is needed to drive the engine server over tcp")
+        connect = tcp_connector(args.host, args.port, get_codec(args.codec))
+    else:
+        if not args.url:
+            parser.error("--url is needed to drive a client over ws")
+        connect = ws_connector(args.url)
+    matches = load_matches(args.commands)
+    if not matches:
+        parser.error("no command files found")
+    report = run_load(connect, matches, args.scorers, args.interval, args.ramp_up)
+    dump = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(dump)
+    print(dump)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmarks of the engine's hot path, kept out of the test run as they take a while.
+
+Macro benchmarks score whole generated matches of each type through
+MatchEngine.on_command, reporting commands per second and the latency of each ball.
+Micro benchmarks time the calls every ball leans on. Results are written as JSON,
+and can be compared with an earlier run to fail on a regression:
+
+    python -m test.benchmark --output bench.json
+    python -m test.benchmark --compare bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+from typing import Optional
+
+from scorpyo.codec import JSON, orjson
+from scorpyo.engine import MatchEngine
+from scorpyo.entity import EntityType
+from scorpyo.generator import generate_match, match_seed
+from scorpyo.innings import find_innings
+from scorpyo.metrics import percentile
+from scorpyo.score import Score
+from scorpyo.registrar import EntityRegistrar
+from test.common import TEST_CONFIG_PATH
+
+MATCH_TYPES = ("T20", "OD", "FC")
+# the matches scored are generated from this, so are the same every run
+SEED = 2022
+PARSED_TEXTS = (".", "1", "4", "6", "W", "w", "1lb", "2nb", "3")
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class EncodingListener:
+    """takes messages encoded as JSON, as the servers do"""
+
+    def on_encoded_message(self, message: dict, payload: bytes):
+        pass
+
+
+def replay(engine: MatchEngine, commands: list[dict]) -> dict[str, list[float]]:
+    """score a match through the engine, returning how long each command took by
+    event type"""
+    timings: dict[str, list[float]] = {}
+    match_id = None
+    for command_id, command in enumerate(commands):
+        command = dict(command, command_id=command_id)
+        if match_id is not None:
+            command["match_id"] = match_id
+        start = time.perf_counter()
+        response = engine.on_command(command)
+        timings.setdefault(command["event"], []).append(time.perf_counter() - start)
+        if "reject_reason" in response:
+            raise RuntimeError(f"benchmark command {command} rejected: {response}")
+        match_id = response.get("match_id", match_id)
+    return timings
+
+
+def create_engine(registrar: EntityRegistrar) -> MatchEngine:
+    engine = MatchEngine(registrar)
+    engine.register_client(EncodingListener(), codec=JSON.name)
+    return engine
+
+
+def run_macro(registrar: EntityRegistrar, repeats: int) -> dict:
+    results = {}
+    for match_type in MATCH_TYPES:
+        timings: dict[str, list[float]] = {}
+        for n in range(repeats):
+            commands = generate_match(registrar, match_seed(SEED, n), match_type)
+            for event, times in replay(create_engine(registrar), commands).items():
+                timings.setdefault(event, []).extend(times)
+        all_times = [t for times in timings.values() for t in times]
+        balls = timings["bc"]
+        results[match_type] = {
+            "matches": repeats,
+            "commands": len(all_times),
+            "commands_per_sec": len(all_times) / sum(all_times),
+            "ball_latency": {
+                f"p{round(q * 100)}": percentile(balls, q) for q in PERCENTILES
+            },
+            "ball_mean": sum(balls) / len(balls),
+        }
+    return results
+
+
+def time_call(func, repeat: int = 5) -> float:
+    """the best time of a call over several runs, in seconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run_micro(registrar: EntityRegistrar) -> dict:
+    engine = create_engine(registrar)
+    replay(engine, generate_match(registrar, match_seed(SEED, 0), "T20"))
+    match = engine.current_match
+    innings = match.match_inningses[0]
+    last_batter = innings.batter_inningses[-1].player
+    last_player = registrar.get_all_of_type(EntityType.PLAYER)[-1]
+    snapshot = match.snapshot()
+
+    def parse_all():
+        for text in PARSED_TEXTS:
+            Score.parse(text)
+
+    def render_innings_overview():
+        innings.touch()
+        return innings.overview()
+
+    calls = {
+        "score_parse": lambda: parse_all(),
+        "get_entity_data_by_name": lambda: registrar.get_entity_data(
+            EntityType.PLAYER, last_player.name
+        ),
+        "get_entity_data_by_id": lambda: registrar.get_entity_data(
+            EntityType.PLAYER, last_player.unique_id
+        ),
+        "find_innings": lambda: find_innings(last_batter, innings.batter_inningses),
+        "innings_overview_cached": innings.overview,
+        "innings_overview_rendered": render_innings_overview,
+        "match_snapshot": match.snapshot,
+        "json_encode_snapshot": lambda: JSON.encode(snapshot),
+    }
+    results = {name: time_call(call) for name, call in calls.items()}
+    # per text, so that it stays comparable if the texts parsed change
+    results["score_parse"] /= len(PARSED_TEXTS)
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """the timings that have got more than tolerance slower than the baseline"""
+    regressions = []
+    for match_type, macro in results["macro"].items():
+        previous = baseline["macro"].get(match_type)
+        if not previous:
+            continue
+        for name, value in macro["ball_latency"].items():
+            if value > previous["ball_latency"][name] * (1 + tolerance):
+                regressions.append(f"{match_type} ball {name}")
+        if macro["commands_per_sec"] < previous["commands_per_sec"] / (1 + tolerance):
+            regressions.append(f"{match_type} commands_per_sec")
+    for name, value in results["micro"].items():
+        previous = baseline["micro"].get(name)
+        if previous and value > previous * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeats", type=int, default=3, help="matches per type")
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of an earlier run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    registrar = EntityRegistrar(TEST_CONFIG_PATH)
+    results = {
+        "python": platform.python_version(),
+        "orjson": orjson is not None,
+        "macro": run_macro(registrar, args.repeats),
+        "micro": run_micro(registrar),
+    }
+    dump = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(dump)
+    else:
+        print(dump)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = find_regressions(results, json.load(fh), args.tolerance)
+        if regressions:
+            print(f"regressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
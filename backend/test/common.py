@@ -1,10 +1,69 @@
+import copy
+import json
 import os
 
 from scorpyo.innings import Innings
 from scorpyo.match import Match
+from scorpyo.score import Score
+from scorpyo.snapshot import apply_delta
 
 RESOURCES_PATH = os.path.join(os.path.dirname(__file__), "resources")
 TEST_CONFIG_PATH = os.path.join(RESOURCES_PATH, "test_config.cfg")
+TEST_MATCH_INPUT_PATH = os.path.join(RESOURCES_PATH, "test_match_input.json")
+
+
+def load_match_commands() -> list[dict]:
+    with open(TEST_MATCH_INPUT_PATH) as fh:
+        return json.load(fh)
+
+
+def apply_commands(engine: "MatchEngine", commands: list[dict]) -> list[dict]:
+    """apply the commands of a single match, starting with its MatchStarted"""
+    responses = []
+    match_id = None
+    for command_id, command in enumerate(commands):
+        command["command_id"] = command_id
+        if match_id is not None:
+            command["match_id"] = match_id
+        response = engine.on_command(command)
+        match_id = response.get("match_id", match_id)
+        responses.append(response)
+    return responses
+
+
+def without_times(snapshot):
+    """times are taken when a command is applied, so differ between runs"""
+    if isinstance(snapshot, dict):
+        return {
+            k: without_times(v) for k, v in snapshot.items() if not k.endswith("time")
+        }
+    if isinstance(snapshot, list):
+        return [without_times(item) for item in snapshot]
+    return snapshot
+
+
+def rebuild_snapshot(messages: list[dict]) -> dict:
+    """the snapshot a listener ends up with from the snapshot messages it was sent,
+    checking every delta builds on the version it already has"""
+    envelope_keys = ("version", "is_delta", "is_snapshot")
+    rebuilt, version = None, None
+    for message in messages:
+        if not message["is_snapshot"]:
+            continue
+        if message["is_delta"]:
+            assert message["base_version"] == version
+            rebuilt = apply_delta(rebuilt, message["delta"])
+        else:
+            rebuilt = copy.deepcopy(
+                {k: v for k, v in message.items() if k not in envelope_keys}
+            )
+        version = message["version"]
+    return rebuilt
+
+
+def set_runs_off_bat(innings: Innings, runs: int):
+    """give an innings a score without bowling the balls"""
+    innings._score = Score(runs, 0, 0, 0, 0, 0, 0)
 
 
 def apply_ball_events(payloads: list[dict], mock_innings: Innings):
@@ -7,6 +7,7 @@ from scorpyo.engine import MatchEngine
 from scorpyo.innings import find_innings, BatterInningsState, BatterInnings
 from scorpyo.match import Match
 from scorpyo.over import OverState
+from scorpyo.score import BallStore
 from scorpyo.entity import Player
 from scorpyo.registrar import EntityType, EntityRegistrar, CommandRegistrar
 from scorpyo.definitions import match
@@ -48,6 +49,7 @@ class MockMatch(Match):
         self.num_innings_completed = 0
         self.match_inningses = []
         self.match_type = match.TWENTY_20
+        self.ball_store = BallStore()
 
     def swap_batters(self, old_batter, new_batter):
         existing_innings = find_innings(
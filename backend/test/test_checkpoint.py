@@ -0,0 +1,122 @@
+import pytest
+
+from scorpyo.checkpoint import CheckpointPolicy, CheckpointStore
+from scorpyo.engine import MatchEngine
+from scorpyo.history import RetentionPolicy
+from scorpyo.journal import CommandJournal
+from .common import apply_commands, load_match_commands, without_times
+
+
+def create_engine(
+    registrar, tmp_path, policy=CheckpointPolicy.OVER, every_n=100, retention=None
+):
+    journal = CommandJournal(str(tmp_path / "engine.journal"))
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints"), policy, every_n)
+    return MatchEngine(
+        registrar, journal=journal, checkpoints=checkpoints, retention=retention
+    )
+
+
+@pytest.mark.parametrize(
+    "policy, every_n, num_replayed",
+    [
+        (CheckpointPolicy.NONE, 1, 20),
+        (CheckpointPolicy.OVER, 1, 5),
+        (CheckpointPolicy.EVERY_N, 4, 0),
+        (CheckpointPolicy.EVERY_N, 6, 2),
+    ],
+)
+def test_recover_from_checkpoint(
+    registrar, tmp_path, mocker, policy, every_n, num_replayed
+):
+    engine = create_engine(registrar, tmp_path, policy, every_n)
+    apply_commands(engine, load_match_commands())
+    expected = without_times(engine.current_match.snapshot())
+    engine.close()
+
+    recovered = create_engine(registrar, tmp_path, policy, every_n)
+    replay = mocker.spy(recovered, "apply_command")
+    recovered.recover()
+    assert replay.call_count == num_replayed
+    assert without_times(recovered.current_match.snapshot()) == expected
+    assert recovered.get_session(0).message_id == 21
+    assert recovered.next_match_id == 1
+
+
+def test_checkpoint_keeps_spilled_history(registrar, tmp_path):
+    retention = RetentionPolicy(2, str(tmp_path))
+    engine = create_engine(registrar, tmp_path, CheckpointPolicy.EVERY_N, 4, retention)
+    apply_commands(engine, load_match_commands())
+    balls = list(engine.current_match.ball_store._balls)
+    engine.close()
+
+    recovered = create_engine(
+        registrar, tmp_path, CheckpointPolicy.EVERY_N, 4, retention
+    )
+    recovered.recover()
+    ball_store = recovered.current_match.ball_store
+    assert ball_store.num_spilled > 0
+    restored = list(ball_store._balls)
+    assert len(restored) == len(ball_store) == len(balls)
+
+    def describe(ball):
+        return ball.on_strike_player.name, ball.ball_score.total_runs
+
+    assert [describe(ball) for ball in restored] == [describe(ball) for ball in balls]
+    assert describe(ball_store[0]) == describe(balls[0])
+    command_store = recovered.get_session(0).command_registrar._store
+    assert len(list(command_store)) == len(command_store)
+
+
+def test_checkpoint_appends_to_spill_files(registrar, tmp_path):
+    retention = RetentionPolicy(1, str(tmp_path))
+    engine = create_engine(registrar, tmp_path, CheckpointPolicy.EVERY_N, 1, retention)
+    checkpoint_dir = tmp_path / "checkpoints"
+    commands = load_match_commands()
+    apply_commands(engine, commands[:12])
+    spill_files = sorted(checkpoint_dir.glob("match-0-*.spill"))
+    sizes = [path.stat().st_size for path in spill_files]
+    assert spill_files
+
+    for command_id, command in enumerate(commands[12:], start=12):
+        command.update(command_id=command_id, match_id=0)
+        assert "reject_reason" not in engine.on_command(command)
+    # the spill files are kept from one checkpoint to the next and only appended to
+    assert sorted(checkpoint_dir.glob("match-0-*.spill")) == spill_files
+    assert all(
+        path.stat().st_size > size for path, size in zip(spill_files, sizes)
+    )
+    engine.remove_match(0)
+    assert list(checkpoint_dir.iterdir()) == []
+    engine.close()
+
+
+def test_continue_after_recovery(registrar, tmp_path):
+    commands = load_match_commands()
+    engine = create_engine(registrar, tmp_path)
+    apply_commands(engine, commands[:12])
+    engine.close()
+
+    recovered = create_engine(registrar, tmp_path)
+    recovered.recover()
+    for command_id, command in enumerate(commands[12:], start=12):
+        command.update(command_id=command_id, match_id=0)
+        assert "reject_reason" not in recovered.on_command(command)
+    reference = MatchEngine(registrar)
+    apply_commands(reference, load_match_commands())
+    assert without_times(recovered.current_match.snapshot()) == without_times(
+        reference.current_match.snapshot()
+    )
+
+
+def test_removed_match_not_recovered(registrar, tmp_path):
+    engine = create_engine(registrar, tmp_path)
+    apply_commands(engine, load_match_commands()[:3])
+    apply_commands(engine, load_match_commands()[:3])
+    engine.remove_match(0)
+    engine.close()
+
+    recovered = create_engine(registrar, tmp_path)
+    recovered.recover()
+    assert list(recovered.sessions) == [1]
+    assert recovered.next_match_id == 2
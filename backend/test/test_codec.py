@@ -0,0 +1,58 @@
+import pytest
+
+from scorpyo.codec import JSON, MSGPACK, pack, unpack
+from .common import apply_commands, load_match_commands
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ({"a": 1}, b"\x81\xa1a\x01"),
+        ([None, True, False], b"\x93\xc0\xc3\xc2"),
+        (-1, b"\xff"),
+        (200, b"\xcc\xc8"),
+        (-200, b"\xd1\xff\x38"),
+        (1.5, b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00"),
+    ],
+)
+def test_pack_known_encodings(value, expected):
+    assert pack(value) == expected
+    assert unpack(expected) == value
+
+
+def test_pack_round_trip():
+    message = {
+        "short": "x",
+        "long": "y" * 70000,
+        "ints": [0, 127, 128, 65536, 2**40, -33, -129, -(2**40)],
+        "list": list(range(20)),
+        "map": {str(i): i for i in range(20)},
+        "nested": [{"overs": [{"runs": 4}]}],
+        "bytes": b"\x00\x01",
+    }
+    assert unpack(pack(message)) == message
+
+
+class EncodedListener:
+    def __init__(self):
+        self.payloads = []
+
+    def on_encoded_message(self, message: dict, payload: bytes):
+        self.payloads.append(payload)
+
+
+def test_encode_once_per_codec(mock_engine, mocker):
+    json_listeners = [EncodedListener(), EncodedListener()]
+    msgpack_listener = EncodedListener()
+    for listener in json_listeners:
+        mock_engine.register_client(listener, "json")
+    mock_engine.register_client(msgpack_listener, "msgpack")
+    json_encode = mocker.spy(JSON, "encode")
+    msgpack_encode = mocker.spy(MSGPACK, "encode")
+    apply_commands(mock_engine, load_match_commands())
+    num_messages = len(msgpack_listener.payloads)
+    assert json_encode.call_count == msgpack_encode.call_count == num_messages
+    assert json_listeners[0].payloads == json_listeners[1].payloads
+    assert [JSON.decode(p) for p in json_listeners[0].payloads] == [
+        MSGPACK.decode(p) for p in msgpack_listener.payloads
+    ]
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from scorpyo.delivery import OverflowPolicy, QueuedListener
+from scorpyo.engine import MatchEngine
+from scorpyo.snapshot import SnapshotMode
+from .common import apply_commands, load_match_commands, rebuild_snapshot
+
+
+class SlowListener:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.messages = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def on_message(self, message: dict):
+        self.gate.wait()
+        time.sleep(self.delay)
+        self.messages.append(message)
+
+
+def test_slow_listener_does_not_block(mock_engine):
+    listener = SlowListener(delay=0.02)
+    mock_engine.register_client(listener, max_depth=100)
+    start = time.monotonic()
+    apply_commands(mock_engine, load_match_commands())
+    assert time.monotonic() - start < 0.02 * 21
+    queued = mock_engine._score_listeners[-1][0]
+    assert queued.join(5)
+    acks = [m for m in listener.messages if not m["is_snapshot"]]
+    assert [m["message_id"] for m in acks] == list(range(21))
+    mock_engine.close()
+
+
+def test_drop_oldest_snapshot():
+    listener = SlowListener()
+    listener.gate.clear()
+    queued = QueuedListener(listener, max_depth=4)
+    for message_id in range(12):
+        # one ack for every three snapshots, so there is always a snapshot to drop
+        is_snapshot = message_id % 4 != 0
+        queued.on_message({"message_id": message_id, "is_snapshot": is_snapshot})
+    assert queued.depth == 4
+    assert queued.dropped == 8
+    listener.gate.set()
+    assert queued.join(5)
+    queued.close()
+    delivered = [m["message_id"] for m in listener.messages]
+    assert [i for i in delivered if i % 4 == 0] == [0, 4, 8]
+    # the latest snapshot always survives
+    assert delivered[-1] == 11
+
+
+def test_block_until_listener_catches_up():
+    listener = SlowListener()
+    listener.gate.clear()
+    queued = QueuedListener(listener, max_depth=2, overflow=OverflowPolicy.BLOCK)
+    threading.Timer(0.1, listener.gate.set).start()
+    start = time.monotonic()
+    for message_id in range(5):
+        queued.on_message({"message_id": message_id, "is_snapshot": False})
+    assert time.monotonic() - start >= 0.1
+    queued.close()
+    assert [m["message_id"] for m in listener.messages] == list(range(5))
+
+
+def test_disconnect_slow_listener(mock_engine):
+    listener = SlowListener()
+    listener.gate.clear()
+    mock_engine.register_client(
+        listener, max_depth=4, overflow=OverflowPolicy.DISCONNECT
+    )
+    apply_commands(mock_engine, load_match_commands())
+    assert mock_engine.listener_stats() == []
+    listener.gate.set()
+
+
+def test_dropped_deltas_resynced(registrar):
+    engine = MatchEngine(registrar, SnapshotMode.DELTA)
+    listener = SlowListener()
+    listener.gate.clear()
+    engine.register_client(listener, max_depth=8)
+    # acks can't be dropped, so the engine waits on them once the queue is all acks
+    threading.Timer(0.2, listener.gate.set).start()
+    apply_commands(engine, load_match_commands())
+    queued = engine._score_listeners[-1][0]
+    assert queued.join(5)
+    assert queued.dropped > 0
+    assert rebuild_snapshot(listener.messages) == engine.current_match.snapshot()
+    engine.close()
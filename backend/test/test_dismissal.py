@@ -1,6 +1,7 @@
 import pytest
 
-from scorpyo.error import EngineError
+from scorpyo.dismissal import parse_dismissal
+from scorpyo.error import EngineError, RejectReason
 from scorpyo.innings import Innings, BatterInningsState
 from scorpyo.registrar import EntityRegistrar
 from .common import apply_ball_events
@@ -163,3 +164,28 @@ def test_new_batter_order_num(mock_innings: Innings):
     mock_innings.handle_batter_innings_started(bis_payload)
     assert mock_innings.on_strike_innings.order_num == 4
     assert mock_innings.off_strike_innings.order_num == 2
+
+
+def test_stumped_without_keeper(mock_innings: Innings):
+    payloads = [{"score_text": "W", "dismissal": {"type": "st"}}]
+    apply_ball_events(payloads, mock_innings)
+    dismissed = mock_innings.on_strike_innings
+    assert dismissed.batting_state == BatterInningsState.DISMISSED
+    assert dismissed.dismissal_description().startswith("St b ")
+
+
+@pytest.mark.parametrize("dismissal_type", ["b", "ro"])
+def test_parse_dismissal_of_wrong_batter(mock_innings: Innings, dismissal_type):
+    # bowled can only be of the striker, a run out of either batter at the crease
+    batter = {"b": mock_innings.non_striker, "ro": mock_innings.yet_to_bat[0]}
+    payload = {"type": dismissal_type, "batter": batter[dismissal_type].name}
+    with pytest.raises(EngineError) as exc:
+        parse_dismissal(
+            payload,
+            mock_innings,
+            mock_innings.striker,
+            mock_innings.non_striker,
+            mock_innings.current_bowler,
+            mock_innings.entity_registrar,
+        )
+    assert exc.value.reason == RejectReason.BAD_COMMAND
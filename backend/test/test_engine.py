@@ -1,7 +1,11 @@
+import pytest
+
+from scorpyo.engine import MatchEngine
 from scorpyo.error import RejectReason
 from scorpyo.event import EventType
 from scorpyo.match import MatchState
 from test.resources import HOME_TEAM, AWAY_TEAM
+from .common import apply_commands, load_match_commands, without_times
 
 
 def test_match_started(mock_engine):
@@ -36,3 +40,218 @@ def test_reject_no_command(mock_engine):
     mock_engine.on_command(command)
     message = mock_engine._messages[-1]
     assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+
+
+def test_concurrent_matches(mock_engine):
+    first_commands = load_match_commands()
+    second_commands = load_match_commands()
+    match_ids = [None, None]
+    for command_id, commands in enumerate(zip(first_commands, second_commands)):
+        for idx, command in enumerate(commands):
+            command["command_id"] = command_id
+            if match_ids[idx] is not None:
+                command["match_id"] = match_ids[idx]
+            message = mock_engine.on_command(command)
+            assert "reject_reason" not in message
+            assert message["message_id"] == command_id
+            match_ids[idx] = message["match_id"]
+    assert match_ids == [0, 1]
+    assert len(mock_engine.live_matches) == 2
+    for match_id in match_ids:
+        session = mock_engine.get_session(match_id)
+        assert len(session.messages) == len(first_commands)
+        assert session.match.current_innings.total_runs > 0
+        stats = mock_engine.match_stats(match_id)
+        assert stats["commands"] == len(first_commands)
+        assert stats["rejects"] == 0
+        assert stats["memory_bytes"] > 0
+
+
+def test_complete_routed_match(mock_engine):
+    apply_commands(mock_engine, load_match_commands()[:1])
+    apply_commands(mock_engine, load_match_commands()[:1])
+    command = {"event": "mc", "command_id": 1, "match_id": 0, "body": {}}
+    assert "reject_reason" not in mock_engine.on_command(command)
+    assert [match.match_id for match in mock_engine.live_matches] == [1]
+
+
+def test_match_started_not_routed_by_match_id(mock_engine):
+    apply_commands(mock_engine, load_match_commands()[:1])
+    command = dict(load_match_commands()[0], command_id=0, match_id=0)
+    message = mock_engine.on_command(command)
+    assert "reject_reason" not in message
+    assert message["match_id"] == 1
+    assert message["message_id"] == 0
+    assert mock_engine.get_session(0).message_id == 1
+    assert mock_engine.get_session(1).message_id == 1
+
+
+def test_reject_unknown_match(mock_engine):
+    apply_commands(mock_engine, load_match_commands()[:1])
+    command = {"event": "bc", "command_id": 1, "match_id": 99, "body": {}}
+    message = mock_engine.on_command(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.get_session(0).message_id == 1
+
+
+def test_batch_commands(mock_engine, engine_listener):
+    engine_listener.messages = []
+    commands = load_match_commands()
+    for command_id, command in enumerate(commands):
+        command["command_id"] = command_id
+    envelope = mock_engine.on_commands(commands)
+    messages = envelope["batch"]
+    assert [m["message_id"] for m in messages] == list(range(len(commands)))
+    assert all("reject_reason" not in m for m in messages)
+    # one envelope and a single snapshot for the whole batch
+    assert len(engine_listener.messages) == 2
+    assert engine_listener.messages[-1]["is_snapshot"]
+
+
+@pytest.mark.parametrize("stop_on_reject, num_messages", [(True, 2), (False, 4)])
+def test_batch_reject(mock_engine, stop_on_reject, num_messages):
+    commands = load_match_commands()[:4]
+    for command_id, command in enumerate(commands):
+        command["command_id"] = command_id
+    commands[1]["command_id"] = 5
+    envelope = mock_engine.on_commands(commands, stop_on_reject)
+    assert len(envelope["batch"]) == num_messages
+    assert envelope["batch"][1]["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert envelope["num_commands"] == 4
+
+
+@pytest.mark.parametrize("request_", [[1, 2], "bc", {"batch": 5}, {"batch": {}}])
+def test_malformed_request_rejected(mock_engine, request_):
+    message = mock_engine.on_request(request_)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.message_id == 1
+
+
+@pytest.mark.parametrize("match_id", [[1], "0", 0.0, True, {}])
+def test_bad_match_id_rejected(mock_engine, match_id):
+    apply_commands(mock_engine, load_match_commands()[:1])
+    command = {"event": "bc", "command_id": 1, "match_id": match_id, "body": {}}
+    message = mock_engine.on_request(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.get_session(0).message_id == 1
+
+
+def test_malformed_batch_item_rejected(mock_engine):
+    command = dict(load_match_commands()[0], command_id=0)
+    request = {"batch": [command, [1]], "stop_on_reject": False}
+    envelope = mock_engine.on_request(request)
+    first, second = envelope["batch"]
+    assert "reject_reason" not in first
+    assert second["reject_reason"] == RejectReason.BAD_COMMAND.value
+
+
+@pytest.mark.parametrize("count", [1, 2, 6, 12, 17])
+def test_undo(mock_engine, registrar, engine_listener, count):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands)
+    engine_listener.messages = []
+    undo = {"event": "ud", "command_id": len(commands), "body": {"count": count}}
+    message = mock_engine.on_command(undo)
+    assert "reject_reason" not in message
+    assert engine_listener.messages[-1]["is_snapshot"]
+    reference = MatchEngine(registrar)
+    apply_commands(reference, load_match_commands()[: len(commands) - count])
+    assert without_times(mock_engine.current_match.snapshot()) == without_times(
+        reference.current_match.snapshot()
+    )
+    # the corrected commands can then be entered again
+    for command_id, command in enumerate(commands[-count:], start=len(commands) + 1):
+        command.update(command_id=command_id)
+        assert "reject_reason" not in mock_engine.on_command(command)
+
+
+def test_undo_past_innings_start(mock_engine):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands)
+    undo = {"event": "ud", "command_id": len(commands), "body": {"count": 18}}
+    message = mock_engine.on_command(undo)
+    assert message["reject_reason"] == RejectReason.ILLEGAL_OPERATION.value
+
+
+def _render_afresh(match) -> dict:
+    """the snapshot of a match with every cached overview rendered again"""
+    innings = match.current_innings or match.match_inningses[-1]
+    contexts = [match, innings, *innings.overs]
+    contexts += innings.batter_inningses + innings.current_bowler_inningses
+    for context in contexts:
+        context._overview_version = -1
+    return match.snapshot()
+
+
+def test_overview_cached(mock_engine):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:-1])
+    match = mock_engine.current_match
+    innings = match.current_innings
+    first_over, second_over = innings.overs
+    before = innings.overview()
+    assert innings.overview() is before
+    # the last command starts another batter innings, which leaves the bowlers and
+    # overs alone
+    command = dict(commands[-1], command_id=len(commands) - 1, match_id=0)
+    assert "reject_reason" not in mock_engine.on_command(command)
+    after = innings.overview()
+    assert after is not before
+    assert after["overs"][0] is before["overs"][0]
+    assert after["bowlers"] == before["bowlers"]
+    assert after["bowlers"][0] is before["bowlers"][0]
+    assert match.snapshot() == _render_afresh(match)
+
+
+def test_overview_cache_follows_undo(mock_engine):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands)
+    match = mock_engine.current_match
+    for count, command_id in ((1, 21), (5, 22), (3, 23)):
+        undo = {"event": "ud", "command_id": command_id, "body": {"count": count}}
+        assert "reject_reason" not in mock_engine.on_command(undo)
+        assert match.snapshot() == _render_afresh(match)
+
+
+def test_dispatch_stats(mock_engine):
+    apply_commands(mock_engine, load_match_commands())
+    stats = mock_engine.dispatch_stats()
+    assert stats["bc"] == 8
+    assert stats["ms"] == 1
+    assert sum(stats.values()) == 21
+
+
+def test_routes_follow_innings(mock_engine):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:3])
+    session = mock_engine.sessions[0]
+    assert EventType.BALL_COMPLETED not in session.match.routing_table()
+    # a ball before the innings has started has nothing to handle it
+    ball = dict(commands[7], command_id=3, match_id=0)
+    assert mock_engine.on_command(ball)["reject_reason"] == (
+        RejectReason.ILLEGAL_OPERATION.value
+    )
+    for command_id, command in enumerate(commands[3:8], start=4):
+        mock_engine.on_command(dict(command, command_id=command_id, match_id=0))
+    context, _ = session.routes[EventType.BALL_COMPLETED]
+    assert context is session.match.current_innings
+
+
+
+def test_undone_batter_replaced_in_overview(mock_engine):
+    commands = load_match_commands()[:11]
+    apply_commands(mock_engine, commands)
+    innings = mock_engine.current_match.current_innings
+    innings.overview()
+    batch = [
+        {"event": "ud", "body": {"count": 1}},
+        {"event": "bis", "body": {"batter": "Bobby Gamble"}},
+    ]
+    for command_id, command in enumerate(batch, len(commands)):
+        command.update(command_id=command_id, match_id=0)
+    envelope = mock_engine.on_commands(batch)
+    assert all("reject_reason" not in m for m in envelope["batch"])
+    names = [batter["name"] for batter in innings.overview()["batters"]]
+    assert names.count("Bobby Gamble") == 1
+    assert "Harry Tector" in names
+    assert len(names) == len(innings.batting_lineup)
@@ -0,0 +1,39 @@
+import pytest
+
+from scorpyo.definitions.innings import InningsState
+from scorpyo.generator import generate_corpus, generate_match
+from .common import apply_commands
+
+
+@pytest.mark.parametrize("match_type", ["T20", "OD", "FC"])
+def test_generated_match_replays(mock_engine, registrar, match_type):
+    commands = generate_match(registrar, 1, match_type)
+    responses = apply_commands(mock_engine, commands)
+    assert not [r for r in responses if "reject_reason" in r]
+    session = mock_engine.get_session(responses[0]["match_id"])
+    assert not session.is_live
+    assert session.match.match_type.shortcode == match_type
+
+
+def test_generation_is_seeded(registrar):
+    first = generate_match(registrar, "a", "T20")
+    assert generate_match(registrar, "a", "T20") == first
+    assert generate_match(registrar, "b", "T20") != first
+
+
+def test_corpus_covers_innings_endings(registrar):
+    corpus = generate_corpus(registrar, 0, 6)
+    assert [commands[0]["body"]["match_type"] for commands in corpus[:3]] == [
+        "FC",
+        "OD",
+        "T20",
+    ]
+    endings = {
+        command["body"]["reason"]
+        for commands in corpus
+        for command in commands
+        if command["event"] == "ic"
+    }
+    assert endings == {
+        state.value for state in InningsState if state != InningsState.IN_PROGRESS
+    }
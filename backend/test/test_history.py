@@ -0,0 +1,112 @@
+import pickle
+
+import pytest
+
+from scorpyo.engine import MatchEngine
+from scorpyo.history import History, RetentionPolicy
+from .common import apply_commands, load_match_commands, without_times
+
+
+@pytest.fixture()
+def small_retention(tmp_path):
+    return RetentionPolicy(4, str(tmp_path))
+
+
+def test_history_spills_oldest(tmp_path):
+    items = History(capacity=3, directory=str(tmp_path))
+    for i in range(10):
+        items.append({"command_id": i})
+    assert len(items) == 10
+    assert items.num_spilled == 7
+    assert items[0] == {"command_id": 0}
+    assert items[-1] == {"command_id": 9}
+    assert items.range(5, 9) == [{"command_id": i} for i in range(5, 9)]
+    assert items[2:4] == [{"command_id": 2}, {"command_id": 3}]
+    assert [item["command_id"] for item in items] == list(range(10))
+    assert items.pop() == {"command_id": 9}
+    assert items.pop() == {"command_id": 8}
+    assert items.pop() == {"command_id": 7}
+    with pytest.raises(IndexError):
+        items.pop()
+    items.close()
+
+
+def test_history_pickle_keeps_spilled(tmp_path):
+    items = History(capacity=2, directory=str(tmp_path))
+    for i in range(5):
+        items.append(i)
+    with pytest.raises(pickle.PicklingError):
+        pickle.dumps(items)
+    items.persist_spilled(str(tmp_path / "items-"))
+    restored = pickle.loads(pickle.dumps(items))
+    assert len(restored) == 5
+    assert list(restored) == [0, 1, 2, 3, 4]
+    assert restored[0] == 0
+    restored.append(5)
+    restored.append(6)
+    assert restored.range(2, 7) == [2, 3, 4, 5, 6]
+    assert len(restored) == len(list(restored))
+    # the restored history has a segment of its own
+    items.close()
+    assert restored[:3] == [0, 1, 2]
+    restored.close()
+
+
+def test_history_persists_only_new_spilled(tmp_path):
+    items = History(capacity=1, directory=str(tmp_path))
+    items.append("a" * 1000)
+    items.append("b" * 1000)
+    items.persist_spilled(str(tmp_path / "items-"))
+    pickled = pickle.dumps(items)
+    (spill_file,) = tmp_path.glob("items-*.spill")
+    spilled_size = spill_file.stat().st_size
+
+    items.append("c" * 1000)
+    items.persist_spilled(str(tmp_path / "items-"))
+    assert list(tmp_path.glob("items-*.spill")) == [spill_file]
+    assert spill_file.stat().st_size > spilled_size
+    # the pickle refers to the spill file so does not grow with it
+    assert len(pickle.dumps(items)) == len(pickled)
+    # a pickle from before the later spill only sees what was persisted for it
+    assert list(pickle.loads(pickled)) == ["a" * 1000, "b" * 1000]
+    assert list(pickle.loads(pickle.dumps(items))) == [
+        "a" * 1000,
+        "b" * 1000,
+        "c" * 1000,
+    ]
+    items.close()
+
+
+def test_engine_with_bounded_history(registrar, small_retention):
+    engine = MatchEngine(registrar, retention=small_retention)
+    apply_commands(engine, load_match_commands())
+    session = engine.get_session(0)
+    assert len(session.messages) == 21
+    assert len(session.messages._recent) == 4
+    innings = session.match.current_innings
+    assert innings.ball_store.num_spilled > 0
+    reference = MatchEngine(registrar)
+    apply_commands(reference, load_match_commands())
+    assert without_times(engine.current_match.snapshot()) == without_times(
+        reference.current_match.snapshot()
+    )
+
+
+def test_undo_limited_to_retained(registrar, small_retention):
+    engine = MatchEngine(registrar, retention=small_retention)
+    commands = load_match_commands()
+    apply_commands(engine, commands)
+    undo = {"event": "ud", "command_id": len(commands), "body": {"count": 5}}
+    assert "reject_reason" in engine.on_command(undo)
+    undo.update(command_id=len(commands) + 1, body={"count": 4})
+    assert "reject_reason" not in engine.on_command(undo)
+
+
+def test_retention_is_per_engine(registrar, small_retention):
+    bounded = MatchEngine(registrar, retention=small_retention)
+    unbounded = MatchEngine(registrar)
+    for engine in (bounded, unbounded):
+        apply_commands(engine, load_match_commands())
+    assert bounded.get_session(0).messages.num_spilled > 0
+    assert unbounded.get_session(0).messages.num_spilled == 0
+    assert unbounded.current_match.ball_store.num_spilled == 0
@@ -96,8 +96,12 @@ def test_innings_completed_overs_complete(mock_match: MockMatch, mock_innings: I
         mock_match.handle_innings_completed(payload)
     assert exc.match("the allotted number of overs has not been bowled")
     mock_match.apply_over(next_bowler)
+    bowler_innings = mock_innings.current_bowler_innings
+    overs_completed = bowler_innings.overs_completed
     mock_match.handle_innings_completed(payload)
     assert mock_innings.state == InningsState.OVERS_COMPLETE
+    # the last over was already complete, so is not completed again
+    assert bowler_innings.overs_completed == overs_completed
 
 
 def test_innings_completed_not_in_progress(
@@ -118,7 +122,7 @@ def test_innings_completed_target_reached(mock_match: MockMatch, mock_innings: I
     with pytest.raises(EngineError) as exc:
         mock_match.handle_innings_completed(innings_complete_payload)
     assert exc.match("target has not been reached.*target=100 current_score=0")
-    mock_innings._score.runs_off_bat = 101
+    apply_ball_events([{"score_text": "101"}], mock_innings)
     mock_match.handle_innings_completed(innings_complete_payload)
     assert mock_innings.state == InningsState.TARGET_REACHED
 
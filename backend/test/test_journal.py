@@ -0,0 +1,39 @@
+import pytest
+
+from scorpyo.engine import MatchEngine
+from scorpyo.journal import CommandJournal, Durability, read_journal
+from .common import apply_commands, load_match_commands
+
+
+@pytest.mark.parametrize("durability", list(Durability))
+def test_journal_accepted_commands(registrar, tmp_path, durability):
+    path = str(tmp_path / "engine.journal")
+    journal = CommandJournal(path, durability, group_commit_ms=1)
+    engine = MatchEngine(registrar, journal=journal)
+    commands = load_match_commands()
+    apply_commands(engine, commands[:5])
+    rejected = dict(commands[5], command_id=99, match_id=0)
+    assert "reject_reason" in engine.on_command(rejected)
+    apply_commands(engine, commands[:1])
+    engine.close()
+    records = [record for _, record in read_journal(path)]
+    assert [r["match_id"] for r in records] == [0] * 5 + [1]
+    assert [r["command"] for r in records] == commands[:5] + commands[:1]
+
+
+def test_journal_batch_and_torn_write(registrar, tmp_path):
+    path = str(tmp_path / "engine.journal")
+    engine = MatchEngine(registrar, journal=CommandJournal(path))
+    commands = load_match_commands()[:10]
+    for command_id, command in enumerate(commands):
+        command["command_id"] = command_id
+    engine.on_commands(commands)
+    offset = engine.journal.offset
+    engine.close()
+    with open(path, "ab") as fh:
+        fh.write(b'{"match_id":0,"comm')
+    assert len(list(read_journal(path))) == len(commands)
+    assert list(read_journal(path, offset)) == []
+    CommandJournal(path).close()
+    with open(path, "rb") as fh:
+        assert fh.read().endswith(b"}\n")
@@ -0,0 +1,105 @@
+import pytest
+
+from scorpyo.generator import generate_match
+from scorpyo.ledger import SUMMED_COLUMNS
+from scorpyo.score import Score
+from .common import apply_commands, load_match_commands
+
+
+@pytest.fixture()
+def od_match(mock_engine, registrar):
+    apply_commands(mock_engine, generate_match(registrar, 3, "OD"))
+    return mock_engine.current_match
+
+
+def test_ledger_totals(od_match):
+    for innings in od_match.match_inningses:
+        ledger = innings.ledger
+        assert len(ledger) == len(innings._ball_ids)
+        assert ledger.num_overs == len(innings.overs)
+        for name in SUMMED_COLUMNS:
+            assert ledger.total(name) == getattr(innings._score, name)
+        assert ledger.total("total_runs") == innings.total_runs
+        assert ledger.total("extra_runs") == innings._score.extra_runs
+        assert ledger.per_over("total_runs") == [o.total_runs for o in innings.overs]
+
+
+def assert_summed_from_store(level):
+    expected = Score(0, 0, 0, 0, 0, 0, 0)
+    for ball_id in level._ball_ids:
+        expected.add(level.ball_store[ball_id].ball_score)
+    for name in SUMMED_COLUMNS:
+        assert getattr(level._score, name) == getattr(expected, name)
+
+
+def test_player_totals_agree_with_store(od_match):
+    for innings in od_match.match_inningses:
+        for level in innings.batter_inningses + innings.current_bowler_inningses:
+            assert_summed_from_store(level)
+    assert od_match.total_runs == sum(i.total_runs for i in od_match.match_inningses)
+    assert od_match.previous_ball is od_match.ball_store[-1]
+
+
+def test_over_ranges(od_match):
+    innings = od_match.match_inningses[0]
+    ledger = innings.ledger
+    # overs 7 to 15, as people count them
+    overs = innings.overs[6:15]
+    assert ledger.over_total("total_runs", 6, 14) == sum(o.total_runs for o in overs)
+    last_three = innings.overs[-3:]
+    assert ledger.last_overs_total("boundaries", 3) == sum(
+        o._score.fours + o._score.sixes for o in last_three
+    )
+    start, end = ledger.over_balls(6, 14)
+    striker = innings.batter_inningses[0].player.unique_id
+    strikers = list(ledger.column("striker"))
+    assert len(strikers) == len(ledger)
+    runs = list(ledger.column("runs_off_bat"))
+    assert sum(runs[start:end]) == sum(o.runs_scored for o in overs)
+    assert sum(r for r, s in zip(runs, strikers) if s == striker) == (
+        innings.batter_inningses[0].runs_scored
+    )
+    with pytest.raises(ValueError):
+        ledger.over_total("total_runs", 0, ledger.num_overs)
+    with pytest.raises(ValueError):
+        ledger.total("maidens")
+
+
+def test_ledger_follows_undo(mock_engine):
+    commands = load_match_commands()
+    # up to the wicket in the first over
+    apply_commands(mock_engine, commands[:9])
+    innings = mock_engine.current_match.current_innings
+    balls = len(innings.ledger)
+    runs = innings.ledger.total("total_runs")
+    undo = {"event": "ud", "command_id": 9, "match_id": 0, "body": {"count": 1}}
+    assert "reject_reason" not in mock_engine.on_command(undo)
+    assert len(innings.ledger) == balls - 1
+    assert innings.ledger.total("total_runs") == innings.total_runs <= runs
+    assert innings.ledger.num_overs == 1
+    for level in innings.batter_inningses + innings.current_bowler_inningses:
+        assert_summed_from_store(level)
+    # and a ball bowled in place of the undone one is added as any other
+    redo = dict(commands[8], command_id=10, match_id=0)
+    assert "reject_reason" not in mock_engine.on_command(redo)
+    for level in innings.batter_inningses + innings.current_bowler_inningses:
+        assert_summed_from_store(level)
+
+
+def test_levels_share_ball_store(od_match):
+    store = od_match.ball_store
+    balls = 0
+    for innings in od_match.match_inningses:
+        assert innings.ball_store is store
+        ids = list(innings._ball_ids)
+        assert ids == list(range(balls, balls + len(ids)))
+        balls += len(ids)
+        assert sum((list(o._ball_ids) for o in innings.overs), []) == ids
+        bowlers = innings.current_bowler_inningses
+        batters = innings.batter_inningses
+        assert sorted(sum((list(b._ball_ids) for b in bowlers), [])) == ids
+        assert sum(b._score.dots for b in bowlers) == innings._score.dots
+        assert sum(b.balls_faced for b in batters) == innings.balls_bowled
+        assert sum(o._score.dots for o in innings.overs) == innings._score.dots
+        assert innings.previous_ball is store[ids[-1]]
+    assert len(store) == balls
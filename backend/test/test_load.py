@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+from scorpyo.client.load import Scorer, load_report, run_load, tcp_connector
+from scorpyo.engine import MatchEngine
+from scorpyo.generator import generate_match
+from scorpyo.server import EngineServer
+from .common import load_match_commands
+
+
+def test_tcp_load(registrar):
+    engine = MatchEngine(registrar)
+    server = EngineServer(engine, "127.0.0.1", 0)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    port = server.sockets[0].getsockname()[1]
+    matches = [generate_match(registrar, n, "T20") for n in range(2)]
+    # an extra ball after the match has completed is rejected
+    matches[1] = matches[1] + [{"event": "bc", "body": {"score_text": "1"}}]
+    try:
+        report = run_load(tcp_connector("127.0.0.1", port), matches, 3)
+    finally:
+        asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    # the third scorer replays the first match again as a new one
+    commands = 2 * len(matches[0]) + len(matches[1])
+    assert report["scorers"] == 3
+    assert report["commands"] == commands
+    assert report["errors"] == 0
+    assert report["reject_rate"] == 1 / commands
+    assert report["ack_latency"]["p50"] <= report["ack_latency"]["p99"]
+    assert report["snapshot_latency"] is None
+    assert len(engine.sessions) == 3
+
+
+class BroadcastConnection:
+    """a client WebSocket, broadcasting the messages of another match as well"""
+
+    expects_snapshots = True
+
+    def __init__(self):
+        self.received = []
+
+    def send(self, command: dict):
+        reply = {"message_id": 0, "event": command["event"], "match_id": 1}
+        self.received = [
+            {"message_id": 5, "event": "bc", "match_id": 0},
+            {"is_snapshot": True, "match_id": 0},
+            reply,
+            {"is_snapshot": True, "match_id": 0},
+            {"is_snapshot": True, "match_id": 1},
+        ]
+
+    def receive(self) -> dict:
+        return self.received.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_scorer_skips_other_matches():
+    commands = load_match_commands()[:3]
+    scorer = Scorer("scorer", BroadcastConnection, [commands])
+    scorer.match_id = 1
+    commands[0]["event"] = "rlu"
+    scorer.run()
+    stats = scorer.stats
+    assert stats.commands == 3
+    assert len(stats.ack_latencies) == len(stats.snapshot_latencies) == 3
+    report = load_report([stats], 1.0)
+    assert report["reject_rate"] == 0
+    assert report["throughput"] == 3
@@ -0,0 +1,60 @@
+import json
+
+from scorpyo.codec import JSON
+from scorpyo.error import RejectReason
+from scorpyo.metrics import Histogram, Phase
+from .common import apply_commands, load_match_commands
+
+
+class EncodedListener:
+    def on_encoded_message(self, message: dict, payload: bytes):
+        pass
+
+
+def test_histogram():
+    histogram = Histogram([0.001, 0.01, 0.1])
+    for value in [0.0005] * 90 + [0.05] * 9 + [2.0]:
+        histogram.observe(value)
+    assert histogram.counts == [90, 0, 9, 1]
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.99) == 0.1
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+
+def test_engine_metrics(mock_engine):
+    mock_engine.register_client(EncodedListener(), codec=JSON.name)
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands)
+    bad = dict(commands[-1], command_id=99, match_id=0)
+    mock_engine.on_command(bad)
+    metrics = mock_engine.metrics
+    assert metrics.histogram(Phase.PROCESS, "bc").count == 8
+    assert metrics.histogram(Phase.PROCESS, "bis").count == 5
+    assert metrics.histogram(Phase.SNAPSHOT, "bc").count == 8
+    assert metrics.histogram(Phase.ENCODE, "bc").count == 16
+    # the reject and the snapshot after it
+    assert metrics.histogram(Phase.FANOUT, "rj").count == 2
+    assert metrics.rejects == {RejectReason.BAD_COMMAND: 1}
+    dump = json.loads(json.dumps(metrics.to_dict()))
+    assert dump["phases"]["process"]["bc"]["count"] == 8
+    assert dump["rejects"] == {"bad_command": 1}
+
+
+def test_prometheus_export(mock_engine):
+    apply_commands(mock_engine, load_match_commands())
+    text = mock_engine.metrics.to_prometheus()
+    lines = text.splitlines()
+    assert "# TYPE scorpyo_phase_seconds histogram" in lines
+    assert 'scorpyo_phase_seconds_count{phase="process",event="bc"} 8' in lines
+    assert 'scorpyo_phase_seconds_bucket{phase="process",event="bc",le="+Inf"} 8' in lines
+    assert 'scorpyo_rejects_total{reason="bad_command"} 0' in lines
+
+
+def test_unhashable_event_counted_invalid(mock_engine):
+    apply_commands(mock_engine, load_match_commands()[:1])
+    command = {"event": ["bc"], "command_id": 1, "match_id": 0, "body": {}}
+    message = mock_engine.on_request(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.metrics.histogram(Phase.PROCESS, "invalid").count == 1
@@ -0,0 +1,130 @@
+import pstats
+import time
+
+import pytest
+
+from scorpyo.engine import MatchEngine
+from scorpyo.error import RejectReason
+from scorpyo.profiling import ProfileMode
+from .common import apply_commands, load_match_commands
+
+
+def test_profile_next_commands(mock_engine, tmp_path):
+    mock_engine.profile_dir = str(tmp_path)
+    path = str(tmp_path / "engine.prof")
+    request = {"admin": "profile", "commands": 5, "name": "engine.prof"}
+    reply = mock_engine.on_request(request)
+    assert reply == {"admin": "profile", "path": path}
+    assert "process_command" in vars(mock_engine)
+    apply_commands(mock_engine, load_match_commands())
+    # the profile ended after the fifth command, and left the class methods be
+    assert mock_engine.profiler is None
+    assert "process_command" not in vars(mock_engine)
+    assert "on_command" not in vars(mock_engine)
+    stats = pstats.Stats(path)
+    profiled = {name for _, _, name in stats.stats}
+    assert MatchEngine.process_command.__name__ in profiled
+    assert MatchEngine.send_message.__name__ in profiled
+    calls = [
+        stat[0]
+        for (_, _, name), stat in stats.stats.items()
+        if name == "process_command"
+    ]
+    assert calls == [5]
+
+
+def test_sampled_profile(mock_engine, tmp_path):
+    path = str(tmp_path / "engine.folded")
+    mock_engine.start_profiling(ProfileMode.SAMPLING, path, seconds=60)
+    mock_engine.profiler.sample_interval = 0.0001
+    apply_commands(mock_engine, load_match_commands())
+    assert mock_engine.on_request({"admin": "profile_stop"})["path"] == path
+    with open(path) as fh:
+        for line in fh:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+            # only the engine thread is sampled, and only on the command path
+            assert "process_command" in stack or "send_message" in stack
+
+
+def test_profile_admin_rejects(mock_engine, tmp_path):
+    assert (
+        mock_engine.on_request({"admin": "profile_stop"})["reject_reason"]
+        == RejectReason.ILLEGAL_OPERATION.value
+    )
+    reply = mock_engine.on_request({"admin": "profile"})
+    assert reply["reject_reason"] == RejectReason.BAD_COMMAND.value
+    path = str(tmp_path / "engine.prof")
+    mock_engine.start_profiling(path=path, commands=1)
+    reply = mock_engine.on_request({"admin": "profile", "commands": 1})
+    assert reply["reject_reason"] == RejectReason.ILLEGAL_OPERATION.value
+    assert mock_engine.stop_profiling() == path
+    # admin requests take no message_id
+    assert mock_engine.message_id == 0
+
+
+@pytest.mark.parametrize(
+    "limits", [{"commands": "5"}, {"commands": 0}, {"seconds": -1}, {"commands": True}]
+)
+def test_profile_limits_validated(mock_engine, limits):
+    reply = mock_engine.on_request(dict(limits, admin="profile"))
+    assert reply["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.profiler is None
+    assert "process_command" not in vars(mock_engine)
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        {"path": "/tmp/engine.prof"},
+        {"name": "../engine.prof"},
+        {"name": "sub/engine.prof"},
+        {"name": ".."},
+        {"name": ""},
+        {"name": 5},
+    ],
+)
+def test_profile_path_not_up_to_client(mock_engine, tmp_path, request_):
+    mock_engine.profile_dir = str(tmp_path / "profiles")
+    reply = mock_engine.on_request(dict(request_, admin="profile", commands=1))
+    assert reply["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.profiler is None
+
+
+def test_named_profile_needs_profile_dir(mock_engine):
+    request = {"admin": "profile", "commands": 1, "name": "engine.prof"}
+    reply = mock_engine.on_request(request)
+    assert reply["reject_reason"] == RejectReason.BAD_COMMAND.value
+
+
+def test_timed_profile_ended_by_poll(mock_engine, tmp_path):
+    path = str(tmp_path / "engine.prof")
+    mock_engine.start_profiling(path=path, seconds=0.01)
+    apply_commands(mock_engine, load_match_commands()[:1])
+    time.sleep(0.02)
+    mock_engine.poll_profile()
+    assert mock_engine.profiler is None
+    assert pstats.Stats(path).stats
+
+
+def test_close_writes_profile(mock_engine, tmp_path):
+    path = str(tmp_path / "engine.prof")
+    mock_engine.start_profiling(path=path, seconds=60)
+    apply_commands(mock_engine, load_match_commands()[:1])
+    mock_engine.close()
+    assert mock_engine.profiler is None
+    assert pstats.Stats(path).stats
+
+
+def test_profile_failure_keeps_ack(mock_engine, tmp_path, monkeypatch):
+    path = str(tmp_path / "engine.prof")
+    mock_engine.start_profiling(path=path, commands=1)
+    monkeypatch.setattr(
+        type(mock_engine.profiler), "finish", lambda self: 1 / 0, raising=True
+    )
+    command = dict(load_match_commands()[0], command_id=0)
+    message = mock_engine.on_request(command)
+    assert "reject_reason" not in message
+    assert message["message_id"] == 0
+    assert mock_engine.profiler is None
+    assert "on_command" not in vars(mock_engine)
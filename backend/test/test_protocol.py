@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import threading
+from configparser import ConfigParser
+
+import pytest
+
+from scorpyo.client.client import EngineClient
+from scorpyo.engine import MatchEngine
+from scorpyo.error import RejectReason
+from scorpyo.protocol import FrameDecoder, FramedSocket, encode_frame
+from scorpyo.server import EngineServer
+from .common import load_match_commands
+
+
+def test_decoder_split_frames():
+    messages = [{"event": "bc", "body": {"score_text": "4"}}, {"a": "x" * 5000}]
+    stream = b"".join(encode_frame(m) for m in messages)
+    decoder = FrameDecoder()
+    decoded = []
+    for i in range(0, len(stream), 7):
+        decoded.extend(decoder.feed(stream[i : i + 7]))
+    assert decoded == messages
+    assert decoder.buffered == 0
+
+
+def test_decoder_many_frames_in_one_read():
+    messages = [{"command_id": i} for i in range(10)]
+    decoder = FrameDecoder()
+    assert decoder.feed(b"".join(encode_frame(m) for m in messages)) == messages
+
+
+def test_decoder_rejects_oversized_frame():
+    decoder = FrameDecoder(max_frame_size=10)
+    with pytest.raises(ValueError):
+        decoder.feed(encode_frame({"too": "big for the limit"}))
+
+
+def test_framed_socket_large_message():
+    left, right = socket.socketpair()
+    sender, receiver = FramedSocket(left), FramedSocket(right)
+    message = {"inningses": [{"name": "x" * 100} for _ in range(2000)]}
+    thread = threading.Thread(target=sender.send, args=(message,))
+    thread.start()
+    assert receiver.receive() == message
+    thread.join()
+    sender.close()
+    assert receiver.receive() is None
+    receiver.close()
+
+
+@pytest.fixture()
+def engine_server(registrar):
+    engine = MatchEngine(registrar)
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+    server = EngineServer(engine, "127.0.0.1", 0)
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_until_complete(server.serve_forever())
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    ready.wait(5)
+    yield server
+    asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result(5)
+    thread.join(5)
+    loop.close()
+
+
+def engine_config(server: EngineServer, codec: str = "json") -> ConfigParser:
+    config = ConfigParser()
+    config.read_dict(
+        {
+            "ENGINE": {"host": "127.0.0.1", "port": server.sockets[0].getsockname()[1]},
+            "CLIENT": {"engine_codec": codec},
+        }
+    )
+    return config
+
+
+@pytest.mark.parametrize("codec", ["json", "msgpack"])
+def test_client_many_commands_one_connection(registrar, engine_server, mocker, codec):
+    client = EngineClient(registrar, engine_config(engine_server, codec))
+    connect = mocker.spy(socket, "create_connection")
+    responses = [client.on_event_command(c) for c in load_match_commands()]
+    client.disconnect_engine()
+    assert connect.call_count == 1
+    assert [r["message_id"] for r in responses] == list(range(len(responses)))
+    assert all("reject_reason" not in r for r in responses)
+
+
+def test_client_batch_round_trip(registrar, engine_server):
+    client = EngineClient(registrar, engine_config(engine_server))
+    commands = load_match_commands()
+    resp = client.on_event_commands(commands[:10])
+    assert [m["message_id"] for m in resp["batch"]] == list(range(10))
+    assert client.match_id == resp["batch"][0]["match_id"]
+    assert client.engine_sequence == 10
+    resp = client.on_event_commands(commands[10:])
+    client.disconnect_engine()
+    assert all("reject_reason" not in m for m in resp["batch"])
+    assert resp["batch"][-1]["message_id"] == len(commands) - 1
+
+
+def test_negotiate_unknown_codec(engine_server):
+    sock = socket.create_connection(engine_server.sockets[0].getsockname())
+    framed = FramedSocket(sock)
+    framed.send({"codec": "xml"})
+    assert framed.receive()["reject_reason"] == RejectReason.BAD_COMMAND.value
+    framed.close()
@@ -57,6 +57,32 @@ def test_add_score():
     assert score_accumulated.extra_runs == 5
 
 
+def test_subtract_score():
+    accumulated = score.Score(0, 0, 0, 0, 0, 0, 0)
+    for score_text in ["4", "2w", "1nb", "W", "3lb"]:
+        accumulated.add(score.Score.parse(score_text))
+    for score_text in ["3lb", "W", "1nb"]:
+        accumulated.subtract(score.Score.parse(score_text))
+    expected = score.Score(0, 0, 0, 0, 0, 0, 0)
+    expected.add(score.Score.parse("4")).add(score.Score.parse("2w"))
+    assert scores_equal(accumulated, expected)
+
+
+def test_parsed_scores_shared():
+    ball_score = score.Score.parse("1lb")
+    assert score.Score.parse("1lb") is ball_score
+    with pytest.raises(AttributeError):
+        ball_score.leg_byes = 2
+    with pytest.raises(TypeError):
+        ball_score.add(score.Score.parse("1"))
+    accumulated = score.Score(0, 0, 0, 0, 0, 0, 0)
+    accumulated.add(ball_score).add(ball_score)
+    assert accumulated.leg_byes == 2
+    assert ball_score.leg_byes == 1
+    with pytest.raises(ValueError):
+        score.Score.parse("x")
+
+
 def test_runs_scored():
     score_text = "."
     test_score = score.Score.parse(score_text)
@@ -0,0 +1,182 @@
+import asyncio
+
+from scorpyo.engine import MatchEngine
+from scorpyo.error import RejectReason
+from scorpyo.protocol import encode_frame, frame_payload, read_frame
+from scorpyo.server import EngineServer
+from .common import load_match_commands
+
+
+async def read_response(reader: asyncio.StreamReader) -> dict:
+    return await asyncio.wait_for(read_frame(reader), 5)
+
+
+async def start_server(engine: MatchEngine, **kwargs) -> EngineServer:
+    server = EngineServer(engine, "127.0.0.1", 0, **kwargs)
+    await server.start()
+    return server
+
+
+def test_concurrent_connections(registrar):
+    engine = MatchEngine(registrar)
+    commands = load_match_commands()
+
+    async def run():
+        server = await start_server(engine)
+        port = server.sockets[0].getsockname()[1]
+        first_reader, first_writer = await asyncio.open_connection("127.0.0.1", port)
+        second_reader, second_writer = await asyncio.open_connection(
+            "127.0.0.1", port
+        )
+        responses = []
+        for command_id, command in enumerate(commands[:4]):
+            command["command_id"] = command_id
+            reader, writer = (
+                (first_reader, first_writer)
+                if command_id % 2 == 0
+                else (second_reader, second_writer)
+            )
+            writer.write(encode_frame(command))
+            await writer.drain()
+            responses.append(await read_response(reader))
+        assert server.num_connections == 2
+        first_writer.close()
+        second_writer.close()
+        await server.shutdown()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [r["message_id"] for r in responses] == [0, 1, 2, 3]
+    assert all("reject_reason" not in r for r in responses)
+    assert len(engine.current_match.match_inningses) == 1
+
+
+def test_fair_scheduling(registrar):
+    engine = MatchEngine(registrar)
+    server = EngineServer(engine, "127.0.0.1", 0)
+    applied = []
+
+    class StubConnection:
+        def __init__(self, name, num_commands):
+            self.name = name
+            self.pending = asyncio.Queue()
+            for i in range(num_commands):
+                self.pending.put_nowait({"conn": name})
+            self.is_scheduled = True
+
+        def send(self, message):
+            applied.append(self.name)
+
+    engine.on_command = lambda command: command
+
+    async def run():
+        server._ready.extend([StubConnection("a", 3), StubConnection("b", 1)])
+        while server._ready:
+            server._apply_next()
+
+    asyncio.run(run())
+    assert applied == ["a", "b", "a", "a"]
+
+
+def test_idle_timeout_and_shutdown(registrar):
+    engine = MatchEngine(registrar)
+
+    async def run():
+        server = await start_server(engine, idle_timeout=0.05)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        closed = await asyncio.wait_for(reader.read(), 5)
+        await asyncio.sleep(0.01)
+        num_connections = server.num_connections
+        await server.shutdown()
+        writer.close()
+        return closed, num_connections
+
+    closed, num_connections = asyncio.run(run())
+    assert closed == b""
+    assert num_connections == 0
+
+
+def test_bad_frames_rejected_to_their_connection(registrar):
+    engine = MatchEngine(registrar)
+    commands = load_match_commands()
+
+    async def run():
+        server = await start_server(engine)
+        port = server.sockets[0].getsockname()[1]
+        bad_reader, bad_writer = await asyncio.open_connection("127.0.0.1", port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        bad_writer.write(encode_frame([1, 2]))
+        bad_writer.write(frame_payload(b"{not json"))
+        await bad_writer.drain()
+        rejects = [await read_response(bad_reader) for _ in range(2)]
+        responses = []
+        for command_id, command in enumerate(commands[:3]):
+            command["command_id"] = command_id
+            writer.write(encode_frame(command))
+            await writer.drain()
+            responses.append(await read_response(reader))
+        # the connection that sent the bad frames is still served
+        bad_writer.write(encode_frame(dict(commands[3], command_id=3)))
+        await bad_writer.drain()
+        responses.append(await read_response(bad_reader))
+        # commands queued when the server shuts down still get their replies
+        writer.write(encode_frame(dict(commands[4], command_id=4)))
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        await server.shutdown()
+        responses.append(await read_response(reader))
+        bad_writer.close()
+        writer.close()
+        return rejects, responses
+
+    rejects, responses = asyncio.run(run())
+    assert all(r["reject_reason"] == RejectReason.BAD_COMMAND.value for r in rejects)
+    assert [r["message_id"] for r in responses] == [0, 1, 2, 3, 4]
+    assert all("reject_reason" not in r for r in responses)
+
+
+def test_shutdown_drains_queued_commands(registrar):
+    engine = MatchEngine(registrar)
+    commands = load_match_commands()[:5]
+
+    async def run():
+        server = await start_server(engine)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await asyncio.sleep(0.01)
+        # queue commands without letting the scheduler run in between
+        connection = next(iter(server._connections))
+        for command_id, command in enumerate(commands):
+            await server._enqueue(connection, dict(command, command_id=command_id))
+        await server.shutdown()
+        responses = [await read_response(reader) for _ in commands]
+        writer.close()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [r["message_id"] for r in responses] == [0, 1, 2, 3, 4]
+
+
+def test_timed_profile_written_while_idle(registrar, tmp_path):
+    engine = MatchEngine(registrar, profile_dir=str(tmp_path))
+
+    async def run():
+        server = await start_server(engine)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        request = {"admin": "profile", "seconds": 0.05, "name": "idle.prof"}
+        writer.write(encode_frame(request))
+        await writer.drain()
+        reply = await read_response(reader)
+        # no further request arrives, so only the poll can end the profile
+        await asyncio.sleep(0.2)
+        profiler = engine.profiler
+        writer.close()
+        await server.shutdown()
+        return reply, profiler
+
+    reply, profiler = asyncio.run(run())
+    assert reply == {"admin": "profile", "path": str(tmp_path / "idle.prof")}
+    assert profiler is None
+    assert (tmp_path / "idle.prof").exists()
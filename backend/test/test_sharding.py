@@ -0,0 +1,120 @@
+import asyncio
+from configparser import ConfigParser
+
+import pytest
+
+from scorpyo.error import RejectReason
+from scorpyo.protocol import encode_frame, read_frame
+from scorpyo.server import EngineServer
+from scorpyo.sharding import ShardedMatchEngine
+from .common import TEST_CONFIG_PATH, load_match_commands
+
+
+class CollectingListener:
+    def __init__(self):
+        self.messages = []
+
+    def on_message(self, message: dict):
+        self.messages.append(message)
+
+
+@pytest.fixture(scope="module")
+def sharded_engine():
+    with ShardedMatchEngine(TEST_CONFIG_PATH, num_workers=2) as engine:
+        yield engine
+
+
+def test_matches_spread_across_workers(sharded_engine):
+    listener = CollectingListener()
+    sharded_engine.register_client(listener)
+    match_ids = []
+    for _ in range(2):
+        ms_command = load_match_commands()[0]
+        ms_command["command_id"] = 0
+        match_ids.append(sharded_engine.on_command(ms_command)["match_id"])
+    assert sorted(match_id % 2 for match_id in match_ids) == [0, 1]
+    futures = []
+    for command_id, command in enumerate(load_match_commands()[1:], start=1):
+        for match_id in match_ids:
+            command = dict(command, command_id=command_id, match_id=match_id)
+            futures.append(sharded_engine.submit(command))
+    responses = [f.result() for f in futures]
+    assert all("reject_reason" not in r for r in responses)
+    for match_id in match_ids:
+        acks = [
+            m
+            for m in listener.messages
+            if m["match_id"] == match_id and not m["is_snapshot"]
+        ]
+        assert [m["message_id"] for m in acks] == list(range(len(acks)))
+        assert sharded_engine.match_stats(match_id)["commands"] == len(acks)
+
+
+def test_reject_without_match(sharded_engine):
+    command = {"event": "bc", "command_id": 0, "match_id": 7, "body": {}}
+    assert "reject_reason" in sharded_engine.on_command(command)
+
+
+def test_batch_on_one_worker(sharded_engine):
+    commands = load_match_commands()
+    for command_id, command in enumerate(commands):
+        command["command_id"] = command_id
+    envelope = sharded_engine.on_commands(commands)
+    assert len(envelope["batch"]) == len(commands)
+    assert all("reject_reason" not in m for m in envelope["batch"])
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        [1],
+        "bc",
+        {"batch": 5},
+        {"batch": [[1]]},
+        {"event": "bc", "command_id": 0, "match_id": "3", "body": {}},
+    ],
+)
+def test_malformed_request_rejected(sharded_engine, request_):
+    message = sharded_engine.on_request(request_)
+    if "batch" in message:
+        (message,) = message["batch"]
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+
+
+def test_admin_sent_to_every_worker(sharded_engine):
+    reply = sharded_engine.on_request({"admin": "profile_stop"})
+    assert reply["admin"] == "profile_stop"
+    assert [r["reject_reason"] for r in reply["workers"]] == [
+        RejectReason.ILLEGAL_OPERATION.value
+    ] * 2
+
+
+def test_served_with_engine_config(tmp_path):
+    config = ConfigParser()
+    config.read(TEST_CONFIG_PATH)
+    config["ENGINE"] = {"journal_path": str(tmp_path / "engine.journal")}
+    config_path = str(tmp_path / "engine.cfg")
+    with open(config_path, "w") as fh:
+        config.write(fh)
+    commands = load_match_commands()[:4]
+
+    async def run(engine):
+        server = EngineServer(engine, "127.0.0.1", 0)
+        await server.start()
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for command_id, command in enumerate(commands):
+            writer.write(encode_frame(dict(command, command_id=command_id)))
+            await writer.drain()
+            responses.append(await asyncio.wait_for(read_frame(reader), 5))
+        writer.close()
+        await server.shutdown()
+        return responses
+
+    responses = asyncio.run(run(ShardedMatchEngine(config_path, num_workers=2)))
+    assert all("reject_reason" not in r for r in responses)
+    # each worker journals its own matches
+    journals = sorted(path.name for path in tmp_path.glob("engine.journal*"))
+    assert journals == ["engine.journal-shard0", "engine.journal-shard1"]
+    assert (tmp_path / "engine.journal-shard0").stat().st_size > 0
@@ -0,0 +1,117 @@
+import copy
+import pickle
+from functools import partial
+
+import pytest
+
+from scorpyo.engine import MatchEngine
+from scorpyo.event import EventType
+from scorpyo.snapshot import (
+    SnapshotMode,
+    SnapshotPolicy,
+    SnapshotScheduler,
+    apply_delta,
+    diff_snapshot,
+)
+from .common import apply_commands, load_match_commands, rebuild_snapshot
+
+
+def test_diff_snapshot():
+    previous = {"runs": 1, "last_ball": {"runs": 1}, "overs": [{"runs": 1}], "a": 0}
+    current = {"runs": 5, "last_ball": {"runs": 4}, "overs": [{"runs": 5}, {}]}
+    delta = diff_snapshot(previous, current)
+    assert {"op": "set", "path": ["runs"], "value": 5} in delta
+    assert {"op": "set", "path": ["overs", 1], "value": {}} in delta
+    assert {"op": "remove", "path": ["a"]} in delta
+    assert apply_delta(copy.deepcopy(previous), delta) == current
+    assert diff_snapshot(current, copy.deepcopy(current)) == []
+
+
+def test_diff_snapshot_bool_vs_int():
+    delta = diff_snapshot({"maiden": 0}, {"maiden": False})
+    assert delta == [{"op": "set", "path": ["maiden"], "value": False}]
+
+
+def test_engine_delta_snapshots(registrar, engine_listener):
+    engine = MatchEngine(registrar, SnapshotMode.DELTA)
+    engine_listener.messages = []
+    engine.register_client(engine_listener)
+    apply_commands(engine, load_match_commands())
+    snapshots = [m for m in engine_listener.messages if m["is_snapshot"]]
+    assert not snapshots[0]["is_delta"]
+    envelope_keys = ("version", "is_delta", "is_snapshot")
+    rebuilt = copy.deepcopy(
+        {k: v for k, v in snapshots[0].items() if k not in envelope_keys}
+    )
+    for message in snapshots[1:]:
+        assert message["is_delta"]
+        assert message["base_version"] == message["version"] - 1
+        rebuilt = apply_delta(rebuilt, message["delta"])
+    assert rebuilt == engine.current_match.snapshot()
+    full = engine.request_snapshot()
+    assert full["version"] == snapshots[-1]["version"]
+    assert not full["is_delta"]
+
+
+def test_delta_follows_undo(registrar, engine_listener):
+    engine = MatchEngine(registrar, SnapshotMode.DELTA)
+    engine_listener.messages = []
+    engine.register_client(engine_listener)
+    commands = load_match_commands()
+    undo = {"event": "ud", "body": {"count": 1}}
+    # a ball, the start of an over and an incoming batter undone and done again
+    commands = commands[:13] + [undo] + commands[12:17] + [undo] + commands[16:]
+    commands = commands + [undo, commands[-1]]
+    for command_id, command in enumerate(commands):
+        command = dict(command, command_id=command_id)
+        if command_id:
+            command["match_id"] = 0
+        assert "reject_reason" not in engine.on_command(command)
+        rebuilt = rebuild_snapshot(engine_listener.messages)
+        assert rebuilt == engine.current_match.snapshot()
+
+
+def test_delta_only_covers_changes(registrar, engine_listener):
+    engine = MatchEngine(registrar, SnapshotMode.DELTA)
+    engine_listener.messages = []
+    engine.register_client(engine_listener)
+    apply_commands(engine, load_match_commands()[:18])
+    paths = [operation["path"] for operation in engine_listener.messages[-1]["delta"]]
+    # a ball in the second over leaves the first over and its bowler alone
+    assert ["inningses", 0, "overs", 1] in paths
+    assert ["inningses", 0, "bowlers", 1] in paths
+    assert ["inningses", 0, "overs", 0] not in paths
+    assert ["inningses", 0, "bowlers", 0] not in paths
+    assert all(path[0] == "inningses" for path in paths)
+
+
+def test_restored_scheduler_is_due():
+    scheduler = SnapshotScheduler(SnapshotPolicy.THROTTLE, interval_ms=60_000)
+    scheduler.on_snapshot_sent()
+    assert not scheduler.on_command(EventType.BALL_COMPLETED)
+    restored = pickle.loads(pickle.dumps(scheduler))
+    assert restored.pending
+    assert restored.on_command(EventType.BALL_COMPLETED)
+
+
+@pytest.mark.parametrize(
+    "scheduler,expected_snapshots",
+    [
+        (SnapshotScheduler, 21),
+        (partial(SnapshotScheduler, SnapshotPolicy.EVERY_N, every_n=5), 4),
+        (partial(SnapshotScheduler, SnapshotPolicy.BOUNDARY), 3),
+        (partial(SnapshotScheduler, SnapshotPolicy.THROTTLE, interval_ms=60_000), 1),
+    ],
+)
+def test_snapshot_policy(registrar, engine_listener, scheduler, expected_snapshots):
+    engine = MatchEngine(registrar, snapshot_scheduler=scheduler)
+    engine_listener.messages = []
+    engine.register_client(engine_listener)
+    apply_commands(engine, load_match_commands())
+    acks = [m for m in engine_listener.messages if not m["is_snapshot"]]
+    snapshots = [m for m in engine_listener.messages if m["is_snapshot"]]
+    assert len(acks) == 21
+    assert len(snapshots) == expected_snapshots
+    engine.flush_snapshot()
+    latest = [m for m in engine_listener.messages if m["is_snapshot"]][-1]
+    assert latest["inningses"] == engine.current_match.snapshot()["inningses"]
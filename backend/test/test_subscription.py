@@ -0,0 +1,88 @@
+from scorpyo.engine import MatchEngine
+from scorpyo.event import EventType
+from scorpyo.snapshot import SnapshotMode
+from scorpyo.subscription import MessageKind, Subscription
+from .common import apply_commands, load_match_commands, rebuild_snapshot
+
+
+class Listener:
+    def __init__(self):
+        self.messages = []
+
+    def on_message(self, message: dict):
+        self.messages.append(message)
+
+
+def test_subscribe_to_event_types(mock_engine, engine_listener):
+    listener = Listener()
+    subscription = Subscription(
+        event_types=[EventType.OVER_COMPLETED, EventType.INNINGS_STARTED],
+        kinds=[MessageKind.ACK],
+    )
+    mock_engine.register_client(listener, subscription=subscription)
+    apply_commands(mock_engine, load_match_commands())
+    assert [m["event"] for m in listener.messages] == ["is", "oc"]
+    assert len(engine_listener.messages) > len(listener.messages)
+
+
+def test_subscribe_to_innings(mock_engine):
+    listener = Listener()
+    mock_engine.register_client(listener, subscription=Subscription(innings=[0]))
+    apply_commands(mock_engine, load_match_commands())
+    acks = [m for m in listener.messages if not m["is_snapshot"]]
+    # the match level commands before the innings started are left out
+    assert acks[0]["event"] == EventType.INNINGS_STARTED.value
+    assert len(acks) == 18
+
+
+def test_subscribe_to_other_match(mock_engine):
+    listener = Listener()
+    mock_engine.register_client(listener, subscription=Subscription(match_ids=[1]))
+    apply_commands(mock_engine, load_match_commands())
+    assert listener.messages == []
+
+
+def test_unsubscribed_snapshots_not_built(registrar):
+    engine = MatchEngine(registrar)
+    listener = Listener()
+    engine.register_client(listener, subscription=Subscription(kinds=["ack"]))
+    apply_commands(engine, load_match_commands())
+    assert not any(m["is_snapshot"] for m in listener.messages)
+    assert engine.sessions[0].snapshot_version == 0
+
+
+def test_delta_subscribers_start_from_full_snapshot(registrar):
+    engine = MatchEngine(registrar, SnapshotMode.DELTA)
+    innings_listener, late_listener = Listener(), Listener()
+    # the snapshots from before the innings started are not sent to it
+    engine.register_client(innings_listener, subscription=Subscription(innings=[0]))
+    commands = load_match_commands()
+    apply_commands(engine, commands[:10])
+    engine.register_client(late_listener)
+    for command_id, command in enumerate(commands[10:], 10):
+        response = engine.on_command(dict(command, command_id=command_id, match_id=0))
+        assert "reject_reason" not in response
+    for listener in (innings_listener, late_listener):
+        first = next(m for m in listener.messages if m["is_snapshot"])
+        assert not first["is_delta"]
+        assert rebuild_snapshot(listener.messages) == engine.current_match.snapshot()
+
+
+def test_batch_filtered(mock_engine):
+    listener = Listener()
+    subscription = Subscription(event_types=[EventType.BALL_COMPLETED], kinds=["ack"])
+    mock_engine.register_client(listener, subscription=subscription)
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:7])
+    batch = [dict(c, command_id=i, match_id=0) for i, c in enumerate(commands[7:9], 7)]
+    mock_engine.on_commands(batch)
+    (envelope,) = listener.messages
+    assert [m["event"] for m in envelope["batch"]] == ["bc", "bc"]
+    assert envelope["num_commands"] == 2
+
+
+def test_from_dict():
+    subscription = Subscription.from_dict({"event_types": ["bc"], "match_ids": [3]})
+    assert subscription.matches({"event": "bc", "match_id": 3})
+    assert not subscription.matches({"event": "oc", "match_id": 3})
+    assert not subscription.matches({"event": "bc", "match_id": 4})
@@ -0,0 +1,109 @@
+import pytest
+
+from scorpyo.error import EngineError, RejectReason
+from scorpyo.innings import Innings
+from scorpyo.validation import Field, Precondition, compile_validator
+from .common import apply_ball_events, apply_commands, load_match_commands
+
+
+def test_rejected_ball_leaves_no_trace(mock_innings: Innings):
+    apply_ball_events([{"score_text": "W", "dismissal": {"type": "b"}}], mock_innings)
+    before = mock_innings.snapshot()
+    version = mock_innings.version
+    with pytest.raises(EngineError) as exc:
+        apply_ball_events([{"score_text": "4"}], mock_innings)
+    assert exc.value.reason == RejectReason.ILLEGAL_OPERATION
+    assert mock_innings.snapshot() == before
+    assert mock_innings.version == version
+
+
+def test_seventh_legal_ball(mock_innings: Innings):
+    apply_ball_events([{"score_text": "1"}] * 6, mock_innings)
+    runs = mock_innings.total_runs
+    with pytest.raises(EngineError):
+        apply_ball_events([{"score_text": "1"}], mock_innings)
+    assert mock_innings.total_runs == runs
+    assert mock_innings.current_bowler_innings.balls_bowled == 6
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        None,
+        {},
+        {"score_text": 4},
+        {"score_text": "4x"},
+        {"score_text": "W", "dismissal": {"type": "zz"}},
+        {"score_text": "W", "dismissal": {"type": "ct", "fielder": "Nobody"}},
+    ],
+)
+def test_bad_ball_rejected(mock_engine, body):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:7])
+    command = {"event": "bc", "command_id": 7, "match_id": 0, "body": body}
+    message = mock_engine.on_command(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert mock_engine.current_match.current_innings.total_runs == 0
+
+
+def test_unknown_bowler_rejected(mock_engine):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:6])
+    command = {
+        "event": "os",
+        "command_id": 6,
+        "match_id": 0,
+        "body": {"bowler": "Nobody"},
+    }
+    message = mock_engine.on_command(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert message["message"] == "no player found called Nobody"
+
+
+def test_compile_validator():
+    validate = compile_validator(
+        [Field("count", int), Field("name", required=False)],
+        [Precondition(lambda context, payload: context.get("error"))],
+    )
+    validate({}, {"count": 1})
+    validate({}, {"count": 1, "name": "x"})
+    for payload in ({}, {"count": True}, {"count": 1, "name": 2}):
+        with pytest.raises(EngineError) as exc:
+            validate({}, payload)
+        assert exc.value.reason == RejectReason.BAD_COMMAND
+    with pytest.raises(EngineError) as exc:
+        validate({"error": "not now"}, {"count": 1})
+    assert exc.value.reason == RejectReason.ILLEGAL_OPERATION
+
+
+@pytest.mark.parametrize(
+    "dismissal_type,position", [("b", "non_striker"), ("ro", "yet_to_bat")]
+)
+def test_dismissed_batter_must_be_at_crease(mock_engine, dismissal_type, position):
+    commands = load_match_commands()
+    apply_commands(mock_engine, commands[:7])
+    innings = mock_engine.current_match.current_innings
+    if position == "non_striker":
+        batter = innings.non_striker
+    else:
+        batter = innings.yet_to_bat[0]
+    body = {"score_text": "W", "dismissal": {"type": dismissal_type}}
+    body["dismissal"]["batter"] = batter.name
+    if dismissal_type == "ro":
+        body["dismissal"]["fielder"] = innings.bowling_lineup[0].name
+    command = {"event": "bc", "command_id": 7, "match_id": 0, "body": body}
+    message = mock_engine.on_command(command)
+    assert message["reject_reason"] == RejectReason.BAD_COMMAND.value
+    assert innings.wickets_down == 0
+
+
+def test_over_completed_twice(mock_engine):
+    commands = load_match_commands()[:16]
+    apply_commands(mock_engine, commands)
+    innings = mock_engine.current_match.current_innings
+    on_strike = innings.on_strike_innings
+    command = {"event": "oc", "command_id": 16, "match_id": 0, "body": {}}
+    message = mock_engine.on_command(command)
+    assert message["reject_reason"] == RejectReason.ILLEGAL_OPERATION.value
+    assert innings.current_bowler_innings.overs_completed == 1
+    assert innings.on_strike_innings is on_strike